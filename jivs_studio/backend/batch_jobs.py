@@ -0,0 +1,181 @@
+import asyncio
+import logging
+import os
+import time
+import uuid
+
+from model_scheduler import ModelBusy, set_priority
+from response_cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "50"))
+# Items of one job generated at the same time
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+# Items generated at the same time across all jobs, so batches never flood the model queue
+BATCH_MAX_RUNNING = int(os.getenv("BATCH_MAX_RUNNING", "8"))
+# Finished jobs kept for polling; the least recently read are dropped first
+BATCH_MAX_JOBS = int(os.getenv("BATCH_MAX_JOBS", "100"))
+# Unfinished jobs at once; these are never dropped, so further submissions are refused
+BATCH_MAX_ACTIVE = int(os.getenv("BATCH_MAX_ACTIVE", "20"))
+BATCH_JOB_TTL = float(os.getenv("BATCH_JOB_TTL", str(24 * 3600)))
+# Times an item waits out a ModelBusy (quota exhausted) before it is marked failed
+BATCH_BUSY_RETRIES = int(os.getenv("BATCH_BUSY_RETRIES", "5"))
+
+
+class JobNotFound(KeyError):
+    pass
+
+
+class BatchFull(RuntimeError):
+    """Too many batch jobs are still running."""
+
+
+class BatchJob:
+    """One batch: per-item state plus an append-only event log for progress streams."""
+
+    def __init__(self, job_id: str, kind: str, count: int, concurrency: int):
+        self.job_id = job_id
+        self.kind = kind
+        self.concurrency = concurrency
+        self.status = "queued"
+        self.created_at = time.time()
+        self.finished_at = None
+        self.items = [{"index": i, "status": "queued", "result": None, "error": None, "seconds": None}
+                      for i in range(count)]
+        self.log = []  # (event, data) in the order they happened
+        self.changed = asyncio.Event()
+        self.task = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("done", "partial", "failed")
+
+    def counts(self) -> dict:
+        counts = {"queued": 0, "running": 0, "done": 0, "failed": 0}
+        for item in self.items:
+            counts[item["status"]] += 1
+        return counts
+
+    def snapshot(self, include_results: bool = True) -> dict:
+        items = self.items if include_results else [
+            {key: value for key, value in item.items() if key != "result"} for item in self.items
+        ]
+        return {
+            "job_id": self.job_id,
+            "kind": self.kind,
+            "status": self.status,
+            "total": len(self.items),
+            "counts": self.counts(),
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "items": items,
+        }
+
+    def emit(self, event: str, data: dict):
+        self.log.append((event, data))
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+
+class BatchManager:
+    """
+    Runs batch jobs in the background. Each job fans its items out to
+    `run_item` with at most `concurrency` in flight (BATCH_MAX_RUNNING across
+    all jobs); model calls made for batch items use the "batch" priority
+    class, so they only take quota interactive and generate calls leave free.
+
+    Jobs live in this process's memory only and are lost on restart (use the
+    /jobs queue, job_queue.py, for work that must survive one). Unfinished jobs
+    are always kept; finished ones stay readable for `ttl` seconds, up to
+    `max_jobs` of them.
+    """
+
+    def __init__(self, max_jobs: int = BATCH_MAX_JOBS, ttl: float = BATCH_JOB_TTL,
+                 max_running: int = BATCH_MAX_RUNNING, max_active: int = BATCH_MAX_ACTIVE):
+        self._active = {}  # job_id -> unfinished BatchJob
+        self._finished = LRUCache(max_entries=max_jobs, ttl=ttl)
+        self.max_active = max_active
+        self.max_running = max_running
+        self._running = None  # semaphore, created on the running loop
+
+    def submit(self, kind: str, inputs: list, run_item, concurrency: int = BATCH_CONCURRENCY) -> BatchJob:
+        """
+        Starts a job; `run_item(input)` is an async callable returning the item's
+        result dict. Raises BatchFull when `max_active` jobs are still running.
+        """
+        if len(self._active) >= self.max_active:
+            raise BatchFull(f"{len(self._active)} batch jobs still running")
+        if self._running is None:
+            self._running = asyncio.Semaphore(max(1, self.max_running))
+        job = BatchJob(uuid.uuid4().hex, kind, len(inputs), max(1, min(concurrency, BATCH_CONCURRENCY)))
+        self._active[job.job_id] = job
+        job.task = asyncio.create_task(self._run(job, inputs, run_item))
+        return job
+
+    def get(self, job_id: str) -> BatchJob:
+        job = self._active.get(job_id) or self._finished.get(job_id)
+        if job is None:
+            raise JobNotFound(job_id)
+        return job
+
+    async def _run(self, job: BatchJob, inputs: list, run_item):
+        set_priority("batch")
+        job.status = "running"
+        slots = asyncio.Semaphore(job.concurrency)
+        started = time.perf_counter()
+
+        async def one(index, value):
+            async with slots, self._running:
+                item = job.items[index]
+                item["status"] = "running"
+                item_started = time.perf_counter()
+                for attempt in range(BATCH_BUSY_RETRIES + 1):
+                    try:
+                        item["result"] = await run_item(value)
+                        item["status"] = "done"
+                        break
+                    except ModelBusy as e:
+                        if attempt == BATCH_BUSY_RETRIES:
+                            item["status"], item["error"] = "failed", str(e)
+                        else:
+                            await asyncio.sleep(e.retry_after)
+                    except Exception as e:
+                        detail = getattr(e, "detail", None) or str(e)  # HTTPException from the shared path
+                        logger.warning(f"Batch {job.job_id} item {index} failed: {detail}")
+                        item["status"], item["error"] = "failed", str(detail)
+                        break
+                item["seconds"] = round(time.perf_counter() - item_started, 2)
+                job.emit("item", item)
+
+        await asyncio.gather(*(one(i, value) for i, value in enumerate(inputs)))
+
+        counts = job.counts()
+        job.status = "done" if counts["failed"] == 0 else ("failed" if counts["done"] == 0 else "partial")
+        job.finished_at = time.time()
+        self._finished.set(job.job_id, job)
+        self._active.pop(job.job_id, None)
+        logger.info(f"Batch {job.job_id} {job.status}: {counts['done']}/{len(inputs)} items "
+                    f"in {time.perf_counter() - started:.1f}s")
+        job.emit("done", job.snapshot(include_results=False))
+
+    async def events(self, job_id: str):
+        """
+        Yields ("snapshot", state) first, then every ("item", item) / ("done", state)
+        event of the job as it happens; replays the whole log for finished jobs.
+        """
+        job = self.get(job_id)
+        yield "snapshot", job.snapshot(include_results=False)
+        index = 0
+        while True:
+            if index < len(job.log):
+                event, data = job.log[index]
+                index += 1
+                yield event, data
+                if event == "done":
+                    return
+            else:
+                await job.changed.wait()
+
+    def summary(self) -> dict:
+        return {"active": len(self._active), "finished": len(self._finished), "max_running": self.max_running}
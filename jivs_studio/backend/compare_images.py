@@ -1,22 +1,36 @@
-import google.generativeai as genai
 import json
 import logging
 from PIL import Image
 import io
+import model_registry
 
 logger = logging.getLogger(__name__)
 
-def compare_images_gemini(original_image: Image.Image, generated_image: Image.Image, api_key: str):
+COMPARISON_MODEL = 'gemini-2.5-flash-lite'
+COMPARISON_CONFIG = {"response_mime_type": "application/json"}
+
+def comparison_fallback(error: Exception, regions: list = None) -> dict:
+    """Result returned in place of a model comparison that failed."""
+    result = {
+        "similarity_score": 0,
+        "similar_features": [],
+        "dissimilar_features": [f"Error during comparison: {str(error)}"]
+    }
+    if regions is not None:
+        result["regions"] = [{**region, "discrepancies": []} for region in regions]
+    return result
+
+def compare_images_gemini(original_image, generated_image, api_key: str, raise_errors: bool = False):
     """
-    Compares two PIL images using Gemini 1.5 Pro and returns a similarity score + feedback.
+    Compares two images (PIL images or inline {"mime_type", "data"} blobs) using Gemini 1.5 Pro
+    and returns a similarity score + feedback.
+    raise_errors=True lets model errors propagate (the caller retries them or
+    builds comparison_fallback itself) instead of returning the fallback.
     """
-    genai.configure(api_key=api_key)
+    model_registry.configure(api_key)
     
     # Use Pro for better vision analysis
-    model = genai.GenerativeModel(
-        'gemini-2.5-flash-lite',
-        generation_config={"response_mime_type": "application/json"}
-    )
+    model = model_registry.get_model(COMPARISON_MODEL, COMPARISON_CONFIG)
 
     system_prompt = """
     You are a QA Design Engineer. 
@@ -59,10 +73,87 @@ def compare_images_gemini(original_image: Image.Image, generated_image: Image.Im
         return result
 
     except Exception as e:
+        if raise_errors:
+            raise
         logger.error(f"Comparison Error: {e}")
         # Return a fallback in case of error
-        return {
-            "similarity_score": 0,
-            "similar_features": [],
-            "dissimilar_features": [f"Error during comparison: {str(e)}"]
-        }
\ No newline at end of file
+        return comparison_fallback(e)
+
+REGION_OVERVIEW_WIDTH = 512
+
+def _jpeg_part(image: Image.Image, max_width: int = None, quality: int = 85):
+    """Encodes a PIL image as an inline JPEG blob, optionally downscaled to max_width."""
+    if max_width and image.width > max_width:
+        image = image.resize((max_width, max(1, round(image.height * max_width / image.width))), Image.BILINEAR)
+    buf = io.BytesIO()
+    image.convert("RGB").save(buf, format="JPEG", quality=quality)
+    return {"mime_type": "image/jpeg", "data": buf.getvalue()}
+
+def _scale_box(box, src_size, dst_size):
+    sx, sy = dst_size[0] / src_size[0], dst_size[1] / src_size[1]
+    return (int(box[0] * sx), int(box[1] * sy), max(int(box[2] * sx), int(box[0] * sx) + 1),
+            max(int(box[3] * sy), int(box[1] * sy) + 1))
+
+def compare_regions_gemini(original_image: Image.Image, generated_image: Image.Image, regions: list, api_key: str,
+                           raise_errors: bool = False):
+    """
+    Region-cropped comparison: sends a low-resolution overview of both screenshots
+    plus only the crops listed in `regions` (from visual_metrics.find_diff_regions),
+    so input size scales with how much differs. Boxes are in original-image pixels.
+    Returns the compare_images_gemini shape plus per-region discrepancies.
+    """
+    model_registry.configure(api_key)
+    model = model_registry.get_model(COMPARISON_MODEL, COMPARISON_CONFIG)
+
+    region_list = "\n".join(f'- {r["id"]}: box [x0, y0, x1, y1] = {r["box"]}' for r in regions)
+    system_prompt = f"""
+    You are a QA Design Engineer comparing a GENERATED FRONTEND against its ORIGINAL DESIGN REFERENCE.
+
+    You receive:
+    1. A low-resolution overview of the ORIGINAL, then of the GENERATED screenshot (for context only).
+    2. For each region below, a crop of the ORIGINAL followed by the same crop of the GENERATED output.
+       Only these regions differ; everything else already matches.
+
+    Regions (pixel coordinates in the original):
+    {region_list}
+
+    For each region, list specific, actionable discrepancies (layout, colours, typography, spacing, styling).
+    Then give an overall "similarity_score" from 0 to 100 for the whole page.
+
+    Output JSON structure:
+    {{
+        "similarity_score": <integer>,
+        "similar_features": ["feature 1", ...],
+        "dissimilar_features": ["The button color is blue instead of red", ...],
+        "regions": [{{"id": "R1", "discrepancies": ["..."]}}, ...]
+    }}
+    """
+
+    parts = [
+        system_prompt,
+        "OVERVIEW - ORIGINAL:", _jpeg_part(original_image, REGION_OVERVIEW_WIDTH, quality=70),
+        "OVERVIEW - GENERATED:", _jpeg_part(generated_image, REGION_OVERVIEW_WIDTH, quality=70),
+    ]
+    for region in regions:
+        gen_box = _scale_box(region["box"], original_image.size, generated_image.size)
+        parts += [
+            f"{region['id']} - ORIGINAL:", _jpeg_part(original_image.crop(tuple(region["box"]))),
+            f"{region['id']} - GENERATED:", _jpeg_part(generated_image.crop(gen_box)),
+        ]
+    parts.append("Compare the regions. Provide the JSON analysis.")
+
+    try:
+        response = model.generate_content(parts)
+        result = json.loads(response.text)
+    except Exception as e:
+        if raise_errors:
+            raise
+        logger.error(f"Region Comparison Error: {e}")
+        return comparison_fallback(e, regions)
+
+    # Attach our bounding boxes to the model's per-region findings
+    findings = {r.get("id"): r.get("discrepancies", []) for r in result.get("regions", []) if isinstance(r, dict)}
+    result["regions"] = [
+        {**region, "discrepancies": findings.get(region["id"], [])} for region in regions
+    ]
+    return result
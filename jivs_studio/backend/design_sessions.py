@@ -0,0 +1,177 @@
+import difflib
+import os
+import threading
+import time
+import uuid
+
+from response_cache import LRUCache
+
+# How many documents are kept in memory and for how long after their last use
+SESSION_MAX_DOCS = int(os.getenv("SESSION_MAX_DOCS", "500"))
+SESSION_TTL = float(os.getenv("SESSION_TTL", str(24 * 3600)))
+# Every Nth version is stored in full so reading a version replays at most N-1 deltas
+SESSION_SNAPSHOT_INTERVAL = int(os.getenv("SESSION_SNAPSHOT_INTERVAL", "10"))
+
+
+class SessionNotFound(KeyError):
+    pass
+
+
+class VersionConflict(ValueError):
+    """The client edited a version that is no longer the document head."""
+
+
+def make_delta(old: str, new: str) -> list:
+    """
+    Line-level delta turning `old` into `new`:
+    ["=", n] keeps n lines, ["-", n] drops n lines, ["+", [lines]] inserts lines.
+    """
+    a = old.splitlines(keepends=True)
+    b = new.splitlines(keepends=True)
+    ops = []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, a, b, autojunk=False).get_opcodes():
+        if tag == "equal":
+            ops.append(["=", i2 - i1])
+            continue
+        if i2 > i1:
+            ops.append(["-", i2 - i1])
+        if j2 > j1:
+            ops.append(["+", b[j1:j2]])
+    return ops
+
+
+def apply_delta(old: str, delta: list) -> str:
+    lines = old.splitlines(keepends=True)
+    out, pos = [], 0
+    for op, arg in delta:
+        if op == "=":
+            out.extend(lines[pos:pos + arg])
+            pos += arg
+        elif op == "-":
+            pos += arg
+        else:
+            out.extend(arg)
+    return "".join(out)
+
+
+class _Document:
+    __slots__ = ("doc_id", "versions", "head", "lock", "head_html")
+
+    def __init__(self, doc_id):
+        self.doc_id = doc_id
+        self.versions = []  # [{"version", "snapshot" | "delta", "note", "created_at"}]
+        self.head = 0  # current version number (1-based); undo/redo move it
+        self.lock = threading.Lock()
+        self.head_html = None
+
+
+class SessionStore:
+    """
+    Versioned HTML documents for generate/refine round trips.
+
+    Versions are kept as line deltas against their predecessor, with a full
+    snapshot every SESSION_SNAPSHOT_INTERVAL versions. Undo/redo only move the
+    head pointer; committing after an undo discards the redo branch.
+    """
+
+    def __init__(self, max_docs: int = SESSION_MAX_DOCS, ttl: float = SESSION_TTL,
+                 snapshot_interval: int = SESSION_SNAPSHOT_INTERVAL):
+        self._docs = LRUCache(max_entries=max_docs, ttl=ttl)
+        self.snapshot_interval = max(1, snapshot_interval)
+
+    def _doc(self, doc_id: str) -> _Document:
+        doc = self._docs.get(doc_id)
+        if doc is None:
+            raise SessionNotFound(doc_id)
+        self._docs.set(doc_id, doc)  # refresh the TTL on use
+        return doc
+
+    def _html_at(self, doc: _Document, version: int) -> str:
+        if version == doc.head and doc.head_html is not None:
+            return doc.head_html
+        if not 1 <= version <= len(doc.versions):
+            raise SessionNotFound(f"{doc.doc_id}@{version}")
+        start = version - 1
+        while "snapshot" not in doc.versions[start]:
+            start -= 1
+        html = doc.versions[start]["snapshot"]
+        for entry in doc.versions[start + 1:version]:
+            html = apply_delta(html, entry["delta"])
+        return html
+
+    def _append(self, doc: _Document, html: str, note: str) -> int:
+        del doc.versions[doc.head:]  # drop the redo branch
+        version = len(doc.versions) + 1
+        entry = {"version": version, "note": note, "created_at": time.time()}
+        if version % self.snapshot_interval == 1 or self.snapshot_interval == 1:
+            entry["snapshot"] = html
+        else:
+            entry["delta"] = make_delta(doc.head_html, html)
+        doc.versions.append(entry)
+        doc.head = version
+        doc.head_html = html
+        return version
+
+    def create(self, html: str, note: str = "generate") -> tuple:
+        """Starts a new document. Returns (doc_id, version)."""
+        doc = _Document(uuid.uuid4().hex)
+        with doc.lock:
+            version = self._append(doc, html, note)
+        self._docs.set(doc.doc_id, doc)
+        return doc.doc_id, version
+
+    def head(self, doc_id: str) -> tuple:
+        """Returns (version, html) of the current head."""
+        doc = self._doc(doc_id)
+        with doc.lock:
+            return doc.head, doc.head_html
+
+    def get(self, doc_id: str, version: int = None) -> str:
+        doc = self._doc(doc_id)
+        with doc.lock:
+            return self._html_at(doc, doc.head if version is None else version)
+
+    def commit(self, doc_id: str, html: str, base_version: int = None, note: str = "") -> int:
+        """
+        Adds `html` as the new head. Raises VersionConflict when base_version is
+        given and is no longer the head (another edit or an undo happened).
+        """
+        doc = self._doc(doc_id)
+        with doc.lock:
+            if base_version is not None and base_version != doc.head:
+                raise VersionConflict(f"Base version {base_version} is not the head ({doc.head})")
+            if html == doc.head_html:
+                return doc.head
+            return self._append(doc, html, note)
+
+    def _move(self, doc_id: str, step: int) -> tuple:
+        doc = self._doc(doc_id)
+        with doc.lock:
+            target = doc.head + step
+            if not 1 <= target <= len(doc.versions):
+                raise VersionConflict("Nothing to undo" if step < 0 else "Nothing to redo")
+            doc.head_html = self._html_at(doc, target)
+            doc.head = target
+            return target, doc.head_html
+
+    def undo(self, doc_id: str) -> tuple:
+        return self._move(doc_id, -1)
+
+    def redo(self, doc_id: str) -> tuple:
+        return self._move(doc_id, 1)
+
+    def history(self, doc_id: str) -> dict:
+        doc = self._doc(doc_id)
+        with doc.lock:
+            return {
+                "doc_id": doc.doc_id,
+                "head": doc.head,
+                "versions": [
+                    {"version": v["version"], "note": v["note"], "created_at": v["created_at"],
+                     "stored_as": "snapshot" if "snapshot" in v else "delta"}
+                    for v in doc.versions
+                ],
+            }
+
+    def __len__(self):
+        return len(self._docs)
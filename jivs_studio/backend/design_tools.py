@@ -0,0 +1,27 @@
+import hashlib
+import os
+
+from html_patch import strip_design_tools
+
+# Design Mode controls live in static/design-tools.js and are referenced from
+# generated pages by a single loader tag instead of being inlined.
+ASSET_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "design-tools.js")
+# Pages render in iframes (srcdoc) and as downloaded files, so the loader needs an absolute URL
+DESIGN_TOOLS_BASE_URL = os.getenv("DESIGN_TOOLS_BASE_URL", "http://localhost:8000").rstrip("/")
+
+with open(ASSET_PATH, "rb") as f:
+    ASSET_BYTES = f.read()
+
+ASSET_VERSION = hashlib.sha256(ASSET_BYTES).hexdigest()[:12]
+ASSET_ETAG = f'"{ASSET_VERSION}"'
+ASSET_URL = f"{DESIGN_TOOLS_BASE_URL}/static/design-tools.{ASSET_VERSION}.js"
+
+LOADER_TAG = f'<script src="{ASSET_URL}" data-jivs-design-tools defer></script>'
+
+
+def inject(raw_html: str) -> str:
+    """Adds the loader tag once. Any earlier loader or inline copy of the tools is removed first."""
+    html = strip_design_tools(raw_html)
+    if "</body>" in html:
+        return html.replace("</body>", f"{LOADER_TAG}</body>", 1)
+    return html + LOADER_TAG
@@ -0,0 +1,243 @@
+import json
+import re
+from html.parser import HTMLParser
+
+VOID_TAGS = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "link",
+    "meta", "param", "source", "track", "wbr",
+}
+
+# Instructions mentioning these affect the whole page; patching a few subtrees won't do.
+GLOBAL_WORDS = {"page", "whole", "entire", "everything", "all", "overall", "layout", "theme", "site", "globally"}
+
+STOPWORDS = {
+    "the", "a", "an", "to", "of", "and", "or", "in", "on", "for", "with", "make", "change", "set",
+    "it", "is", "be", "by", "this", "that", "more", "less", "into", "from", "at", "as", "use",
+    "please", "add", "remove", "update", "should", "bit", "little", "some",
+}
+
+MAX_CONTEXT_CHARS = 8000  # budget for subtrees sent verbatim
+MAX_TARGETS = 3
+OUTLINE_DEPTH = 4
+
+# Loader tag for static/design-tools.js, plus fallbacks for the legacy inline block
+_TOOLS_PATTERNS = [
+    re.compile(r"\s*<script[^>]*\bdata-jivs-design-tools\b[^>]*>\s*</script>", re.I),
+    re.compile(r'\s*<script src="https://html2canvas\.hertzen\.com/dist/html2canvas\.min\.js"></script>', re.I),
+    re.compile(r'\s*<div id="ui-controls".*?</button>\s*</div>', re.S | re.I),
+    re.compile(r"\s*<script>\s*// --- DESIGN MODE LOGIC ---.*?</script>", re.S | re.I),
+]
+
+
+def strip_design_tools(html: str, tools_script: str = "") -> str:
+    """Removes the injected Design Mode controls so they are not sent back to the model."""
+    if tools_script:
+        html = html.replace(tools_script, "")
+    for pattern in _TOOLS_PATTERNS:
+        html = pattern.sub("", html)
+    return html
+
+
+class Node:
+    __slots__ = ("tag", "attrs", "start", "end", "children", "node_id", "depth")
+
+    def __init__(self, tag, attrs, start, depth):
+        self.tag = tag
+        self.attrs = attrs
+        self.start = start
+        self.end = None
+        self.children = []
+        self.node_id = None
+        self.depth = depth
+
+
+class _OffsetParser(HTMLParser):
+    """Builds an element tree with source offsets for every element."""
+
+    def __init__(self, source):
+        super().__init__(convert_charrefs=True)
+        self.source = source
+        self.line_starts = [0]
+        for match in re.finditer("\n", source):
+            self.line_starts.append(match.end())
+        self.root = Node("#root", [], 0, -1)
+        self.stack = [self.root]
+
+    def _offset(self):
+        line, col = self.getpos()
+        return self.line_starts[line - 1] + col
+
+    def handle_starttag(self, tag, attrs):
+        start = self._offset()
+        node = Node(tag, attrs, start, len(self.stack) - 1)
+        self.stack[-1].children.append(node)
+        if tag in VOID_TAGS:
+            node.end = start + len(self.get_starttag_text())
+        else:
+            self.stack.append(node)
+
+    def handle_startendtag(self, tag, attrs):
+        start = self._offset()
+        node = Node(tag, attrs, start, len(self.stack) - 1)
+        node.end = start + len(self.get_starttag_text())
+        self.stack[-1].children.append(node)
+
+    def handle_endtag(self, tag):
+        if not any(n.tag == tag for n in self.stack[1:]):
+            return  # stray end tag
+        start = self._offset()
+        close = self.source.find(">", start)
+        end = len(self.source) if close == -1 else close + 1
+        while len(self.stack) > 1:
+            node = self.stack.pop()
+            node.end = end if node.tag == tag else start  # implicitly closed elements end here
+            if node.tag == tag:
+                break
+
+    def finish(self):
+        self.close()
+        while len(self.stack) > 1:
+            self.stack.pop().end = len(self.source)
+        return self.root
+
+
+def parse(html: str):
+    """Returns (root, nodes_by_id) with ids N1, N2, ... in document order."""
+    root = _OffsetParser(html)
+    root.feed(html)
+    tree = root.finish()
+    nodes = {}
+
+    def walk(node):
+        for child in node.children:
+            child.node_id = f"N{len(nodes) + 1}"
+            nodes[child.node_id] = child
+            walk(child)
+
+    walk(tree)
+    return tree, nodes
+
+
+def _label(node, html):
+    attrs = " ".join(f'{k}="{v}"' for k, v in node.attrs if k in ("id", "class") and v)[:80]
+    text = re.sub(r"<[^>]+>", " ", html[node.start:node.end])
+    text = " ".join(text.split())[:60]
+    head = f"<{node.tag}{' ' + attrs if attrs else ''}>"
+    return f"[{node.node_id}] {head}" + (f' "{text}"' if text else "")
+
+
+def outline(root, html, max_depth=OUTLINE_DEPTH):
+    """Compact, indented skeleton of the page: one line per element down to max_depth."""
+    lines = []
+
+    def walk(node):
+        for child in node.children:
+            if child.depth > max_depth:
+                continue
+            lines.append("  " * child.depth + _label(child, html))
+            walk(child)
+
+    walk(root)
+    return "\n".join(lines)
+
+
+def _tokens(text):
+    return {t for t in re.findall(r"[a-z0-9#\-]+", text.lower()) if len(t) > 2 and t not in STOPWORDS}
+
+
+def select_targets(nodes, html, instructions, budget=MAX_CONTEXT_CHARS, max_targets=MAX_TARGETS):
+    """
+    Picks the smallest subtrees that mention the instruction's keywords.
+    Returns [] when the edit looks page-wide or nothing matches (caller falls back to a full refine).
+    """
+    words = _tokens(instructions)
+    if not words or words & GLOBAL_WORDS:
+        return []
+
+    scored = []
+    for node in nodes.values():
+        if node.tag in ("html", "body", "head"):
+            continue
+        source = html[node.start:node.end].lower()
+        hits = sum(1 for w in words if w in source)
+        if hits:
+            scored.append((-hits, node.end - node.start, node))
+    scored.sort(key=lambda item: (item[0], item[1]))
+
+    chosen, used = [], 0
+    for _, size, node in scored:
+        if len(chosen) >= max_targets or used + size > budget:
+            continue
+        if any(c.start <= node.start and node.end <= c.end or node.start <= c.start and c.end <= node.end for c in chosen):
+            continue
+        chosen.append(node)
+        used += size
+    return sorted(chosen, key=lambda n: n.start)
+
+
+def build_patch_prompt(system_prompt, html, root, targets, instructions):
+    subtrees = "\n\n".join(f"--- {n.node_id} ---\n{html[n.start:n.end]}" for n in targets)
+    return f"""
+        {system_prompt}
+
+        TASK: Apply the USER INSTRUCTIONS as targeted patches instead of rewriting the page.
+
+        USER INSTRUCTIONS: {instructions}
+
+        PAGE OUTLINE (element ids in brackets):
+        {outline(root, html)}
+
+        FULL HTML OF THE RELEVANT ELEMENTS:
+        {subtrees}
+
+        OUTPUT: Return ONLY a JSON object:
+        {{"patches": [{{"target": "<element id>", "action": "replace" | "insert_before" | "insert_after" | "delete", "html": "<new html>"}}]}}
+        Rules:
+        - "replace" may only target elements whose full HTML is shown above; "html" is the complete new element.
+        - "insert_before" / "insert_after" / "delete" may target any element in the outline.
+        - Keep patches minimal and do not overlap them.
+        """
+
+
+class PatchError(ValueError):
+    pass
+
+
+def apply_patches(html, nodes, patches, editable_ids):
+    """Applies model patches to the source by offset, last first. Raises PatchError on invalid input."""
+    edits = []
+    for patch in patches:
+        node = nodes.get(patch.get("target"))
+        action = patch.get("action", "replace")
+        new_html = patch.get("html", "")
+        if node is None:
+            raise PatchError(f"Unknown target {patch.get('target')!r}")
+        if action == "replace":
+            if node.node_id not in editable_ids:
+                raise PatchError(f"Replace on {node.node_id}, whose HTML was not provided")
+            edits.append((node.start, node.end, new_html))
+        elif action == "delete":
+            edits.append((node.start, node.end, ""))
+        elif action == "insert_before":
+            edits.append((node.start, node.start, new_html))
+        elif action == "insert_after":
+            edits.append((node.end, node.end, new_html))
+        else:
+            raise PatchError(f"Unknown action {action!r}")
+
+    edits.sort(key=lambda e: (e[0], e[1]), reverse=True)
+    for later, earlier in zip(edits, edits[1:]):
+        if earlier[1] > later[0]:
+            raise PatchError("Overlapping patches")
+
+    for start, end, new_html in edits:
+        html = html[:start] + new_html + html[end:]
+    return html
+
+
+def parse_patches(text):
+    data = json.loads(text.replace("```json", "").replace("```", ""))
+    patches = data.get("patches") if isinstance(data, dict) else data
+    if not isinstance(patches, list):
+        raise PatchError("Response has no patch list")
+    return patches
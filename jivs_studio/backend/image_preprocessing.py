@@ -0,0 +1,100 @@
+import io
+import math
+import os
+import warnings
+from dataclasses import dataclass
+
+from PIL import Image, ImageOps
+
+# Pixel budget for images sent to the model. Larger uploads are downscaled to
+# fit; Gemini bills images by tile, so extra resolution only adds tokens.
+IMAGE_MAX_PIXELS = int(os.getenv("IMAGE_MAX_PIXELS", str(1600 * 1000)))
+# Hard limits for what we are willing to decode at all (decompression bombs).
+IMAGE_DECODE_LIMIT = int(os.getenv("IMAGE_DECODE_LIMIT", str(50_000_000)))
+IMAGE_MAX_UPLOAD_BYTES = int(os.getenv("IMAGE_MAX_UPLOAD_BYTES", str(25 * 1024 * 1024)))
+IMAGE_FORMAT = os.getenv("IMAGE_FORMAT", "JPEG").upper()  # JPEG or WEBP
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", "85"))
+
+Image.MAX_IMAGE_PIXELS = IMAGE_DECODE_LIMIT
+
+_MIME_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp", "PNG": "image/png"}
+# EXIF orientations that rotate by 90/270 degrees, so the upright image has width and height swapped
+_TRANSPOSED_ORIENTATIONS = {5, 6, 7, 8}
+_EXIF_ORIENTATION = 0x0112
+
+
+class ImageTooLarge(ValueError):
+    """Upload exceeds the byte or pixel limits."""
+
+
+@dataclass
+class PreparedImage:
+    image: Image.Image  # normalized RGB image, for local processing
+    data: bytes  # encoded bytes sent to the model
+    mime_type: str
+    original_size: tuple  # upload size after EXIF rotation, i.e. in the same orientation as `image`
+
+    def as_part(self) -> dict:
+        """Inline blob accepted by generate_content, so the SDK does not re-encode the image."""
+        return {"mime_type": self.mime_type, "data": self.data}
+
+
+def _flatten(image: Image.Image) -> Image.Image:
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        rgba = image.convert("RGBA")
+        background = Image.new("RGB", rgba.size, (255, 255, 255))
+        background.paste(rgba, mask=rgba.getchannel("A"))
+        return background
+    return image.convert("RGB") if image.mode != "RGB" else image
+
+
+def prepare_image(raw: bytes, max_pixels: int = IMAGE_MAX_PIXELS) -> PreparedImage:
+    """
+    Downscales an uploaded image to the pixel budget, flattens it to RGB and
+    re-encodes it without metadata (EXIF, ICC, text chunks).
+
+    JPEG inputs use draft mode, so the decoder itself reduces by 1/2, 1/4 or
+    1/8 instead of decoding the full-resolution frame.
+    Raises ImageTooLarge for oversized uploads and decompression bombs.
+    """
+    if len(raw) > IMAGE_MAX_UPLOAD_BYTES:
+        raise ImageTooLarge(f"Image is {len(raw)} bytes; limit is {IMAGE_MAX_UPLOAD_BYTES}")
+
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", Image.DecompressionBombWarning)
+            image = Image.open(io.BytesIO(raw))  # reads the header only
+    except (Image.DecompressionBombError, Image.DecompressionBombWarning) as e:
+        raise ImageTooLarge(str(e))
+
+    width, height = image.size
+    if width * height > IMAGE_DECODE_LIMIT:
+        raise ImageTooLarge(f"Image is {width}x{height}; limit is {IMAGE_DECODE_LIMIT} pixels")
+    # Upright size, read from the EXIF tag so draft mode below still applies before decoding
+    transposed = image.getexif().get(_EXIF_ORIENTATION) in _TRANSPOSED_ORIENTATIONS
+    original_size = (height, width) if transposed else (width, height)
+
+    target = (width, height)
+    if width * height > max_pixels:
+        scale = math.sqrt(max_pixels / (width * height))
+        target = (max(1, int(width * scale)), max(1, int(height * scale)))
+
+    if image.format == "JPEG" and target != (width, height):
+        image.draft("RGB", target)
+
+    image = _flatten(ImageOps.exif_transpose(image))
+    width, height = image.size
+    if width * height > max_pixels:
+        scale = math.sqrt(max_pixels / (width * height))
+        image = image.resize((max(1, int(width * scale)), max(1, int(height * scale))),
+                             Image.LANCZOS, reducing_gap=3.0)
+
+    buffer = io.BytesIO()
+    fmt = IMAGE_FORMAT if IMAGE_FORMAT in _MIME_TYPES else "JPEG"
+    if fmt == "PNG":
+        image.save(buffer, format=fmt, optimize=True)
+    else:
+        image.save(buffer, format=fmt, quality=IMAGE_QUALITY)
+
+    return PreparedImage(image=image, data=buffer.getvalue(), mime_type=_MIME_TYPES[fmt],
+                         original_size=original_size)
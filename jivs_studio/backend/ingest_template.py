@@ -1,4 +1,9 @@
 import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from vector_store import DesignMemory
 
 # Your Template Data (Same as before)
@@ -15,28 +20,115 @@ ui_template_data = {
         {"type": "logo", "desc": "JIVS red circular logo top-left."},
         {"type": "header", "desc": "Main project title 'S/4 Transformation Project'."},
         {"type": "button", "desc": "Large red button 'START ALL ANALYSIS' aligned right."}
-    ]
+    ],
+    "theme": "Dark Mode, Enterprise, Dashboard, Red Accents.",
+    "style_rules": "Background: Dark (#121212), Primary Color: Red (#FF0000)"
 }
 
-def upload_data():
-    # This will now use Google Embeddings automatically because we updated vector_store.py
-    memory = DesignMemory()
-    
+def build_document(template):
+    """Turns a template dict (same shape as ui_template_data) into (embedding_text, metadata)."""
+    ui = template["UI"]
+    elements = template.get("elements", [])
+
     embedding_text = f"""
-    Style Name: {ui_template_data['UI']['name']}
-    Visual Style: {ui_template_data['UI']['overall_page_description']}
-    Key Components: {', '.join([e['type'] for e in ui_template_data['elements']])}
-    Theme: Dark Mode, Enterprise, Dashboard, Red Accents.
+    Style Name: {ui['name']}
+    Visual Style: {ui['overall_page_description']}
+    Key Components: {', '.join([e['type'] for e in elements])}
+    Theme: {template.get('theme', '')}
     """
 
     metadata = {
-        "name": ui_template_data['UI']['name'],
-        "image_path": ui_template_data['UI']['image_path'],
-        "style_rules": "Background: Dark (#121212), Primary Color: Red (#FF0000)"
+        "name": ui['name'],
+        "image_path": ui.get('image_path', ''),
+        "style_rules": template.get('style_rules', '')
+    }
+    return embedding_text, metadata
+
+def load_templates(path):
+    """Reads templates from a .jsonl file, a .json file (object or list) or a directory of them."""
+    if os.path.isdir(path):
+        for name in sorted(os.listdir(path)):
+            if name.endswith((".json", ".jsonl")):
+                yield from load_templates(os.path.join(path, name))
+        return
+
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            data = json.load(f)
+            yield from (data if isinstance(data, list) else [data])
+
+def _ingest_batch(memory, batch):
+    ids = [item[0] for item in batch]
+    texts = [item[1] for item in batch]
+    metadatas = [item[2] for item in batch]
+    vectors = memory.embedding_model.embed_documents(texts)
+    memory.upsert_embedded(ids, texts, metadatas, vectors)
+    return len(batch)
+
+def bulk_ingest(memory, templates, batch_size=64, concurrency=4):
+    """
+    Embeds and upserts templates in batches, with at most `concurrency` batches in flight.
+    Point ids are content hashes, so templates already in the collection are skipped
+    before any embedding call is made.
+    """
+    started = time.time()
+    items = {}
+    for template in templates:
+        text, metadata = build_document(template)
+        items.setdefault(DesignMemory.template_id(text, metadata), (text, metadata))
+
+    existing = set()
+    all_ids = list(items)
+    for i in range(0, len(all_ids), 1000):
+        existing |= memory.existing_ids(all_ids[i:i + 1000])
+
+    pending = [(pid, text, meta) for pid, (text, meta) in items.items() if pid not in existing]
+    batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+
+    stored = 0
+    failed = 0
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(_ingest_batch, memory, batch) for batch in batches]
+        for future in as_completed(futures):
+            try:
+                stored += future.result()
+            except Exception as e:
+                failed += 1
+                print(f"❌ Batch failed: {e}")
+
+    elapsed = time.time() - started
+    report = {
+        "templates": len(items),
+        "skipped_existing": len(existing),
+        "stored": stored,
+        "failed_batches": failed,
+        "seconds": round(elapsed, 2),
+        "templates_per_second": round(stored / elapsed, 2) if elapsed else 0.0,
     }
+    print(f"✅ Ingestion finished: {report}")
+    return report
+
+def upload_data():
+    # This will now use Google Embeddings automatically because we updated vector_store.py
+    memory = DesignMemory()
+    embedding_text, metadata = build_document(ui_template_data)
 
     print("Uploading template to Gemini-powered Qdrant...")
     memory.add_template(embedding_text, metadata)
 
 if __name__ == "__main__":
-    upload_data()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Ingest design-system templates into Qdrant.")
+    parser.add_argument("source", nargs="?", help="Directory of .json/.jsonl files, or a single file. Omit to upload the built-in sample template.")
+    parser.add_argument("--batch-size", type=int, default=64, help="Templates per embedding call")
+    parser.add_argument("--concurrency", type=int, default=4, help="Batches embedded/upserted in parallel")
+    args = parser.parse_args()
+
+    if args.source is None:
+        upload_data()
+    else:
+        report = bulk_ingest(DesignMemory(), load_templates(args.source), args.batch_size, args.concurrency)
+        sys.exit(1 if report["failed_batches"] else 0)
@@ -0,0 +1,408 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Local state (the job database) lives here, not in whatever directory the process started in
+JOB_DATA_DIR = os.getenv("JOB_DATA_DIR") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+# One SQLite file shared by the API and every job worker process (no external broker)
+JOB_DB_PATH = os.getenv("JOB_DB_PATH") or os.path.join(JOB_DATA_DIR, "jobs.sqlite3")
+# Queued + running jobs allowed before submissions are rejected with JobQueueFull
+JOB_MAX_PENDING = int(os.getenv("JOB_MAX_PENDING", "500"))
+# Finished jobs (and their results) are deleted after this long
+JOB_RETENTION = float(os.getenv("JOB_RETENTION", str(7 * 24 * 3600)))
+# A running job whose worker has not renewed its lease for this long is taken back (worker crashed)
+JOB_LEASE = float(os.getenv("JOB_LEASE", "30"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# Jobs a worker process runs at the same time
+JOB_WORKER_CONCURRENCY = int(os.getenv("JOB_WORKER_CONCURRENCY", "2"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))
+MAINTENANCE_INTERVAL = 30.0
+
+TERMINAL = ("done", "failed", "cancelled")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    run_after REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    lease_until REAL,
+    worker TEXT,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    ref TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_pending ON jobs (status, run_after, created_at);
+CREATE INDEX IF NOT EXISTS jobs_finished ON jobs (finished_at);
+CREATE INDEX IF NOT EXISTS jobs_ref ON jobs (ref);
+"""
+
+
+class JobQueueFull(RuntimeError):
+    """Too many jobs are queued or running; retry after `retry_after` seconds."""
+
+    def __init__(self, message: str, retry_after: float = 5.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class JobQueue:
+    """
+    Durable job queue in a local SQLite database (WAL mode), safe to share
+    between processes.
+
+    Jobs move queued -> running -> done | failed | cancelled. A worker claims a
+    job atomically and holds it under a lease it renews while the job runs;
+    if the worker dies, recover() puts the job back in the queue once the
+    lease expires (up to max_attempts), so work survives restarts and is run
+    at least once. Methods are blocking; async callers use asyncio.to_thread.
+    """
+
+    def __init__(self, path: str = JOB_DB_PATH, max_pending: int = JOB_MAX_PENDING,
+                 retention: float = JOB_RETENTION, lease: float = JOB_LEASE):
+        self.path = path
+        self.max_pending = max_pending
+        self.retention = retention
+        self.lease = lease
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+
+    def _transaction(self, fn):
+        """Runs fn(db) inside BEGIN IMMEDIATE, so read-then-write steps are atomic across processes."""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(self._db)
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+            return result
+
+    # --- producers ---
+
+    def submit(self, kind: str, payload: dict, max_attempts: int = JOB_MAX_ATTEMPTS) -> dict:
+        """Queues a job and returns its record; raises JobQueueFull past max_pending."""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+
+        def insert(db):
+            pending = db.execute("SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'running')").fetchone()[0]
+            if pending >= self.max_pending:
+                raise JobQueueFull(f"{pending} jobs already pending")
+            db.execute(
+                "INSERT INTO jobs (id, kind, payload, status, max_attempts, created_at, run_after) "
+                "VALUES (?, ?, ?, 'queued', ?, ?, ?)",
+                (job_id, kind, json.dumps(payload), max(1, max_attempts), now, now),
+            )
+
+        self._transaction(insert)
+        return self.get(job_id)
+
+    def cancel(self, job_id: str):
+        """
+        Cancels a queued job at once; a running one is flagged and stopped by its
+        worker at the next lease renewal. Returns the job record, or None if unknown.
+        """
+        now = time.time()
+
+        def update(db):
+            db.execute("UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE id = ? AND status = 'queued'",
+                       (now, job_id))
+            db.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = 'running'", (job_id,))
+
+        self._transaction(update)
+        return self.get(job_id)
+
+    def get(self, job_id: str, include_result: bool = True):
+        with self._lock:
+            row = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._record(row, include_result) if row else None
+
+    def find_result(self, kind: str, ref: str):
+        """Result of the finished `kind` job whose result carried `ref` (e.g. a project_id), or None."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT result FROM jobs WHERE ref = ? AND kind = ? AND status = 'done'", (ref, kind)
+            ).fetchone()
+        return json.loads(row["result"]) if row else None
+
+    @staticmethod
+    def _record(row, include_result: bool = True) -> dict:
+        record = {
+            "job_id": row["id"],
+            "kind": row["kind"],
+            "status": row["status"],
+            "attempts": row["attempts"],
+            "max_attempts": row["max_attempts"],
+            "created_at": row["created_at"],
+            "started_at": row["started_at"],
+            "finished_at": row["finished_at"],
+            "cancel_requested": bool(row["cancel_requested"]),
+            "error": row["error"],
+        }
+        if include_result:
+            record["result"] = json.loads(row["result"]) if row["result"] else None
+        return record
+
+    # --- workers ---
+
+    def claim(self, worker: str, kinds):
+        """Takes the oldest runnable job of `kinds` for `worker`; returns (job_id, kind, payload) or None."""
+        kinds = list(kinds)
+        now = time.time()
+
+        def take(db):
+            row = db.execute(
+                f"SELECT id, kind, payload FROM jobs WHERE status = 'queued' AND run_after <= ? "
+                f"AND kind IN ({', '.join('?' * len(kinds))}) ORDER BY created_at LIMIT 1",
+                (now, *kinds),
+            ).fetchone()
+            if row is None:
+                return None
+            db.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, attempts = attempts + 1, started_at = ?, "
+                "lease_until = ? WHERE id = ?",
+                (worker, now, now + self.lease, row["id"]),
+            )
+            return row["id"], row["kind"], json.loads(row["payload"])
+
+        return self._transaction(take) if kinds else None
+
+    def heartbeat(self, job_id: str, worker: str):
+        """
+        Renews the lease. Returns True if cancellation was requested, False to carry
+        on, None if `worker` no longer owns the job (lease expired and it was taken back).
+        """
+        with self._lock:
+            self._db.execute("UPDATE jobs SET lease_until = ? WHERE id = ? AND worker = ? AND status = 'running'",
+                             (time.time() + self.lease, job_id, worker))
+            row = self._db.execute("SELECT cancel_requested FROM jobs WHERE id = ? AND worker = ? AND status = 'running'",
+                                   (job_id, worker)).fetchone()
+        return bool(row["cancel_requested"]) if row else None
+
+    def _finish(self, job_id: str, worker: str, status: str, result=None, error: str = None):
+        ref = result.get("project_id") if isinstance(result, dict) else None
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, ref = ?, finished_at = ?, lease_until = NULL "
+                "WHERE id = ? AND worker = ? AND status = 'running'",
+                (status, json.dumps(result) if result is not None else None, error, ref, time.time(), job_id, worker),
+            )
+
+    def complete(self, job_id: str, worker: str, result):
+        self._finish(job_id, worker, "done", result=result)
+
+    def fail(self, job_id: str, worker: str, error: str):
+        self._finish(job_id, worker, "failed", error=error)
+
+    def mark_cancelled(self, job_id: str, worker: str):
+        self._finish(job_id, worker, "cancelled")
+
+    def release(self, job_id: str, worker: str, delay: float = 0.0, reason: str = None):
+        """
+        Returns a job to the queue without using up an attempt, runnable again
+        after `delay` seconds (worker shutting down, or capacity exhausted).
+        """
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = 'queued', attempts = attempts - 1, run_after = ?, worker = NULL, "
+                "lease_until = NULL, error = ? WHERE id = ? AND worker = ? AND status = 'running'",
+                (time.time() + delay, reason, job_id, worker),
+            )
+
+    # --- maintenance ---
+
+    def recover(self) -> int:
+        """Takes back running jobs with expired leases: re-queued while attempts remain, else failed."""
+        now = time.time()
+
+        def take_back(db):
+            requeued = db.execute(
+                "UPDATE jobs SET status = 'queued', run_after = ?, worker = NULL, lease_until = NULL "
+                "WHERE status = 'running' AND lease_until < ? AND attempts < max_attempts AND cancel_requested = 0",
+                (now, now),
+            ).rowcount
+            lost = db.execute(
+                "UPDATE jobs SET status = CASE WHEN cancel_requested THEN 'cancelled' ELSE 'failed' END, "
+                "error = CASE WHEN cancel_requested THEN error ELSE 'Worker lost while running the job' END, "
+                "finished_at = ?, lease_until = NULL WHERE status = 'running' AND lease_until < ?",
+                (now, now),
+            ).rowcount
+            return requeued + lost
+
+        recovered = self._transaction(take_back)
+        if recovered:
+            logger.warning(f"Recovered {recovered} jobs from workers that stopped renewing their lease")
+        return recovered
+
+    def purge(self) -> int:
+        """Deletes finished jobs older than the retention period."""
+        with self._lock:
+            deleted = self._db.execute(
+                f"DELETE FROM jobs WHERE status IN ({', '.join('?' * len(TERMINAL))}) AND finished_at < ?",
+                (*TERMINAL, time.time() - self.retention),
+            ).rowcount
+        if deleted:
+            logger.info(f"Purged {deleted} finished jobs")
+        return deleted
+
+    def summary(self) -> dict:
+        with self._lock:
+            counts = dict(self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+            oldest = self._db.execute("SELECT MIN(created_at) FROM jobs WHERE status = 'queued'").fetchone()[0]
+        return {
+            "counts": {status: counts.get(status, 0) for status in ("queued", "running", *TERMINAL)},
+            "oldest_queued_seconds": round(time.time() - oldest, 1) if oldest else 0.0,
+            "max_pending": self.max_pending,
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class JobWorker:
+    """
+    Drains a JobQueue: claims up to `concurrency` jobs whose kind has a handler
+    and awaits handler(payload) for each, renewing the job's lease meanwhile.
+    Exceptions in `retry_on` (e.g. quota or pool saturation) put the job back
+    in the queue for their `retry_after` without using up an attempt; any
+    other exception fails it. Runs inside the
+    API process or on its own (see job_worker.py).
+    """
+
+    def __init__(self, queue: JobQueue, handlers: dict, concurrency: int = JOB_WORKER_CONCURRENCY,
+                 retry_on: tuple = (), poll_interval: float = JOB_POLL_INTERVAL):
+        self.queue = queue
+        self.handlers = handlers
+        self.concurrency = max(1, concurrency)
+        self.retry_on = retry_on
+        self.poll_interval = poll_interval
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._running = {}  # job_id -> task
+        self._wake = None
+        self._stopping = False
+        self.stats = {"completed": 0, "failed": 0, "retried": 0, "cancelled": 0}
+
+    def wake(self):
+        """Claims new work now instead of at the next poll (called after an in-process submit)."""
+        if self._wake is not None:
+            self._wake.set()
+
+    async def run(self):
+        self._wake = asyncio.Event()
+        last_maintenance = 0.0
+        logger.info(f"Job worker {self.worker_id} started ({self.concurrency} slots, kinds: {', '.join(self.handlers)})")
+        while not self._stopping:
+            if time.monotonic() - last_maintenance > MAINTENANCE_INTERVAL:
+                last_maintenance = time.monotonic()
+                try:
+                    await asyncio.to_thread(self.queue.recover)
+                    await asyncio.to_thread(self.queue.purge)
+                except sqlite3.Error as e:
+                    logger.error(f"Job queue maintenance failed: {e}")
+
+            while len(self._running) < self.concurrency:
+                try:
+                    claimed = await asyncio.to_thread(self.queue.claim, self.worker_id, self.handlers)
+                except sqlite3.Error as e:
+                    logger.error(f"Job claim failed: {e}")
+                    claimed = None
+                if claimed is None:
+                    break
+                job_id, kind, payload = claimed
+                task = asyncio.create_task(self._execute(job_id, kind, payload))
+                self._running[job_id] = task
+                task.add_done_callback(lambda _, job_id=job_id: self._finished(job_id))
+
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+        await asyncio.gather(*self._running.values(), return_exceptions=True)
+        logger.info(f"Job worker {self.worker_id} stopped")
+
+    def _finished(self, job_id: str):
+        self._running.pop(job_id, None)
+        self.wake()
+
+    async def _execute(self, job_id: str, kind: str, payload: dict):
+        started = time.perf_counter()
+        task = asyncio.create_task(self.handlers[kind](payload))
+        try:
+            while True:
+                done, _ = await asyncio.wait({task}, timeout=self.queue.lease / 3)
+                if done:
+                    break
+                cancel = await asyncio.to_thread(self.queue.heartbeat, job_id, self.worker_id)
+                if cancel is None or cancel:
+                    task.cancel()
+                    await asyncio.gather(task, return_exceptions=True)
+                    if cancel:
+                        await asyncio.to_thread(self.queue.mark_cancelled, job_id, self.worker_id)
+                        self.stats["cancelled"] += 1
+                        logger.info(f"Job {job_id} ({kind}) cancelled")
+                    else:
+                        logger.warning(f"Job {job_id} ({kind}) lost its lease; another worker will run it")
+                    return
+        except asyncio.CancelledError:
+            # Worker shutting down: hand the job back without charging an attempt
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            await asyncio.to_thread(self.queue.release, job_id, self.worker_id)
+            raise
+
+        seconds = time.perf_counter() - started
+        try:
+            result = task.result()
+        except self.retry_on as e:
+            self.stats["retried"] += 1
+            retry_in = getattr(e, "retry_after", self.poll_interval)
+            logger.info(f"Job {job_id} ({kind}) deferred {retry_in}s: {e}")
+            await asyncio.to_thread(self.queue.release, job_id, self.worker_id, retry_in, str(e))
+            return
+        except Exception as e:
+            self.stats["failed"] += 1
+            detail = getattr(e, "detail", None) or str(e)  # HTTPException from the shared path
+            logger.error(f"Job {job_id} ({kind}) failed after {seconds:.1f}s: {detail}")
+            await asyncio.to_thread(self.queue.fail, job_id, self.worker_id, str(detail))
+            return
+
+        await asyncio.to_thread(self.queue.complete, job_id, self.worker_id, result)
+        self.stats["completed"] += 1
+        logger.info(f"Job {job_id} ({kind}) done in {seconds:.1f}s")
+
+    async def stop(self):
+        """Stops claiming and hands running jobs back to the queue for another worker."""
+        self._stopping = True
+        self.wake()
+        tasks = list(self._running.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def summary(self) -> dict:
+        return {**self.stats, "worker_id": self.worker_id, "running": len(self._running),
+                "concurrency": self.concurrency}
@@ -0,0 +1,51 @@
+"""
+Standalone job worker: drains the SQLite job queue (job_queue.py) without
+serving HTTP, so job capacity scales separately from API workers.
+
+    python job_worker.py [--concurrency N]
+
+Start it next to the API with JOB_INPROCESS_WORKERS=0 and the same
+JOB_DATA_DIR (or JOB_DB_PATH). SIGINT/SIGTERM hand running jobs back to the
+queue; if the process dies instead, they are re-queued once their lease expires.
+
+Only project_service.py is loaded, not the API (main.py): no HTTP app, Qdrant
+connection or session store is created here.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import signal
+
+import model_registry
+import project_service
+from job_queue import JOB_WORKER_CONCURRENCY
+from model_runtime import run_blocking, shutdown as shutdown_model_runtime
+
+
+async def run(concurrency: int):
+    api_key = os.getenv("GOOGLE_API_KEY")
+    if not api_key:
+        raise SystemExit("GOOGLE_API_KEY is missing")
+    model_registry.configure(api_key)
+    await run_blocking(model_registry.warmup, ((project_service.MODEL_NAME, None),
+                                               (project_service.MODEL_NAME, project_service.PLAN_CONFIG)))
+    await project_service.test_pool.start()
+    worker = project_service.make_job_worker(concurrency)
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, lambda: asyncio.ensure_future(worker.stop()))
+    try:
+        await worker.run()
+    finally:
+        await project_service.test_pool.close()
+        await asyncio.to_thread(project_service.response_cache.close)
+        shutdown_model_runtime()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    parser = argparse.ArgumentParser(description="Run queued generation and test jobs")
+    parser.add_argument("--concurrency", type=int, default=JOB_WORKER_CONCURRENCY)
+    asyncio.run(run(parser.parse_args().concurrency))
@@ -0,0 +1,270 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class LocalVectorIndex:
+    """
+    In-process mirror of a (small) Qdrant collection.
+
+    Vectors are stored L2-normalized in a memory-mapped float32 matrix
+    (`vectors.f32`) next to a JSON file with point ids and payloads, so a cosine
+    top-k lookup is a single matmul. Qdrant stays the source of truth: the
+    mirror is rebuilt from it with sync_from_qdrant() and patched on writes.
+    """
+
+    VECTORS_FILE = "vectors.f32"
+    META_FILE = "index.json"
+
+    def __init__(self, directory: str, dim: int = 768):
+        self.directory = directory
+        self.dim = dim
+        self.ids = []
+        self.payloads = []
+        self._matrix = np.zeros((0, dim), dtype=np.float32)
+        self._stamp = None  # (mtime_ns, size) of the index.json generation currently mapped
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def __len__(self):
+        return len(self.ids)
+
+    # --- persistence ---
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _file_stamp(self):
+        try:
+            stat = os.stat(self._path(self.META_FILE))
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load(self):
+        meta_path = self._path(self.META_FILE)
+        self._stamp = self._file_stamp()
+        if self._stamp is None:
+            return
+        with open(meta_path, "r") as f:
+            meta = json.load(f)
+        if meta.get("dim") != self.dim or not meta.get("ids"):
+            return
+        self.ids = meta["ids"]
+        self.payloads = meta["payloads"]
+        self._matrix = np.memmap(self._path(self.VECTORS_FILE), dtype=np.float32, mode="r",
+                                 shape=(len(self.ids), self.dim))
+
+    def _write(self, ids, payloads, matrix):
+        """Writes a new generation of the index atomically, then re-maps it."""
+        vec_tmp = self._path(self.VECTORS_FILE + ".tmp")
+        meta_tmp = self._path(self.META_FILE + ".tmp")
+        if len(ids):
+            out = np.memmap(vec_tmp, dtype=np.float32, mode="w+", shape=matrix.shape)
+            out[:] = matrix
+            out.flush()
+            del out
+        else:
+            open(vec_tmp, "wb").close()
+        with open(meta_tmp, "w") as f:
+            json.dump({"dim": self.dim, "ids": ids, "payloads": payloads}, f)
+
+        # Drop the old mapping before replacing the file underneath it
+        self._matrix = np.zeros((0, self.dim), dtype=np.float32)
+        os.replace(vec_tmp, self._path(self.VECTORS_FILE))
+        os.replace(meta_tmp, self._path(self.META_FILE))
+        self._stamp = self._file_stamp()
+
+        self.ids = list(ids)
+        self.payloads = list(payloads)
+        if self.ids:
+            self._matrix = np.memmap(self._path(self.VECTORS_FILE), dtype=np.float32, mode="r",
+                                     shape=(len(self.ids), self.dim))
+
+    def reload_if_changed(self) -> bool:
+        """
+        Re-maps the index when another process (e.g. ingest_template.py sharing
+        the mirror directory) wrote a new generation. Returns True if it did.
+        """
+        if self._file_stamp() == self._stamp:
+            return False
+        with self._lock:
+            if self._file_stamp() == self._stamp:
+                return False
+            self.ids, self.payloads = [], []
+            self._matrix = np.zeros((0, self.dim), dtype=np.float32)
+            self._load()
+        logger.info(f"Local index reloaded from disk: {len(self.ids)} vectors")
+        return True
+
+    @staticmethod
+    def _normalize(matrix):
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (matrix / norms).astype(np.float32)
+
+    @staticmethod
+    def _point_vector(point):
+        vector = point.vector
+        if isinstance(vector, dict):
+            # Named vectors: the langchain store uses the default (unnamed) one
+            vector = vector.get("", next(iter(vector.values())))
+        return vector
+
+    # --- sync with Qdrant ---
+
+    def sync_from_qdrant(self, client, collection_name: str, batch_size: int = 256):
+        """Full rebuild from a scroll over the collection."""
+        ids, payloads, vectors = [], [], []
+        offset = None
+        while True:
+            points, offset = client.scroll(
+                collection_name=collection_name,
+                limit=batch_size,
+                offset=offset,
+                with_payload=True,
+                with_vectors=True,
+            )
+            for point in points:
+                ids.append(str(point.id))
+                payloads.append(point.payload or {})
+                vectors.append(self._point_vector(point))
+            if offset is None:
+                break
+
+        matrix = self._normalize(np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim))
+        with self._lock:
+            self._write(ids, payloads, matrix)
+        logger.info(f"Local index synced: {len(ids)} vectors from {collection_name}")
+
+    @staticmethod
+    def _fingerprint(entries) -> str:
+        """Order-independent hash of (id, payload) pairs."""
+        digest = hashlib.sha256()
+        for pid, payload in sorted((str(pid), json.dumps(payload, sort_keys=True, default=str))
+                                   for pid, payload in entries):
+            digest.update(f"{len(pid)}:{pid}{len(payload)}:{payload}".encode("utf-8"))
+        return digest.hexdigest()
+
+    def remote_fingerprint(self, client, collection_name: str, batch_size: int = 1024) -> str:
+        """Fingerprint of the collection, from a payload-only scroll (no vectors transferred)."""
+        entries = []
+        offset = None
+        while True:
+            points, offset = client.scroll(
+                collection_name=collection_name,
+                limit=batch_size,
+                offset=offset,
+                with_payload=True,
+                with_vectors=False,
+            )
+            entries.extend((point.id, point.payload or {}) for point in points)
+            if offset is None:
+                break
+        return self._fingerprint(entries)
+
+    def is_in_sync(self, client, collection_name: str) -> bool:
+        """
+        Staleness check. A point-count mismatch is decided without a scroll;
+        otherwise ids and payloads are compared by hash, which catches points
+        replaced in place or deleted and re-inserted. Vectors are not compared:
+        they are embeddings of the payload's page_content.
+        """
+        if client.count(collection_name=collection_name, exact=True).count != len(self.ids):
+            return False
+        with self._lock:
+            local = self._fingerprint(zip(self.ids, self.payloads))
+        return self.remote_fingerprint(client, collection_name) == local
+
+    def upsert_points(self, points):
+        """Applies freshly written Qdrant points (from client.retrieve) to the mirror."""
+        if not points:
+            return
+        with self._lock:
+            ids = list(self.ids)
+            payloads = list(self.payloads)
+            matrix = np.array(self._matrix, dtype=np.float32)
+            positions = {pid: i for i, pid in enumerate(ids)}
+            new_rows = []
+            for point in points:
+                pid = str(point.id)
+                row = self._normalize(np.asarray([self._point_vector(point)], dtype=np.float32))[0]
+                if pid in positions:
+                    matrix[positions[pid]] = row
+                    payloads[positions[pid]] = point.payload or {}
+                else:
+                    positions[pid] = len(ids)
+                    ids.append(pid)
+                    payloads.append(point.payload or {})
+                    new_rows.append(row)
+            if new_rows:
+                matrix = np.vstack([matrix, np.asarray(new_rows, dtype=np.float32)])
+            self._write(ids, payloads, matrix)
+
+    # --- search ---
+
+    def search(self, vector, k: int = 1):
+        """Returns [(score, payload), ...] for the k nearest vectors by cosine similarity."""
+        query = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+        with self._lock:
+            if not self.ids:
+                return []
+            scores = self._matrix @ query
+            payloads = self.payloads
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(float(scores[i]), payloads[i]) for i in top]
+
+    # --- snapshots ---
+
+    def export_snapshot(self, path: str):
+        """Writes ids, payloads and vectors to one compressed .npz file."""
+        with self._lock:
+            np.savez_compressed(
+                path,
+                vectors=np.asarray(self._matrix, dtype=np.float32),
+                meta=np.frombuffer(json.dumps({"dim": self.dim, "ids": self.ids,
+                                               "payloads": self.payloads}).encode("utf-8"), dtype=np.uint8),
+            )
+        logger.info(f"Local index snapshot exported to {path} ({len(self.ids)} vectors)")
+
+    def import_snapshot(self, path: str):
+        with np.load(path) as snapshot:
+            meta = json.loads(snapshot["meta"].tobytes().decode("utf-8"))
+            if meta["dim"] != self.dim:
+                raise ValueError(f"Snapshot dimension {meta['dim']} does not match index dimension {self.dim}")
+            matrix = snapshot["vectors"].astype(np.float32).reshape(-1, self.dim)
+        with self._lock:
+            self._write(meta["ids"], meta["payloads"], matrix)
+        logger.info(f"Local index snapshot imported from {path} ({len(self.ids)} vectors)")
+
+
+if __name__ == "__main__":
+    import argparse
+    from vector_store import DesignMemory
+
+    parser = argparse.ArgumentParser(description="Manage the local mirror of the design-system collection.")
+    parser.add_argument("command", choices=["sync", "export"])
+    parser.add_argument("snapshot", nargs="?", default="design_index_snapshot.npz", help="Snapshot path for export")
+    args = parser.parse_args()
+
+    memory = DesignMemory()
+    if memory.mirror is None:
+        raise SystemExit("Set DESIGN_MEMORY_MIRROR_DIR to enable the local mirror.")
+
+    if args.command == "sync":
+        memory.mirror.sync_from_qdrant(memory.client, memory.collection_name)
+    else:
+        # New nodes bootstrap from this file via DESIGN_MEMORY_SNAPSHOT
+        memory.mirror.export_snapshot(args.snapshot)
@@ -1,21 +1,42 @@
 import logging
 import sys
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request, Query, Header
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, Response, JSONResponse
 from pydantic import BaseModel
-import google.generativeai as genai
 from dotenv import load_dotenv
-from PIL import Image
-import io
 import os
 from vector_store import DesignMemory
-from compare_images import compare_images_gemini 
-import base64
+import model_registry
+from model_registry import get_model
+from compare_images import compare_images_gemini, compare_regions_gemini, comparison_fallback, COMPARISON_MODEL, COMPARISON_CONFIG
+from model_runtime import stream_content, run_blocking, run_model_call, shutdown as shutdown_model_runtime
+from model_runtime import scheduler as model_call_scheduler
+from model_scheduler import ModelBusy, set_priority
+from streaming import FenceStripper, IncrementalJSONParser, sse_event, SSE_HEADERS
+from image_preprocessing import prepare_image, ImageTooLarge, PreparedImage
+from visual_metrics import compare_local, local_verdict_report, find_diff_regions
+import html_patch
+import design_tools
+from html_patch import strip_design_tools, PatchError
+from design_sessions import SessionStore, SessionNotFound, VersionConflict
+from request_dedup import IdempotencyStore, IdempotencyMismatch, fingerprint
+from job_queue import JobQueueFull
+from batch_jobs import BatchManager, BatchFull, JobNotFound, BATCH_MAX_ITEMS, BATCH_CONCURRENCY
+from pytest_pool import QueueFull
+import project_export
+from project_scaffolds import ScaffoldMerger
+from project_service import (
+    MODEL_NAME, ProjectGenRequest, TestRunRequest, response_cache, single_flight, job_queue, test_pool,
+    test_workspaces, test_results, generated_projects, decode_image_data, response_key, cached_generate,
+    project_scaffold, build_project_payload, store_project, parallel_project_events, generate_project_result,
+    validate_files, run_tests_result, make_job_worker,
+)
+import asyncio
+import math
 import json
-import tempfile
-import subprocess
-import shutil
-from typing import Dict, Optional, Any, List
+import time
+from typing import Dict, Optional, Any, List, Callable
 
 # --- 1. CONFIGURATION ---
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
@@ -28,7 +49,29 @@ if not GOOGLE_KEY:
     logger.error("GOOGLE_API_KEY is missing from .env file")
     raise RuntimeError("GOOGLE_API_KEY is missing")
 
-genai.configure(api_key=GOOGLE_KEY)
+model_registry.configure(GOOGLE_KEY)
+
+# Idempotency-Key results are replayed (identical in-flight model calls are
+# coalesced in project_service.py)
+idempotency = IdempotencyStore()
+
+# Background batch jobs (/generate-code/batch, /generate-project/batch), see batch_jobs.py
+batch_jobs = BatchManager()
+
+# Durable jobs for long runs (/generate-project/jobs, /run-tests/jobs), see project_service.py.
+# JOB_INPROCESS_WORKERS jobs run inside this API process; set it to 0 and start
+# `python job_worker.py` processes to scale job workers separately.
+JOB_INPROCESS_WORKERS = int(os.getenv("JOB_INPROCESS_WORKERS", "2"))
+job_worker = None
+
+# Versioned HTML documents, so refinements can reference a doc_id instead of resending the page
+session_store = SessionStore()
+
+# AssetManager artifact directory (uploads/, generated_code/, asset_ledger.json) served by /assets/export.
+# Defaults to where streamlit_app/app.py writes when run from its own directory, independent of our cwd.
+ASSET_EXPORT_DIR = os.getenv("ASSET_EXPORT_DIR") or os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "streamlit_app", "ji_project_assets"
+)
 
 # Initialize Design Memory (Qdrant)
 try:
@@ -47,6 +90,58 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.exception_handler(ModelBusy)
+async def model_busy_handler(request: Request, exc: ModelBusy):
+    # Quota exhausted after retries, or too many calls queued: tell the client when to come back
+    return JSONResponse(status_code=429, content={"detail": str(exc)},
+                        headers={"Retry-After": str(math.ceil(exc.retry_after))})
+
+def stream_error(e: Exception) -> dict:
+    """Payload of an SSE "error" event; scheduler rejections carry the 429 status and retry hint."""
+    if isinstance(e, ModelBusy):
+        return {"detail": str(e), "status": 429, "retry_after": e.retry_after}
+    if isinstance(e, HTTPException):
+        return {"detail": e.detail, "status": e.status_code}
+    return {"detail": str(e)}
+
+@app.on_event("startup")
+async def warmup_models():
+    # Build shared model handles and prime model discovery before the first request
+    await run_blocking(model_registry.warmup, ((MODEL_NAME, None), (COMPARISON_MODEL, COMPARISON_CONFIG)))
+
+@app.get("/static/design-tools.{version}.js")
+async def design_tools_asset(version: str, request: Request):
+    """
+    Design Mode controls referenced by generated pages. The current version is
+    immutable and cached for a year; older versions get the current script but
+    must revalidate.
+    """
+    cache_control = "public, max-age=31536000, immutable" if version == design_tools.ASSET_VERSION else "no-cache"
+    headers = {"ETag": design_tools.ASSET_ETAG, "Cache-Control": cache_control}
+    if request.headers.get("if-none-match") == design_tools.ASSET_ETAG:
+        return Response(status_code=304, headers=headers)
+    return Response(design_tools.ASSET_BYTES, media_type="application/javascript", headers=headers)
+
+@app.on_event("startup")
+async def start_test_pool():
+    await test_pool.start()
+
+@app.on_event("startup")
+async def start_job_worker():
+    global job_worker
+    await asyncio.to_thread(job_queue.recover)
+    if JOB_INPROCESS_WORKERS > 0:
+        job_worker = make_job_worker(JOB_INPROCESS_WORKERS)
+        asyncio.create_task(job_worker.run())
+
+@app.on_event("shutdown")
+async def shutdown_runtime():
+    if job_worker is not None:
+        await job_worker.stop()
+    await test_pool.close()
+    await asyncio.to_thread(response_cache.close)
+    shutdown_model_runtime()
+
 # --- 2. SYSTEM PROMPT ---
 SYSTEM_PROMPT = """
 You are an Expert Frontend Developer. 
@@ -60,398 +155,811 @@ Your task is to convert UI screenshots into production-ready HTML using Tailwind
 """
 
 # --- 3. HELPER: INJECT DESIGN TOOLS ---
+# The Design Mode controls are served once from /static/design-tools.<version>.js
+# (see design_tools.py); generated pages only carry a small loader tag.
+DESIGN_TOOLS_SCRIPT = design_tools.LOADER_TAG
+
 def inject_design_tools(raw_html: str) -> str:
     """
-    Injects the Design Mode & Download scripts into the generated HTML.
+    Injects the Design Mode & Download loader into the generated HTML.
+    Safe to call on HTML that already has it (or the old inline script).
     """
-    controls_script = """
-    <script src="https://html2canvas.hertzen.com/dist/html2canvas.min.js"></script>
-    
-    <div id="ui-controls" style="position: fixed; top: 10px; right: 10px; z-index: 10000; display: flex; gap: 10px;">
-        <button id="toggle-design-btn" onclick="toggleDesignMode()" style="background: #444; color: #fff; padding: 10px 15px; border: none; border-radius: 6px; cursor: pointer; font-weight: bold; font-family: sans-serif; box-shadow: 0 2px 5px rgba(0,0,0,0.2);">
-            ✏️ Design Mode: OFF
-        </button>
-        <button onclick="downloadAsImage()" style="background: #2563EB; color: #fff; padding: 10px 15px; border: none; border-radius: 6px; cursor: pointer; font-weight: bold; font-family: sans-serif; box-shadow: 0 2px 5px rgba(0,0,0,0.2);">
-            📸 Download Image
-        </button>
-    </div>
-
-    <script>
-    // --- DESIGN MODE LOGIC ---
-    let isDesignMode = false;
-    let draggedEl = null;
-    let startX, startY, initialTx, initialTy;
-
-    function toggleDesignMode() {
-        isDesignMode = !isDesignMode;
-        const btn = document.getElementById('toggle-design-btn');
-        document.body.contentEditable = isDesignMode; // Allows text editing everywhere
-        
-        if (isDesignMode) {
-            btn.innerHTML = "✅ Finish Editing";
-            btn.style.background = "#059669"; // Green
-            document.body.style.cursor = "default";
-            enableDragging();
-        } else {
-            btn.innerHTML = "✏️ Design Mode: OFF";
-            btn.style.background = "#444";
-            disableDragging();
-        }
-    }
-
-    function enableDragging() {
-        document.addEventListener('mousedown', startDrag);
-        document.addEventListener('mousemove', drag);
-        document.addEventListener('mouseup', endDrag);
-    }
-
-    function disableDragging() {
-        document.removeEventListener('mousedown', startDrag);
-        document.removeEventListener('mousemove', drag);
-        document.removeEventListener('mouseup', endDrag);
-    }
-
-    function startDrag(e) {
-        // Don't drag if clicking buttons or inputs
-        if (e.target.tagName === 'BUTTON' || e.target.closest('#ui-controls')) return;
-        
-        draggedEl = e.target;
-        
-        // Prevent editing text while dragging
-        draggedEl.contentEditable = false; 
+    return design_tools.inject(raw_html)
+
+# --- 4. DATA MODELS ---
+# ProjectGenRequest and TestRunRequest live in project_service.py (shared with job workers)
+
+class ValidateRequest(BaseModel):
+    code_files: Dict[str, str]
+
+# --- 5. ENDPOINTS ---
+
+async def load_image(content: bytes) -> PreparedImage:
+    """Downscales/re-encodes an upload off the event loop (see image_preprocessing.py)."""
+    try:
+        return await run_blocking(prepare_image, content)
+    except ImageTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+async def read_uploads(files: list[UploadFile]) -> list[bytes]:
+    return [content for content in [await file.read() for file in files] if len(content) > 0]
+
+async def build_generation_payload(prompt: str, images: list[bytes]):
+    """
+    Builds the Gemini payload for /generate-code: instruction + style context + uploaded images.
+    Returns (payload, cache_key_parts).
+    """
+    # A. SEARCH MEMORY (Qdrant)
+    style_context = ""
+    if design_memory:
+        try:
+            retrieved_style = await run_blocking(design_memory.find_similar_style, prompt)
+            if retrieved_style and retrieved_style.metadata:
+                logger.info(f"Using style template: {retrieved_style.metadata.get('name')}")
+                style_context = design_memory.render_style_guide(retrieved_style)
+        except Exception as e:
+            logger.error(f"Memory Search Failed: {e}")
+
+    full_instruction = f"{SYSTEM_PROMPT}\n\nUser Request: {prompt}{style_context}"
+    payload = [full_instruction]
+    key_parts = [full_instruction]
+
+    for content in images:
+        image = await load_image(content)
+        payload.append(image.as_part())
+        key_parts.append(image.data)
+
+    return payload, key_parts
+
+def shared_stream(model, contents, key: str):
+    """stream_content() with concurrent identical streams coalesced (late joiners replay earlier chunks)."""
+    return single_flight.stream(key, lambda: stream_content(model, contents))
+
+async def with_idempotency(scope: str, idempotency_key: Optional[str], request_fingerprint: str,
+                           response: Response, fn):
+    """Runs fn() once per Idempotency-Key; retries get the stored result with Idempotent-Replayed: true."""
+    if not idempotency_key:
+        return await fn()
+    try:
+        result, replayed = await idempotency.run(scope, idempotency_key, request_fingerprint, fn)
+    except IdempotencyMismatch as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return result
+
+def is_error_event(event: str) -> bool:
+    return event.startswith("event: error\n")
+
+def idempotent_event_stream(scope: str, idempotency_key: Optional[str], request_fingerprint: str,
+                            factory) -> StreamingResponse:
+    """SSE response for factory(); with an Idempotency-Key a completed stream is replayed event by event."""
+    headers = dict(SSE_HEADERS)
+    if idempotency_key:
+        try:
+            events, replayed = idempotency.stream(scope, idempotency_key, request_fingerprint, factory, is_error_event)
+        except IdempotencyMismatch as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        if replayed:
+            headers["Idempotent-Replayed"] = "true"
+    else:
+        events = factory()
+    return StreamingResponse(events, media_type="text/event-stream", headers=headers)
+
+def build_refine_prompt(current_html: str, instructions: str) -> str:
+    # Callers strip the injected design tools first (html_patch.strip_design_tools)
+    # so the model only sees the page itself.
+    return f"""
+        {SYSTEM_PROMPT}
         
-        startX = e.clientX;
-        startY = e.clientY;
+        TASK: Update the following HTML code based strictly on the USER INSTRUCTIONS.
         
-        // Get current transform values (if any)
-        const style = window.getComputedStyle(draggedEl);
-        const matrix = new WebKitCSSMatrix(style.webkitTransform);
-        initialTx = matrix.m41;
-        initialTy = matrix.m42;
+        USER INSTRUCTIONS: {instructions}
         
-        draggedEl.style.transition = 'none'; // Disable transition for smooth drag
-        draggedEl.style.zIndex = 1000; // Bring to front
-    }
-
-    function drag(e) {
-        if (!draggedEl) return;
-        e.preventDefault();
-        const dx = e.clientX - startX;
-        const dy = e.clientY - startY;
-        draggedEl.style.transform = `translate(${initialTx + dx}px, ${initialTy + dy}px)`;
-    }
-
-    function endDrag(e) {
-        if (!draggedEl) return;
-        draggedEl.contentEditable = isDesignMode; // Re-enable text edit
-        draggedEl.style.zIndex = ''; // Reset Z
-        draggedEl = null;
-    }
-
-    // --- DOWNLOAD LOGIC ---
-    function downloadAsImage() {
-        // 1. Hide the controls so they don't appear in the image
-        const controls = document.getElementById('ui-controls');
-        controls.style.display = 'none';
+        CURRENT CODE:
+        {current_html}
         
-        // 2. Temporarily turn off Design Mode borders/indicators if any
-        const wasDesignMode = isDesignMode;
-        if (isDesignMode) toggleDesignMode(); 
-
-        const element = document.body;
-
-        html2canvas(element, {
-            useCORS: true,
-            allowTaint: true,
-            backgroundColor: '#ffffff', // Force white background for cleaner screenshots
-            scrollY: -window.scrollY // Fix scroll issues
-        }).then(canvas => {
-            const link = document.createElement('a');
-            link.download = 'marketing_asset_' + new Date().getTime() + '.png';
-            link.href = canvas.toDataURL();
-            link.click();
-            
-            // 3. Restore UI state
-            controls.style.display = 'flex';
-            if (wasDesignMode) toggleDesignMode();
-        });
-    }
-    </script>
+        OUTPUT: Return ONLY the updated valid HTML code. No markdown.
+        """
+
+async def stream_html_events(model, contents, label: str, key_parts: list, no_cache: bool = False,
+                             on_complete: Optional[Callable[[str], dict]] = None):
     """
-    
-    # Append the script to the end of the HTML body
-    if "</body>" in raw_html:
-        return raw_html.replace("</body>", f"{controls_script}</body>")
-    else:
-        return raw_html + controls_script
-
-# --- 3. NEW HELPERS (Project Gen & Testing) ---
-
-def generate_placeholder_tests(code_files: Dict[str, str], test_dir_path: str):
-    """Generates dummy tests to ensure the runner works even if no tests exist."""
-    test_content = """
-import pytest
-def test_placeholder_success():
-    assert 1 == 1
-def test_component_structure():
-    # Placeholder: In real app, mount component and check
-    assert True
-"""
-    # Create a generic test file
-    test_file_path = os.path.join(test_dir_path, "test_generated.py")
-    with open(test_file_path, "w") as f:
-        f.write(test_content)
+    Forwards model output as SSE "chunk" events with markdown fences stripped.
+    The design tools payload is sent as the last chunk, so concatenating every
+    chunk yields the same HTML as the non-streaming endpoint.
+    Cache hits are replayed as a single chunk; completed streams are stored.
+    on_complete(html) receives the finished page (without design tools) and
+    its return value is sent as the "done" event payload.
+    """
+    key = response_key(model, key_parts)
+    stripper = FenceStripper(("```html", "```"))
+    try:
+        cached = None
+        if no_cache:
+            response_cache.record_bypass()
+        else:
+            cached = await response_cache.get(key)
+
+        if cached is not None:
+            logger.info("Response cache hit")
+            page = cached.replace("```html", "").replace("```", "")
+            yield sse_event("chunk", {"html": page})
+        else:
+            raw, clean_parts = [], []
+            async for text in shared_stream(model, contents, key):
+                raw.append(text)
+                clean = stripper.feed(text)
+                if clean:
+                    clean_parts.append(clean)
+                    yield sse_event("chunk", {"html": clean})
+            tail = stripper.flush()
+            if tail:
+                clean_parts.append(tail)
+                yield sse_event("chunk", {"html": tail})
+            response_cache.set(key, "".join(raw))
+            page = "".join(clean_parts)
+        yield sse_event("chunk", {"html": DESIGN_TOOLS_SCRIPT})
+        yield sse_event("done", on_complete(page) if on_complete else {})
+    except Exception as e:
+        logger.error(f"{label} Stream Error: {e}")
+        yield sse_event("error", stream_error(e))
 
-# --- 4. DATA MODELS ---
+async def generate_page(model, payload, key_parts: list, no_cache: bool = False) -> dict:
+    """One /generate-code result: the page with design tools injected, stored as a new session document."""
+    # C. GENERATE
+    logger.info("Generating code with Gemini 1.5 Pro...")
+    text = await cached_generate(model, payload, key_parts, no_cache)
+    code = text.replace("```html", "").replace("```", "")
 
-class ProjectGenRequest(BaseModel):
-    framework: str # e.g. "React", "Vue", "Angular"
-    description: str
-    image_data: Optional[str] = None # Base64 string
+    # [NEW] Inject the design tools before returning
+    final_code = inject_design_tools(code)
+    doc_id, version = session_store.create(code)
 
-class TestRunRequest(BaseModel):
-    code_files: Dict[str, str]
-    framework: str
-
-# --- 5. ENDPOINTS ---
+    return {"html": final_code, "doc_id": doc_id, "version": version}
 
 @app.post("/generate-code")
 async def generate_code(
+    response: Response,
     prompt: str = Form(...),
-    files: list[UploadFile] = File(default=[])
+    files: list[UploadFile] = File(default=[]),
+    no_cache: bool = Form(False),
+    idempotency_key: Optional[str] = Header(None)
 ):
+    set_priority("generate")
     try:
-        # A. SEARCH MEMORY (Qdrant)
-        style_context = ""
-        if design_memory:
-            try:
-                retrieved_style = design_memory.find_similar_style(prompt)
-                if retrieved_style and retrieved_style.metadata:
-                    logger.info(f"Using style template: {retrieved_style.metadata.get('name')}")
-                    style_context = f"""
-                    \n\n**STRICT STYLE GUIDE (FROM DATABASE):**
-                    - Base Design: {retrieved_style.metadata.get('name')}
-                    - Visual Rules: {retrieved_style.page_content}
-                    - Style Metadata: {retrieved_style.metadata}
-                    
-                    PLEASE ADHERE TO THIS VISUAL THEME.
-                    """
-            except Exception as e:
-                logger.error(f"Memory Search Failed: {e}")
-
         # B. PREPARE MODEL
-        model = genai.GenerativeModel('gemini-2.5-flash-lite')
-        
-        full_instruction = f"{SYSTEM_PROMPT}\n\nUser Request: {prompt}{style_context}"
-        payload = [full_instruction]
-
-        for file in files:
-            content = await file.read()
-            if len(content) > 0:
-                image = Image.open(io.BytesIO(content))
-                payload.append(image)
-
-        # C. GENERATE
-        logger.info("Generating code with Gemini 1.5 Pro...")
-        response = model.generate_content(payload)
-        code = response.text.replace("```html", "").replace("```", "")
-        
-        # [NEW] Inject the design tools before returning
-        final_code = inject_design_tools(code)
-        
-        return {"html": final_code}
+        model = get_model(MODEL_NAME)
+        images = await read_uploads(files)
+
+        async def generate():
+            # Memory search and image preprocessing run only when the key has no stored result
+            payload, key_parts = await build_generation_payload(prompt, images)
+            return await generate_page(model, payload, key_parts, no_cache)
 
+        # The client's own input: retrieved style context may differ between tries of one request
+        return await with_idempotency("generate-code", idempotency_key, fingerprint(prompt, *images, no_cache),
+                                      response, generate)
+
+    except (HTTPException, ModelBusy):
+        raise
     except Exception as e:
         logger.error(f"Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/generate-code/stream")
+async def generate_code_stream(
+    prompt: str = Form(...),
+    files: list[UploadFile] = File(default=[]),
+    no_cache: bool = Form(False),
+    idempotency_key: Optional[str] = Header(None)
+):
+    """
+    Streaming variant of /generate-code (Server-Sent Events).
+    Emits "chunk" events with {"html": ...} as the model writes, then "done" (or "error").
+    """
+    set_priority("generate")
+    model = get_model(MODEL_NAME)
+    images = await read_uploads(files)
+
+    def start_session(page: str) -> dict:
+        doc_id, version = session_store.create(page)
+        return {"doc_id": doc_id, "version": version}
+
+    async def events():
+        # Built once the stream runs, so a replayed Idempotency-Key skips memory search
+        # and image preprocessing; failures (e.g. an oversized image) become an "error" event
+        try:
+            payload, key_parts = await build_generation_payload(prompt, images)
+        except Exception as e:
+            logger.error(f"Generate Stream Error: {e}")
+            yield sse_event("error", stream_error(e))
+            return
+        async for event in stream_html_events(model, payload, "Generate", key_parts, no_cache, start_session):
+            yield event
+
+    logger.info("Streaming code generation...")
+    return idempotent_event_stream("generate-code/stream", idempotency_key, fingerprint(prompt, *images, no_cache), events)
+
 class RefineCodeRequest(BaseModel):
-    current_html: str
     instructions: str
+    # Either reference a stored document (doc_id + base_version) or send the page itself
+    doc_id: Optional[str] = None
+    base_version: Optional[int] = None
+    current_html: Optional[str] = None
+    no_cache: bool = False
+    mode: str = "full" # "full" rewrites the page, "patch" edits only the relevant elements
+
+PATCH_CONFIG = {"response_mime_type": "application/json"}
+
+async def refine_full(current_html: str, instructions: str, no_cache: bool = False) -> str:
+    model = get_model(MODEL_NAME)
+    prompt = build_refine_prompt(current_html, instructions)
+    text = await cached_generate(model, prompt, [prompt], no_cache)
+    return text.replace("```html", "").replace("```", "")
+
+async def refine_patch(current_html: str, instructions: str, no_cache: bool = False):
+    """
+    Sends only the elements relevant to the instruction plus a page outline, and
+    applies the returned patches. Returns None when the edit cannot be localized
+    or the patches do not apply, so the caller can fall back to a full refine.
+    """
+    root, nodes = html_patch.parse(current_html)
+    targets = html_patch.select_targets(nodes, current_html, instructions)
+    if not targets:
+        return None
+
+    prompt = html_patch.build_patch_prompt(SYSTEM_PROMPT, current_html, root, targets, instructions)
+    text = await cached_generate(get_model(MODEL_NAME, PATCH_CONFIG), prompt, [prompt], no_cache)
+    try:
+        patches = html_patch.parse_patches(text)
+        return html_patch.apply_patches(current_html, nodes, patches, {n.node_id for n in targets})
+    except (PatchError, ValueError, TypeError, AttributeError) as e:
+        logger.warning(f"Patch refine failed, falling back to full refine: {e}")
+        return None
+
+async def refine_html(current_html: str, instructions: str, mode: str = "full", no_cache: bool = False):
+    """Refines page HTML (design tools stripped). Returns (html, mode_used)."""
+    html = strip_design_tools(current_html, DESIGN_TOOLS_SCRIPT)
+    if mode == "patch":
+        patched = await refine_patch(html, instructions, no_cache)
+        if patched is not None:
+            return patched, "patch"
+    return await refine_full(html, instructions, no_cache), "full"
+
+def resolve_refine_source(req: RefineCodeRequest):
+    """
+    Returns (doc_id, base_version, html) for a refine request. Requests that still
+    send current_html start a new document so later rounds can use the doc_id.
+    """
+    if req.doc_id:
+        try:
+            version, html = session_store.head(req.doc_id)
+        except SessionNotFound:
+            raise HTTPException(status_code=404, detail=f"Unknown document {req.doc_id}")
+        if req.base_version is not None and req.base_version != version:
+            raise HTTPException(status_code=409, detail=f"Base version {req.base_version} is not the head ({version})")
+        return req.doc_id, version, html
+    if req.current_html is None:
+        raise HTTPException(status_code=400, detail="Provide doc_id or current_html")
+    html = strip_design_tools(req.current_html, DESIGN_TOOLS_SCRIPT)
+    doc_id, version = session_store.create(html, "import")
+    return doc_id, version, html
+
+def commit_refinement(doc_id: str, base_version: int, html: str, instructions: str) -> int:
+    try:
+        return session_store.commit(doc_id, html, base_version, note=instructions[:200])
+    except VersionConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
 
 @app.post("/refine-code")
 async def refine_code(req: RefineCodeRequest):
+    set_priority("interactive")
     try:
         logger.info("Refining code with Gemini...")
-        model = genai.GenerativeModel('gemini-2.5-flash-lite')
-        
-        # We need to strip the script before sending back to AI to avoid confusion, 
-        # or tell the AI to ignore scripts.
-        # Simple approach: Tell AI to focus on structure.
-        
-        prompt = f"""
-        {SYSTEM_PROMPT}
-        
-        TASK: Update the following HTML code based strictly on the USER INSTRUCTIONS.
-        
-        USER INSTRUCTIONS: {req.instructions}
-        
-        CURRENT CODE:
-        {req.current_html}
-        
-        OUTPUT: Return ONLY the updated valid HTML code. No markdown.
-        """
-        
-        response = model.generate_content(prompt)
-        code = response.text.replace("```html", "").replace("```", "")
+        doc_id, base_version, current_html = resolve_refine_source(req)
+        code, mode_used = await refine_html(current_html, req.instructions, req.mode, req.no_cache)
+        version = commit_refinement(doc_id, base_version, code, req.instructions)
         
         # [NEW] Re-inject the design tools into the refined code
         final_code = inject_design_tools(code)
         
-        return {"html": final_code}
+        return {"html": final_code, "mode": mode_used, "doc_id": doc_id, "version": version}
         
+    except (HTTPException, ModelBusy):
+        raise
     except Exception as e:
         logger.error(f"Refine Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/refine-code/stream")
+async def refine_code_stream(req: RefineCodeRequest):
+    """Streaming variant of /refine-code. Same event format as /generate-code/stream."""
+    set_priority("interactive")
+    logger.info("Streaming refinement...")
+    doc_id, base_version, current_html = resolve_refine_source(req)
+    model = get_model(MODEL_NAME)
+    prompt = build_refine_prompt(current_html, req.instructions)
+
+    def save_version(page: str) -> dict:
+        try:
+            version = session_store.commit(doc_id, page, base_version, note=req.instructions[:200])
+        except VersionConflict as e:
+            return {"doc_id": doc_id, "version": None, "conflict": str(e)}
+        return {"doc_id": doc_id, "version": version}
+
+    return StreamingResponse(
+        stream_html_events(model, prompt, "Refine", [prompt], req.no_cache, save_version),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+    )
+
+
+# --- DOCUMENT SESSIONS ---
+def _session_call(fn, *args):
+    try:
+        return fn(*args)
+    except SessionNotFound as e:
+        raise HTTPException(status_code=404, detail=f"Unknown document or version {e}")
+    except VersionConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@app.get("/sessions/{doc_id}")
+async def session_history(doc_id: str):
+    return _session_call(session_store.history, doc_id)
+
+@app.get("/sessions/{doc_id}/versions/{version}")
+async def session_version(doc_id: str, version: int):
+    html = _session_call(session_store.get, doc_id, version)
+    return {"html": inject_design_tools(html), "doc_id": doc_id, "version": version}
+
+@app.post("/sessions/{doc_id}/undo")
+async def session_undo(doc_id: str):
+    version, html = _session_call(session_store.undo, doc_id)
+    return {"html": inject_design_tools(html), "doc_id": doc_id, "version": version}
+
+@app.post("/sessions/{doc_id}/redo")
+async def session_redo(doc_id: str):
+    version, html = _session_call(session_store.redo, doc_id)
+    return {"html": inject_design_tools(html), "doc_id": doc_id, "version": version}
+
+async def model_comparison(fn, *args, regions: list = None) -> dict:
+    """
+    Runs a comparison helper through the scheduler (admission, retries, 429 throttling).
+    Only when it has given up is the score-0 fallback returned; exhausted quota
+    stays a ModelBusy so the client gets 429 with Retry-After.
+    """
+    try:
+        return await run_model_call(fn, *args, raise_errors=True)
+    except ModelBusy:
+        raise
+    except Exception as e:
+        logger.error(f"Comparison Error: {e}")
+        return comparison_fallback(e, regions)
 
 @app.post("/verify-design")
 async def verify_design(
     original_file: UploadFile = File(...),
-    generated_screenshot: UploadFile = File(...)
+    generated_screenshot: UploadFile = File(...),
+    use_model: str = Form("auto"),
+    mode: str = Form("full")
 ):
     """
     Receives the Original Image and a Screenshot of the Generated Code.
     Returns a similarity score and list of visual discrepancies.
     Does NOT modify the code.
+
+    A local perceptual comparison (visual_metrics.py) always runs first and is
+    returned as "local_analysis". use_model controls the Gemini critique:
+    "auto" skips it for clear passes/failures, "always" / "never" force it.
+    mode="regions" sends only the locally detected differing regions (plus a
+    low-res overview) to the model and returns per-region findings with boxes.
     """
+    set_priority("interactive")
     try:
         # 1. Load Images
         orig_bytes = await original_file.read()
         gen_bytes = await generated_screenshot.read()
         
-        orig_img = Image.open(io.BytesIO(orig_bytes))
-        gen_img = Image.open(io.BytesIO(gen_bytes))
-
-        # 2. Run Comparison Logic
-        logger.info("Comparing Original vs Generated...")
-        analysis = compare_images_gemini(orig_img, gen_img, GOOGLE_KEY)
+        orig_img = await load_image(orig_bytes)
+        gen_img = await load_image(gen_bytes)
+
+        # 2. Local pre-scoring
+        local = await run_blocking(compare_local, orig_img.image, gen_img.image)
+        skip_model = use_model == "never" or (use_model == "auto" and local["verdict"] != "uncertain")
+
+        # 3. Run Comparison Logic
+        if skip_model:
+            logger.info(f"Local verdict '{local['verdict']}', skipping model comparison")
+            analysis = local_verdict_report(local)
+        elif mode == "regions":
+            regions = await run_blocking(find_diff_regions, orig_img.image, gen_img.image)
+            if regions:
+                logger.info(f"Comparing {len(regions)} differing regions...")
+                analysis = await model_comparison(compare_regions_gemini, orig_img.image, gen_img.image, regions, GOOGLE_KEY,
+                                                  regions=regions)
+                # Boxes were computed on the normalized image; report them in upload pixels
+                sx = orig_img.original_size[0] / orig_img.image.width
+                sy = orig_img.original_size[1] / orig_img.image.height
+                for region in analysis["regions"]:
+                    x0, y0, x1, y1 = region["box"]
+                    region["box"] = [round(x0 * sx), round(y0 * sy), round(x1 * sx), round(y1 * sy)]
+            else:
+                skip_model = True
+                analysis = {**local_verdict_report({**local, "verdict": "pass"}), "regions": []}
+        else:
+            logger.info("Comparing Original vs Generated...")
+            analysis = await model_comparison(compare_images_gemini, orig_img.as_part(), gen_img.as_part(), GOOGLE_KEY)
         
         logger.info(f"Analysis Complete. Score: {analysis.get('similarity_score')}")
 
+        analysis["local_analysis"] = local
+        analysis["model_used"] = not skip_model
         return analysis
 
+    except (HTTPException, ModelBusy):
+        raise
     except Exception as e:
         logger.error(f"Verification Failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
     
-# [NEW] MULTI-FILE PROJECT GENERATOR
 @app.post("/generate-project")
-async def generate_project(payload: ProjectGenRequest):
+async def generate_project(payload: ProjectGenRequest, response: Response,
+                           idempotency_key: Optional[str] = Header(None)):
     """
     Generates a full project structure (multiple files) based on an image/description.
     Returns JSON with analysis and file contents.
     """
+    set_priority("generate")
     try:
-        model = genai.GenerativeModel('gemini-2.5-flash-lite')
-        
-        prompt_parts = [
-            f"""You are an expert UI developer. 
-            Your task is to generate a new, production-ready {payload.framework} application from scratch.
-            
-            User Description: {payload.description}
-            
-            OUTPUT RULES:
-            Your response MUST be a single, valid JSON object with "analysis" and "generated_code" keys.
-            The "analysis" key must contain a JSON object with fields like "summary", "reasoning", "components_generated".
-            The "generated_code" key must contain an object where each key is a full filename (e.g., "src/App.vue", "package.json") and each value is the complete code for that file.
-            """
-        ]
-
-        if payload.image_data:
-            # Decode base64 image
-            try:
-                if "base64," in payload.image_data:
-                    img_str = payload.image_data.split("base64,")[1]
-                else:
-                    img_str = payload.image_data
-                
-                img_bytes = base64.b64decode(img_str)
-                image = Image.open(io.BytesIO(img_bytes))
-                prompt_parts.append(image)
-            except Exception as e:
-                logger.error(f"Image decode failed: {e}")
-
-        logger.info(f"Generating {payload.framework} project...")
-        response = model.generate_content(prompt_parts)
-        
-        # Clean response
-        txt = response.text.replace("```json", "").replace("```", "")
-        result_json = json.loads(txt)
-        
-        return {
-            "success": True,
-            "framework": payload.framework,
-            "files": result_json.get("generated_code", {}),
-            "analysis": result_json.get("analysis", {})
-        }
-
+        return await with_idempotency("generate-project", idempotency_key, fingerprint(payload.model_dump()),
+                                      response, lambda: generate_project_result(payload))
+    except (HTTPException, ModelBusy):
+        raise
     except Exception as e:
         logger.error(f"Project Gen Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-# [NEW] TEST RUNNER
+def wants_project_value(path: tuple) -> bool:
+    """Paths emitted by the project stream: the analysis object, requested packages and each generated file."""
+    return path in (("analysis",), ("dependencies",)) or (len(path) == 2 and path[0] == "generated_code")
+
+def project_events(path: tuple, value, merger: Optional[ScaffoldMerger], files: Dict[str, str]) -> list:
+    """
+    SSE events for one parsed value; emitted files are also recorded in `files`.
+    With a scaffold, boilerplate files from the model are dropped.
+    """
+    if path == ("analysis",):
+        return [sse_event("analysis", value)]
+    if path == ("dependencies",):
+        if merger:
+            merger.add_dependencies(value)
+        return []
+    content = value if isinstance(value, str) else json.dumps(value, indent=2)
+    file = (path[1], content)
+    if merger:
+        file = merger.accept(*file)
+        if file is None:
+            return []
+    files[file[0]] = file[1]
+    return [sse_event("file", {"path": file[0], "content": file[1]})]
+
+async def stream_project_events(model, contents, key_parts: list, no_cache: bool, framework: str, scaffold=None):
+    """
+    Parses the model's JSON incrementally and emits a "file" event ({path, content})
+    as soon as each generated_code value is complete, "analysis" when that object
+    closes, then "done" ({framework, files}) or "error". Scaffold files are sent
+    first; package.json is sent again at the end if the model asked for packages.
+    The finished project is stored and its project_id sent with "done".
+    """
+    key = response_key(model, key_parts)
+    parser = IncrementalJSONParser(wants_project_value)
+    merger = ScaffoldMerger(scaffold) if scaffold else None
+    files = {}
+    emitted = 0
+    try:
+        if scaffold:
+            files.update(scaffold.files)
+            for path, content in scaffold.files.items():
+                yield sse_event("file", {"path": path, "content": content})
+
+        cached = None
+        if no_cache:
+            response_cache.record_bypass()
+        else:
+            cached = await response_cache.get(key)
+
+        if cached is not None:
+            logger.info("Response cache hit")
+            for path, value in parser.feed(cached):
+                for event in project_events(path, value, merger, files):
+                    emitted += path[0] == "generated_code"
+                    yield event
+        else:
+            raw = []
+            async for text in shared_stream(model, contents, key):
+                raw.append(text)
+                for path, value in parser.feed(text):
+                    for event in project_events(path, value, merger, files):
+                        emitted += path[0] == "generated_code"
+                        yield event
+            if parser.done:
+                response_cache.set(key, "".join(raw))
+
+        if not parser.done:
+            raise ValueError("Model response ended before the JSON object was complete")
+        if merger:
+            for path, content in merger.final_files().items():
+                files[path] = content
+                yield sse_event("file", {"path": path, "content": content})
+        yield sse_event("done", {"framework": framework, "files": emitted,
+                                 "scaffold": scaffold.name if scaffold else None,
+                                 "project_id": store_project(framework, files)})
+    except Exception as e:
+        logger.error(f"Project Stream Error: {e}")
+        yield sse_event("error", stream_error(e))
+
+async def stream_parallel_project_events(payload: ProjectGenRequest):
+    """SSE form of parallel_project_events; same events as stream_project_events plus "file_error"."""
+    files = {}
+    emitted, failed = 0, 0
+    try:
+        async for event in parallel_project_events(payload):
+            if event[0] == "analysis":
+                yield sse_event("analysis", event[1])
+            elif event[0] == "scaffold":
+                files.update(event[1])
+                for path, content in event[1].items():
+                    yield sse_event("file", {"path": path, "content": content})
+            elif event[0] == "file":
+                emitted += 1
+                files[event[1]] = event[2]
+                yield sse_event("file", {"path": event[1], "content": event[2]})
+            else:
+                failed += 1
+                yield sse_event("file_error", {"path": event[1], "detail": event[2]})
+        yield sse_event("done", {"framework": payload.framework, "files": emitted, "failed": failed,
+                                 "project_id": store_project(payload.framework, files)})
+    except Exception as e:
+        logger.error(f"Project Stream Error: {e}")
+        yield sse_event("error", stream_error(e))
+
+@app.post("/generate-project/stream")
+async def generate_project_stream(payload: ProjectGenRequest, idempotency_key: Optional[str] = Header(None)):
+    """
+    Streaming variant of /generate-project (Server-Sent Events). Files are delivered
+    one by one while the model is still writing the rest.
+    """
+    set_priority("generate")
+    request_fingerprint = fingerprint(payload.model_dump())
+    if payload.mode == "parallel":
+        logger.info(f"Streaming {payload.framework} project (plan + parallel files)...")
+        return idempotent_event_stream("generate-project/stream", idempotency_key, request_fingerprint,
+                                       lambda: stream_parallel_project_events(payload))
+
+    model = get_model(MODEL_NAME)
+    scaffold = project_scaffold(payload)
+    prompt_parts, key_parts = await build_project_payload(payload, scaffold=scaffold)
+
+    logger.info(f"Streaming {payload.framework} project..." + (f" ({scaffold.name} scaffold)" if scaffold else ""))
+    return idempotent_event_stream(
+        "generate-project/stream", idempotency_key, request_fingerprint,
+        lambda: stream_project_events(model, prompt_parts, key_parts, payload.no_cache, payload.framework, scaffold),
+    )
+
+def export_response(entries, basename: str, fmt: str) -> StreamingResponse:
+    if fmt not in project_export.FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(project_export.FORMATS)}")
+    media_type = project_export.FORMATS[fmt][0]
+    # A sync iterator: Starlette pulls chunks in its thread pool, so compression stays off the event loop
+    return StreamingResponse(project_export.stream_archive(entries, fmt), media_type=media_type,
+                             headers=project_export.download_headers(basename, fmt))
+
+@app.get("/projects/{project_id}/export")
+async def export_project(project_id: str, format: str = Query("zip")):
+    """Streams a generated project as a ZIP or tar.gz archive, built chunk by chunk."""
+    project = generated_projects.get(project_id)
+    if project is None:
+        # Projects generated by a job in another worker process live in the job queue
+        project = await asyncio.to_thread(job_queue.find_result, "generate-project", project_id)
+        if project is not None:
+            project["created_at"] = time.time()
+    if project is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired project_id")
+    basename = project_export.safe_basename(f"{project['framework'].lower()}_project")
+    entries = project_export.file_map_entries(project["files"], prefix=basename, mtime=project["created_at"])
+    return export_response(entries, basename, format)
+
+@app.get("/assets/export")
+async def export_assets(format: str = Query("zip")):
+    """Streams the AssetManager artifact directory (uploads, generated code, ledger) from disk."""
+    if not os.path.isdir(ASSET_EXPORT_DIR):
+        raise HTTPException(status_code=404, detail="No generated assets to export")
+    basename = project_export.safe_basename(os.path.basename(os.path.abspath(ASSET_EXPORT_DIR)))
+    return export_response(project_export.directory_entries(ASSET_EXPORT_DIR, prefix=basename), basename, format)
+
+class BatchCodeItem(BaseModel):
+    prompt: str
+    image_data: Optional[str] = None # Base64 string
+
+class BatchCodeRequest(BaseModel):
+    items: List[BatchCodeItem]
+    no_cache: bool = False
+    concurrency: int = BATCH_CONCURRENCY # Items of this job generated at once (capped by BATCH_CONCURRENCY)
+
+class BatchProjectRequest(BaseModel):
+    items: List[ProjectGenRequest]
+    concurrency: int = BATCH_CONCURRENCY
+
+def check_batch_size(items: list):
+    if not items:
+        raise HTTPException(status_code=400, detail="A batch needs at least one item")
+    if len(items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"A batch may hold at most {BATCH_MAX_ITEMS} items")
+
+def submit_batch(kind: str, items: list, run_item, concurrency: int):
+    try:
+        return batch_jobs.submit(kind, items, run_item, concurrency)
+    except BatchFull as e:
+        raise HTTPException(status_code=503, detail=f"Batch queue is full: {e}")
+
+def batch_accepted(job) -> JSONResponse:
+    return JSONResponse(status_code=202, content={
+        "job_id": job.job_id,
+        "status": job.status,
+        "total": len(job.items),
+        "poll": f"/batch/{job.job_id}",
+        "stream": f"/batch/{job.job_id}/stream",
+    })
+
+@app.post("/generate-code/batch")
+async def generate_code_batch(req: BatchCodeRequest):
+    """
+    Queues one /generate-code per item and returns a job_id at once (202).
+    Items run in the background at the "batch" priority; each finished page is
+    stored as a session document, so results reference a doc_id like /generate-code.
+    """
+    check_batch_size(req.items)
+    model = get_model(MODEL_NAME)
+
+    async def run_item(item: BatchCodeItem) -> dict:
+        images = [decode_image_data(item.image_data)] if item.image_data else []
+        payload, key_parts = await build_generation_payload(item.prompt, images)
+        return await generate_page(model, payload, key_parts, req.no_cache)
+
+    job = submit_batch("generate-code", req.items, run_item, req.concurrency)
+    logger.info(f"Batch {job.job_id}: {len(req.items)} pages queued")
+    return batch_accepted(job)
+
+@app.post("/generate-project/batch")
+async def generate_project_batch(req: BatchProjectRequest):
+    """Batch variant of /generate-project; every finished project is stored for export under its project_id."""
+    check_batch_size(req.items)
+    job = submit_batch("generate-project", req.items, generate_project_result, req.concurrency)
+    logger.info(f"Batch {job.job_id}: {len(req.items)} projects queued")
+    return batch_accepted(job)
+
+@app.get("/batch/{job_id}")
+async def batch_status(job_id: str, results: bool = Query(True)):
+    """Job status with per-item state; results=false leaves out the generated pages/projects."""
+    try:
+        return batch_jobs.get(job_id).snapshot(include_results=results)
+    except JobNotFound:
+        raise HTTPException(status_code=404, detail="Batch job not found or expired")
+
+@app.get("/batch/{job_id}/stream")
+async def batch_stream(job_id: str):
+    """
+    Progress as Server-Sent Events: "snapshot" (current state), one "item" event
+    with its result per finished item, then "done". Reconnecting replays the job so far.
+    """
+    try:
+        events = batch_jobs.events(job_id)
+        first = await events.__anext__()
+    except JobNotFound:
+        raise HTTPException(status_code=404, detail="Batch job not found or expired")
+
+    async def stream():
+        yield sse_event(*first)
+        async for event, data in events:
+            yield sse_event(event, data)
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Hit/miss counters for the response cache."""
+    return response_cache.summary()
+
+@app.get("/model/stats")
+async def model_stats():
+    """Scheduler state: in-flight calls, queue depth and wait percentiles per priority class, quota buckets."""
+    return model_call_scheduler().summary()
+
+@app.get("/dedup/stats")
+async def dedup_stats():
+    """Coalesced model calls/streams and Idempotency-Key replays."""
+    return {"single_flight": single_flight.stats, "idempotency": idempotency.summary()}
+
+# [NEW] TEST RUNNER (see project_service.py)
+@app.post("/validate-project")
+async def validate_project_endpoint(request: ValidateRequest):
+    """Structural checks only (JSON, JS/TS/JSX, Vue SFC, HTML, CSS, Python, imports). No code is executed."""
+    return await validate_files(request.code_files)
+
 @app.post("/run-tests")
 async def run_tests(request: TestRunRequest):
     """
-    Receives code files, writes them to temp dir, runs pytest, returns report.
+    Receives code files, validates them statically and, if that passes, runs pytest
+    on a warm worker (bounded concurrency, per-run timeout and memory/CPU limits).
+    Identical file sets are answered from
+    the result cache; with a project_id only changed files are rewritten and only
+    affected tests re-run.
     """
-    with tempfile.TemporaryDirectory() as temp_dir:
-        try:
-            # 1. Write Code Files
-            for filename, content in request.code_files.items():
-                # Handle nested directories (e.g., src/components/Header.jsx)
-                file_path = os.path.join(temp_dir, filename)
-                os.makedirs(os.path.dirname(file_path), exist_ok=True)
-                
-                with open(file_path, "w", encoding="utf-8") as f:
-                    f.write(content)
-
-            # 2. Generate Dummy Tests (Since we are generating UI code, not test code usually)
-            generate_placeholder_tests(request.code_files, temp_dir)
-
-            # 3. Run Pytest
-            report_file = os.path.join(temp_dir, "report.json")
-            
-            # Note: Ensure 'pytest-json-report' is installed in your python env
-            cmd = [sys.executable, "-m", "pytest", "--json-report", f"--json-report-file={report_file}"]
-            
-            process = subprocess.run(
-                cmd,
-                cwd=temp_dir,
-                capture_output=True,
-                text=True
-            )
-
-            # 4. Parse Report
-            if not os.path.exists(report_file):
-                # If report wasn't generated, pytest likely crashed or config error
-                return {
-                    "summary": {"passed": 0, "failed": 1, "total": 1},
-                    "tests": [{"name": "System", "outcome": "failed", "message": f"Pytest Execution Failed:\n{process.stderr}"}]
-                }
-
-            with open(report_file) as f:
-                report_data = json.load(f)
-
-            # 5. Format Output
-            formatted_tests = []
-            for test in report_data.get("tests", []):
-                formatted_tests.append({
-                    "name": test.get("nodeid"),
-                    "outcome": test.get("outcome"),
-                    "duration": test.get("duration"),
-                    "message": test.get("longrepr", "") if test.get("outcome") == 'failed' else ""
-                })
-
-            return {
-                "summary": report_data.get("summary", {}),
-                "tests": formatted_tests
-            }
+    try:
+        return await run_tests_result(request)
+    except QueueFull as e:
+        raise HTTPException(status_code=503, detail=f"Test runner is busy: {e}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Test Runner Error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
 
-        except Exception as e:
-            logger.error(f"Test Runner Error: {e}")
-            raise HTTPException(status_code=500, detail=str(e))
+@app.get("/run-tests/stats")
+async def run_tests_stats():
+    return {**test_pool.summary(), "workspaces": len(test_workspaces), "cached_results": len(test_results)}
+
+# [NEW] DURABLE JOBS
+async def submit_job(kind: str, payload: BaseModel, response: Response, idempotency_key: Optional[str]) -> dict:
+    """Queues a job (202); a retried submission with the same Idempotency-Key gets the same job."""
+    async def submit():
+        try:
+            job = await asyncio.to_thread(job_queue.submit, kind, payload.model_dump())
+        except JobQueueFull as e:
+            raise HTTPException(status_code=503, detail=f"Job queue is full: {e}",
+                                headers={"Retry-After": str(math.ceil(e.retry_after))})
+        if job_worker is not None:
+            job_worker.wake()
+        logger.info(f"Job {job['job_id']} ({kind}) queued")
+        return {**job, "poll": f"/jobs/{job['job_id']}", "cancel": f"/jobs/{job['job_id']}/cancel"}
+
+    response.status_code = 202
+    return await with_idempotency(f"jobs/{kind}", idempotency_key, fingerprint(payload.model_dump()), response, submit)
+
+@app.post("/generate-project/jobs")
+async def generate_project_job(payload: ProjectGenRequest, response: Response,
+                               idempotency_key: Optional[str] = Header(None)):
+    """Queues /generate-project as a durable job; poll GET /jobs/{job_id} for the result."""
+    return await submit_job("generate-project", payload, response, idempotency_key)
+
+@app.post("/run-tests/jobs")
+async def run_tests_job_endpoint(request: TestRunRequest, response: Response,
+                                 idempotency_key: Optional[str] = Header(None)):
+    """Queues /run-tests as a durable job; poll GET /jobs/{job_id} for the report."""
+    return await submit_job("run-tests", request, response, idempotency_key)
+
+@app.get("/jobs/stats")
+async def job_stats():
+    """Jobs per status and queue age; this process's worker counters when it runs one."""
+    stats = await asyncio.to_thread(job_queue.summary)
+    return {**stats, "worker": job_worker.summary() if job_worker is not None else None}
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str, result: bool = Query(True)):
+    """Status, attempts and timings of a job, plus its result once done (result=false leaves it out)."""
+    job = await asyncio.to_thread(job_queue.get, job_id, result)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return job
+
+@app.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    """Cancels a queued job at once; a running one stops at its worker's next lease renewal."""
+    job = await asyncio.to_thread(job_queue.cancel, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return job
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,71 @@
+import json
+import logging
+import os
+import threading
+import time
+
+import google.generativeai as genai
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = os.getenv("GENERATION_MODEL", "gemini-2.5-flash-lite")
+MODEL_DISCOVERY_TTL = float(os.getenv("MODEL_DISCOVERY_TTL", "3600"))
+
+_lock = threading.Lock()
+_configured_key = None
+_models = {}
+_discovery = {"models": None, "fetched_at": 0.0}
+
+
+def configure(api_key: str):
+    """Configures the SDK once per key instead of on every call."""
+    global _configured_key
+    with _lock:
+        if api_key and api_key != _configured_key:
+            genai.configure(api_key=api_key)
+            _configured_key = api_key
+            _models.clear()
+
+
+def get_model(model_name: str = DEFAULT_MODEL, generation_config: dict = None) -> genai.GenerativeModel:
+    """Returns a shared GenerativeModel handle for (model_name, generation_config)."""
+    key = (model_name, json.dumps(generation_config or {}, sort_keys=True))
+    model = _models.get(key)
+    if model is None:
+        with _lock:
+            model = _models.get(key)
+            if model is None:
+                model = genai.GenerativeModel(model_name, generation_config=generation_config)
+                _models[key] = model
+    return model
+
+
+def model_signature(model) -> str:
+    """Model name plus generation config, e.g. for cache keys that must not cross configs."""
+    config = getattr(model, "_generation_config", None)  # set by genai.GenerativeModel
+    if config is None:
+        config = getattr(model, "generation_config", None)
+    return f"{model.model_name}|{json.dumps(config or {}, sort_keys=True, default=str)}"
+
+
+def list_models(force: bool = False) -> list:
+    """Names of models supporting generateContent, cached for MODEL_DISCOVERY_TTL seconds."""
+    now = time.time()
+    if not force and _discovery["models"] is not None and now - _discovery["fetched_at"] < MODEL_DISCOVERY_TTL:
+        return _discovery["models"]
+    models = [m.name for m in genai.list_models() if 'generateContent' in m.supported_generation_methods]
+    _discovery["models"] = models
+    _discovery["fetched_at"] = now
+    return models
+
+
+def warmup(model_specs=((DEFAULT_MODEL, None),), discover: bool = True):
+    """Builds the model handles used on the hot path and primes the discovery cache."""
+    for model_name, generation_config in model_specs:
+        get_model(model_name, generation_config)
+    if discover:
+        try:
+            models = list_models(force=True)
+            logger.info(f"Model registry warm: {len(_models)} handles, {len(models)} models discovered")
+        except Exception as e:
+            logger.warning(f"Model discovery failed during warmup: {e}")
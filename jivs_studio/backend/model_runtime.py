@@ -0,0 +1,139 @@
+import asyncio
+import functools
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from model_scheduler import (ModelScheduler, ModelBusy, current_priority, estimate_tokens, is_transient,
+                             is_rate_limit, backoff_delay, MODEL_MAX_RETRIES, MODEL_EST_OUTPUT_TOKENS)
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on model calls in flight per process. Requests beyond this wait
+# in the model scheduler (see model_scheduler.py) instead of piling more work
+# onto the Gemini quota.
+MAX_CONCURRENT_MODEL_CALLS = int(os.getenv("MAX_CONCURRENT_MODEL_CALLS", "8"))
+
+# Worker threads for the blocking SDK calls we cannot await natively
+# (Qdrant lookups, the image comparison helper, ...).
+BLOCKING_WORKERS = int(os.getenv("BLOCKING_WORKERS", str(MAX_CONCURRENT_MODEL_CALLS * 2)))
+
+_executor = ThreadPoolExecutor(max_workers=BLOCKING_WORKERS, thread_name_prefix="blocking-call")
+_scheduler = None
+
+
+def scheduler() -> ModelScheduler:
+    # Created lazily so its timers bind to the running uvicorn event loop.
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = ModelScheduler(MAX_CONCURRENT_MODEL_CALLS)
+    return _scheduler
+
+
+async def run_blocking(fn, *args, **kwargs):
+    """Runs a synchronous callable on the bounded worker pool without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(fn, *args, **kwargs))
+
+
+def _usage_tokens(response):
+    usage = getattr(response, "usage_metadata", None)
+    return getattr(usage, "total_token_count", None) or None
+
+
+async def _retry_or_raise(error: Exception, attempt: int, priority: str):
+    """Sleeps before the next attempt of a transient failure; raises when out of retries or not transient."""
+    sched = scheduler()
+    if is_rate_limit(error):
+        sched.throttle(priority)
+    if not is_transient(error):
+        raise error
+    if attempt >= MODEL_MAX_RETRIES:
+        if is_rate_limit(error):
+            raise ModelBusy(f"Model quota exhausted: {error}", retry_after=sched.retry_after()) from error
+        raise error
+    delay = backoff_delay(attempt)
+    sched.record_retry(priority)
+    logger.warning(f"Model call failed ({error}); retry {attempt + 1}/{MODEL_MAX_RETRIES} in {delay:.1f}s")
+    await asyncio.sleep(delay)
+
+
+async def generate_content(model, contents, **kwargs):
+    """
+    Native async Gemini call, admitted by the model scheduler (priority class of
+    the current request, request/token quotas) and retried on transient errors.
+    Accepts the same arguments as GenerativeModel.generate_content.
+    """
+    priority = current_priority()
+    estimate = estimate_tokens(contents)
+    attempt = 0
+    while True:
+        try:
+            async with scheduler().slot(priority, estimate) as ticket:
+                response = await model.generate_content_async(contents, **kwargs)
+                ticket.used_tokens = _usage_tokens(response)
+                return response
+        except ModelBusy:
+            raise
+        except Exception as e:
+            await _retry_or_raise(e, attempt, priority)
+            attempt += 1
+
+
+async def stream_content(model, contents, **kwargs):
+    """
+    Streams response text chunks as the model produces them.
+    The scheduler slot is held until the stream is exhausted or closed. Failures
+    before the first chunk are retried like generate_content; later ones are raised.
+    """
+    priority = current_priority()
+    estimate = estimate_tokens(contents)
+    attempt = 0
+    while True:
+        started = False
+        try:
+            async with scheduler().slot(priority, estimate) as ticket:
+                response = await model.generate_content_async(contents, stream=True, **kwargs)
+                chars = 0
+                async for chunk in response:
+                    try:
+                        text = chunk.text
+                    except ValueError:
+                        # Chunks without text parts (e.g. safety metadata only)
+                        continue
+                    if text:
+                        started = True
+                        chars += len(text)
+                        yield text
+                ticket.used_tokens = _usage_tokens(response) or (estimate - MODEL_EST_OUTPUT_TOKENS + chars // 4)
+                return
+        except ModelBusy:
+            raise
+        except Exception as e:
+            if started:
+                raise
+            await _retry_or_raise(e, attempt, priority)
+            attempt += 1
+
+
+async def run_model_call(fn, *args, **kwargs):
+    """
+    Runs a blocking helper that talks to the model (e.g. compare_images_gemini) through
+    the scheduler, retried on transient errors like generate_content. The helper must
+    let model errors propagate. Its prompt is opaque here, so only the output estimate is charged.
+    """
+    priority = current_priority()
+    attempt = 0
+    while True:
+        try:
+            async with scheduler().slot(priority, estimate_tokens(())):
+                return await run_blocking(fn, *args, **kwargs)
+        except ModelBusy:
+            raise
+        except Exception as e:
+            await _retry_or_raise(e, attempt, priority)
+            attempt += 1
+
+
+def shutdown():
+    _executor.shutdown(wait=False, cancel_futures=True)
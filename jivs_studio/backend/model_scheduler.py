@@ -0,0 +1,285 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import logging
+import os
+import random
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+logger = logging.getLogger(__name__)
+
+# Priority classes, most urgent first. Each request sets its class with
+# set_priority(); model calls made while serving it inherit it.
+PRIORITIES = {"interactive": 0, "generate": 1, "batch": 2}
+DEFAULT_PRIORITY = "generate"
+
+# Gemini quota: requests and tokens per minute (0 disables that bucket)
+MODEL_RPM = float(os.getenv("MODEL_RPM", "300"))
+MODEL_TPM = float(os.getenv("MODEL_TPM", "1000000"))
+# Share of every limit (slots, RPM, TPM) that only interactive calls may use
+MODEL_INTERACTIVE_RESERVE = float(os.getenv("MODEL_INTERACTIVE_RESERVE", "0.2"))
+# Waiting calls beyond this are rejected with ModelBusy instead of queued
+MODEL_MAX_QUEUE = int(os.getenv("MODEL_MAX_QUEUE", "200"))
+# Output tokens assumed per call until the response reports its real usage
+MODEL_EST_OUTPUT_TOKENS = int(os.getenv("MODEL_EST_OUTPUT_TOKENS", "2000"))
+IMAGE_TOKENS = 258  # what Gemini bills per image part
+
+# Retries for transient upstream failures (429/5xx/timeouts), full-jitter exponential backoff
+MODEL_MAX_RETRIES = int(os.getenv("MODEL_MAX_RETRIES", "3"))
+MODEL_RETRY_BASE = float(os.getenv("MODEL_RETRY_BASE", "1.0"))
+MODEL_RETRY_MAX = float(os.getenv("MODEL_RETRY_MAX", "20"))
+
+TRANSIENT_CODES = {429, 500, 502, 503, 504}
+WAIT_SAMPLES = 500
+SLOW_ADMISSION = 2.0  # seconds; longer queue waits are logged
+
+_priority = contextvars.ContextVar("model_priority", default=DEFAULT_PRIORITY)
+
+
+class ModelBusy(RuntimeError):
+    """The model quota is exhausted or the scheduler queue is full; retry after `retry_after` seconds."""
+
+    def __init__(self, message: str, retry_after: float = 1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def set_priority(name: str):
+    """Sets the priority class for model calls made by the current request/task."""
+    if name not in PRIORITIES:
+        raise ValueError(f"Unknown priority class: {name}")
+    _priority.set(name)
+
+
+def current_priority() -> str:
+    return _priority.get()
+
+
+def estimate_tokens(contents) -> int:
+    """Rough prompt + output token estimate (4 characters per token, fixed cost per image)."""
+    parts = contents if isinstance(contents, (list, tuple)) else [contents]
+    tokens = MODEL_EST_OUTPUT_TOKENS
+    for part in parts:
+        if isinstance(part, str):
+            tokens += len(part) // 4
+        else:
+            tokens += IMAGE_TOKENS
+    return tokens
+
+
+def is_transient(error: Exception) -> bool:
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    return getattr(error, "code", None) in TRANSIENT_CODES
+
+
+def is_rate_limit(error: Exception) -> bool:
+    return getattr(error, "code", None) == 429
+
+
+def backoff_delay(attempt: int, base: float = MODEL_RETRY_BASE, cap: float = MODEL_RETRY_MAX) -> float:
+    """Full jitter: uniform in [0, min(cap, base * 2**attempt)]."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class TokenBucket:
+    """Refills `per_minute` units per minute up to one minute's worth."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, floor: float) -> float:
+        """Seconds until `amount` can be taken without dropping below `floor` (call refill first)."""
+        missing = amount + floor - self.level
+        return max(0.0, missing / self.rate) if self.rate > 0 else 0.0
+
+
+class Ticket:
+    __slots__ = ("priority", "tokens", "used_tokens", "queued_at", "future", "seq")
+
+    def __init__(self, priority: str, tokens: int):
+        self.priority = priority
+        self.tokens = tokens
+        self.used_tokens = None  # set by the caller once the response reports usage
+        self.queued_at = time.monotonic()
+        self.future = None
+        self.seq = 0
+
+
+class ModelScheduler:
+    """
+    Admission control for every model call.
+
+    Calls wait in one priority queue and are admitted strictly in order
+    (interactive, then generate, then batch; FIFO within a class) when a
+    concurrency slot is free and the request and token buckets allow it.
+    Non-interactive calls may not use the last MODEL_INTERACTIVE_RESERVE of
+    any limit, so interactive calls find headroom even when batch work keeps
+    the rest saturated. A 429 from upstream empties the request bucket, which
+    makes every caller back off together.
+    """
+
+    def __init__(self, max_concurrent: int, rpm: float = MODEL_RPM, tpm: float = MODEL_TPM,
+                 reserve: float = MODEL_INTERACTIVE_RESERVE, max_queue: int = MODEL_MAX_QUEUE):
+        self.max_concurrent = max(1, max_concurrent)
+        self.requests = TokenBucket(rpm) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm) if tpm > 0 else None
+        self.reserve = min(max(reserve, 0.0), 0.9)
+        self.max_queue = max_queue
+        self.in_flight = 0
+        self._waiting = []  # heap of (priority rank, seq, Ticket)
+        self._seq = itertools.count()
+        self._timer = None
+        self.stats = {name: {"admitted": 0, "rejected": 0, "retries": 0, "rate_limited": 0,
+                             "waits": deque(maxlen=WAIT_SAMPLES)} for name in PRIORITIES}
+
+    # --- admission ---
+
+    def _slot_limit(self, priority: str) -> int:
+        if priority == "interactive":
+            return self.max_concurrent
+        return max(1, self.max_concurrent - max(1, round(self.max_concurrent * self.reserve)))
+
+    def _delay(self, ticket: Ticket, now: float):
+        """0 if admissible now, seconds to wait for the buckets, or None if waiting on a slot."""
+        if self.in_flight >= self._slot_limit(ticket.priority):
+            return None
+        share = 0.0 if ticket.priority == "interactive" else self.reserve
+        delay = 0.0
+        if self.requests:
+            self.requests.refill(now)
+            delay = max(delay, self.requests.wait_time(1, self.requests.capacity * share))
+        if self.tokens:
+            self.tokens.refill(now)
+            amount = min(ticket.tokens, self.tokens.capacity * (1 - share))
+            delay = max(delay, self.tokens.wait_time(amount, self.tokens.capacity * share))
+        return delay
+
+    def _admit(self, ticket: Ticket, now: float):
+        if self.requests:
+            self.requests.level -= 1
+        if self.tokens:
+            self.tokens.level -= ticket.tokens
+        self.in_flight += 1
+        stats = self.stats[ticket.priority]
+        stats["admitted"] += 1
+        waited = now - ticket.queued_at
+        stats["waits"].append(waited)
+        if waited > SLOW_ADMISSION:
+            logger.info(f"{ticket.priority} model call waited {waited:.1f}s for admission")
+
+    def _dispatch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        now = time.monotonic()
+        while self._waiting:
+            ticket = self._waiting[0][2]
+            if ticket.future.done():  # caller gave up
+                heapq.heappop(self._waiting)
+                continue
+            delay = self._delay(ticket, now)
+            if delay is None:
+                return  # release() dispatches again
+            if delay > 0:
+                self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+                return
+            heapq.heappop(self._waiting)
+            self._admit(ticket, now)
+            ticket.future.set_result(None)
+
+    async def acquire(self, priority: str, tokens: int) -> Ticket:
+        ticket = Ticket(priority, tokens)
+        now = ticket.queued_at
+        if not self._waiting and self._delay(ticket, now) == 0:
+            self._admit(ticket, now)
+            return ticket
+        if len(self._waiting) >= self.max_queue:
+            self.stats[priority]["rejected"] += 1
+            raise ModelBusy(f"{len(self._waiting)} model calls already queued", retry_after=self.retry_after())
+
+        ticket.future = asyncio.get_running_loop().create_future()
+        ticket.seq = next(self._seq)
+        heapq.heappush(self._waiting, (PRIORITIES[priority], ticket.seq, ticket))
+        self._dispatch()
+        try:
+            await ticket.future
+        except asyncio.CancelledError:
+            if ticket.future.done() and not ticket.future.cancelled():
+                self.release(ticket)  # admitted just as the caller went away
+            else:
+                self._dispatch()
+            raise
+        return ticket
+
+    def release(self, ticket: Ticket):
+        self.in_flight -= 1
+        if self.tokens and ticket.used_tokens is not None:
+            # Settle the estimate against what the call really cost
+            self.tokens.level -= ticket.used_tokens - ticket.tokens
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, priority: str, tokens: int):
+        ticket = await self.acquire(priority, tokens)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def throttle(self, priority: str):
+        """Called on an upstream 429: nothing more is admitted until the request bucket refills."""
+        self.stats[priority]["rate_limited"] += 1
+        if self.requests:
+            self.requests.refill(time.monotonic())
+            self.requests.level = min(self.requests.level, 0.0)
+
+    def record_retry(self, priority: str):
+        self.stats[priority]["retries"] += 1
+
+    def retry_after(self) -> float:
+        if self.requests:
+            self.requests.refill(time.monotonic())
+            return round(max(1.0, self.requests.wait_time(1, 0)), 1)
+        return 1.0
+
+    # --- reporting ---
+
+    def summary(self) -> dict:
+        now = time.monotonic()
+        queued = {name: 0 for name in PRIORITIES}
+        for _, _, ticket in self._waiting:
+            if not ticket.future.done():
+                queued[ticket.priority] += 1
+
+        classes = {}
+        for name, stats in self.stats.items():
+            waits = sorted(stats["waits"])
+            classes[name] = {
+                "admitted": stats["admitted"],
+                "rejected": stats["rejected"],
+                "retries": stats["retries"],
+                "rate_limited": stats["rate_limited"],
+                "queued": queued[name],
+                "wait_p50_ms": round(waits[len(waits) // 2] * 1000, 1) if waits else 0.0,
+                "wait_p95_ms": round(waits[int(len(waits) * 0.95)] * 1000, 1) if waits else 0.0,
+                "wait_max_ms": round(waits[-1] * 1000, 1) if waits else 0.0,
+            }
+
+        buckets = {}
+        for label, bucket in (("requests", self.requests), ("tokens", self.tokens)):
+            if bucket:
+                bucket.refill(now)
+                buckets[label] = {"available": round(bucket.level, 1), "per_minute": bucket.capacity}
+        return {"in_flight": self.in_flight, "max_concurrent": self.max_concurrent,
+                "classes": classes, "buckets": buckets}
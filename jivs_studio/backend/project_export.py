@@ -0,0 +1,157 @@
+import os
+import posixpath
+import tarfile
+import time
+import zipfile
+import zlib
+
+# Archives are produced as a stream of small chunks: each file is read and
+# compressed EXPORT_CHUNK_SIZE bytes at a time and nothing else is buffered,
+# so memory stays flat however large the project is.
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", str(64 * 1024)))
+EXPORT_COMPRESSION_LEVEL = int(os.getenv("EXPORT_COMPRESSION_LEVEL", "6"))
+
+FORMATS = {
+    "zip": ("application/zip", ".zip"),
+    "tar.gz": ("application/gzip", ".tar.gz"),
+}
+
+
+def archive_name(path: str, prefix: str = ""):
+    """Normalized member name, or None for absolute paths and paths that leave the archive root."""
+    path = str(path).replace("\\", "/")
+    if path.startswith("/") or ":" in path.split("/", 1)[0]:
+        return None
+    name = posixpath.normpath(path)
+    if name in (".", "") or name == ".." or name.startswith("../"):
+        return None
+    return posixpath.join(prefix, name) if prefix else name
+
+
+def file_map_entries(files: dict, prefix: str = "", mtime: float = None):
+    """(name, content, mtime) for an in-memory {path: text} map, e.g. a generated project."""
+    mtime = mtime or time.time()
+    for path in sorted(files):
+        name = archive_name(path, prefix)
+        if name is not None:
+            yield name, files[path], mtime
+
+
+def directory_entries(root: str, prefix: str = ""):
+    """(name, file path, mtime) for every regular file under `root`; symlinks are skipped."""
+    for directory, dirs, names in os.walk(root):
+        dirs.sort()
+        for filename in sorted(names):
+            path = os.path.join(directory, filename)
+            if os.path.islink(path) or not os.path.isfile(path):
+                continue
+            name = archive_name(os.path.relpath(path, root).replace(os.sep, "/"), prefix)
+            if name is not None:
+                yield name, _DiskFile(path), os.path.getmtime(path)
+
+
+class _DiskFile:
+    """Marks a source that is read from disk in chunks instead of held in memory."""
+    __slots__ = ("path",)
+
+    def __init__(self, path):
+        self.path = path
+
+
+def _source_size(source) -> int:
+    if isinstance(source, _DiskFile):
+        return os.path.getsize(source.path)
+    return len(source.encode("utf-8") if isinstance(source, str) else source)
+
+
+def _source_chunks(source, size: int = EXPORT_CHUNK_SIZE):
+    if isinstance(source, _DiskFile):
+        with open(source.path, "rb") as f:
+            while True:
+                chunk = f.read(size)
+                if not chunk:
+                    return
+                yield chunk
+    data = memoryview(source.encode("utf-8") if isinstance(source, str) else source)
+    for start in range(0, len(data), size):
+        yield bytes(data[start:start + size])
+
+
+class _Sink:
+    """Write-only file object that hands back whatever was written since the last drain()."""
+
+    def __init__(self):
+        self._parts = []
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data, self._parts = b"".join(self._parts), []
+        return data
+
+
+def stream_zip(entries):
+    """
+    Yields a ZIP archive chunk by chunk. The output is written as a non-seekable
+    stream (sizes and CRCs go in data descriptors), so no part of it is kept.
+    """
+    sink = _Sink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED,
+                         compresslevel=EXPORT_COMPRESSION_LEVEL) as archive:
+        for name, source, mtime in entries:
+            info = zipfile.ZipInfo(name, date_time=time.localtime(max(mtime, 315532800))[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED
+            info.external_attr = 0o644 << 16
+            size = _source_size(source)
+            info.file_size = size
+            with archive.open(info, "w", force_zip64=size > zipfile.ZIP64_LIMIT) as member:
+                for chunk in _source_chunks(source):
+                    member.write(chunk)
+                    data = sink.drain()
+                    if data:
+                        yield data
+            yield sink.drain()
+    yield sink.drain()
+
+
+def stream_tar_gz(entries):
+    """Yields a gzip-compressed POSIX tar archive chunk by chunk."""
+    compressor = zlib.compressobj(EXPORT_COMPRESSION_LEVEL, zlib.DEFLATED, 31)  # wbits 31 = gzip container
+    emit = compressor.compress
+    for name, source, mtime in entries:
+        info = tarfile.TarInfo(name)
+        info.size = _source_size(source)
+        info.mtime = int(mtime)
+        info.mode = 0o644
+        yield emit(info.tobuf(tarfile.PAX_FORMAT, "utf-8", "surrogateescape"))
+        for chunk in _source_chunks(source):
+            data = emit(chunk)
+            if data:
+                yield data
+        yield emit(b"\0" * (-info.size % tarfile.BLOCKSIZE))
+    yield emit(b"\0" * (2 * tarfile.BLOCKSIZE))  # end-of-archive marker
+    yield compressor.flush()
+
+
+def stream_archive(entries, fmt: str):
+    """Chunks of `entries` archived as `fmt` ("zip" or "tar.gz"); empty chunks are skipped."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    writer = stream_zip if fmt == "zip" else stream_tar_gz
+    for chunk in writer(entries):
+        if chunk:
+            yield chunk
+
+
+def safe_basename(name: str) -> str:
+    """`name` reduced to characters that are safe in a download filename and an archive folder."""
+    return "".join(c if c.isalnum() or c in "-_." else "_" for c in name).strip(".") or "project"
+
+
+def download_headers(basename: str, fmt: str) -> dict:
+    return {"Content-Disposition": f'attachment; filename="{safe_basename(basename)}{FORMATS[fmt][1]}"'}
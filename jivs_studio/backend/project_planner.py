@@ -0,0 +1,118 @@
+import asyncio
+import json
+import os
+import re
+
+# Two-phase project generation: one planning call for the manifest and shared
+# interfaces, then one call per file with bounded parallelism.
+PROJECT_MAX_FILES = int(os.getenv("PROJECT_MAX_FILES", "40"))
+PROJECT_FILE_CONCURRENCY = int(os.getenv("PROJECT_FILE_CONCURRENCY", "6"))
+
+_WRAPPING_FENCE = re.compile(r"^\s*```[\w.+-]*\s*\n(.*?)\n?```\s*$", re.S)
+
+
+def build_plan_prompt(framework: str, description: str, scaffold: str = "") -> str:
+    return f"""You are a senior {framework} architect planning a new, production-ready application.
+
+        User Description: {description}
+
+        Do NOT write the code yet. Return ONLY a JSON object with these keys:
+        - "analysis": an object with "summary", "reasoning" and "components_generated".
+        - "shared_context": one string with everything the files must agree on: component names and props,
+          exported functions and types, routes, state shape, dependency versions, colours, spacing and
+          copy taken from the design.
+        - "files": a list (at most {PROJECT_MAX_FILES}) of objects with "path" (full filename, e.g. "src/App.vue",
+          "package.json"), "purpose" (one sentence) and "exports" (names other files import from it).
+        Include every file needed to run the project (manifests, entry points, config, components, styles).
+        {scaffold}"""
+
+
+def parse_plan(text: str) -> dict:
+    """Validates the planning response. Raises ValueError if it has no usable file list."""
+    plan = json.loads(text.replace("```json", "").replace("```", ""))
+    if not isinstance(plan, dict) or not isinstance(plan.get("files"), list):
+        raise ValueError("Plan has no file list")
+
+    files, seen = [], set()
+    for entry in plan["files"]:
+        if isinstance(entry, str):
+            entry = {"path": entry}
+        path = str(entry.get("path", "")).strip().lstrip("/") if isinstance(entry, dict) else ""
+        if not path or path in seen:
+            continue
+        seen.add(path)
+        files.append({"path": path, "purpose": entry.get("purpose", ""), "exports": entry.get("exports", [])})
+    if not files:
+        raise ValueError("Plan has no file list")
+
+    return {
+        "analysis": plan.get("analysis", {}),
+        "shared_context": str(plan.get("shared_context", "")),
+        "files": files[:PROJECT_MAX_FILES],
+        "dependencies": plan.get("dependencies") or {},
+    }
+
+
+def manifest_text(plan: dict) -> str:
+    lines = []
+    for entry in plan["files"]:
+        exports = entry["exports"]
+        exports = ", ".join(map(str, exports)) if isinstance(exports, list) else str(exports)
+        lines.append(f"- {entry['path']}: {entry['purpose']}" + (f" (exports: {exports})" if exports else ""))
+    return "\n".join(lines)
+
+
+def build_file_prompt(framework: str, description: str, plan: dict, entry: dict) -> str:
+    return f"""You are an expert {framework} developer writing ONE file of a larger project.
+        Other developers are writing the remaining files in parallel from the same plan, so follow the
+        shared context and the manifest exactly (names, props, exports, import paths).
+
+        User Description: {description}
+
+        SHARED CONTEXT:
+        {plan['shared_context']}
+
+        PROJECT FILES:
+        {manifest_text(plan)}
+
+        YOUR FILE: {entry['path']}
+        PURPOSE: {entry['purpose']}
+
+        OUTPUT: Return ONLY the complete contents of {entry['path']}. No markdown fences, no explanations.
+        """
+
+
+def clean_file_output(text: str) -> str:
+    """Removes a markdown fence wrapping the whole file (fences inside the file are kept)."""
+    match = _WRAPPING_FENCE.match(text)
+    return match.group(1) if match else text
+
+
+async def generate_files(plan: dict, framework: str, description: str, generate,
+                         concurrency: int = PROJECT_FILE_CONCURRENCY, abort_on: tuple = ()):
+    """
+    Generates every planned file with at most `concurrency` calls in flight and
+    yields (path, content, error) in completion order. `generate(prompt)` is an
+    async callable returning the model text. Exceptions in `abort_on` (e.g. quota
+    exhausted) end the whole run instead of failing one file. Pending calls are
+    cancelled if the consumer stops early or the run is aborted.
+    """
+    slots = asyncio.Semaphore(max(1, concurrency))
+
+    async def one(entry):
+        async with slots:
+            try:
+                text = await generate(build_file_prompt(framework, description, plan, entry))
+                return entry["path"], clean_file_output(text), None
+            except abort_on:
+                raise
+            except Exception as e:
+                return entry["path"], None, str(e)
+
+    tasks = [asyncio.ensure_future(one(entry)) for entry in plan["files"]]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
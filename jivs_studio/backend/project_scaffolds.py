@@ -0,0 +1,207 @@
+import json
+import logging
+import os
+import re
+
+logger = logging.getLogger(__name__)
+
+# Boilerplate (manifests, build config, entry files) comes from local templates in
+# scaffolds/<name>/; the model only writes the app-specific sources.
+PROJECT_SCAFFOLDS = os.getenv("PROJECT_SCAFFOLDS", "1") == "1"
+SCAFFOLD_DIR = os.getenv("PROJECT_SCAFFOLD_DIR") or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "scaffolds"
+)
+META_FILE = "scaffold.json"
+PACKAGE_JSON = "package.json"
+
+_PACKAGE_NAME = re.compile(r"^(@[a-z0-9][\w.-]*/)?[a-z0-9][\w.-]*$")
+_VERSION = re.compile(r"^[\w.^~<>=*|+ -]{1,40}$")
+
+
+def normalize_path(path: str) -> str:
+    path = str(path).replace("\\", "/").strip()
+    while path.startswith("./"):
+        path = path[2:]
+    return path.lstrip("/")
+
+
+class Scaffold:
+    """
+    One framework template: `files` are written as-is, `app_files` (path -> purpose)
+    must come from the model, and `editable` scaffold files may be replaced by it.
+    """
+
+    def __init__(self, name: str, meta: dict, files: dict):
+        self.name = name
+        self.framework = meta.get("framework", name)
+        self.aliases = [a.lower() for a in meta.get("aliases", [])]
+        self.app_files = meta.get("app_files", {})
+        self.editable = set(meta.get("editable", []))
+        self.notes = meta.get("notes", "")
+        self.files = files
+
+    def owns(self, path: str) -> bool:
+        """True for scaffold files the model must not overwrite."""
+        return path in self.files and path not in self.editable
+
+    def installed_packages(self) -> list:
+        try:
+            manifest = json.loads(self.files.get(PACKAGE_JSON, "{}"))
+        except ValueError:
+            return []
+        return sorted({**manifest.get("dependencies", {}), **manifest.get("devDependencies", {})})
+
+    def prompt_section(self) -> str:
+        """Prompt text telling the model what already exists and what it still has to write."""
+        provided = ", ".join(sorted(p for p in self.files if self.owns(p)))
+        required = "\n".join(f"        - {path}: {purpose}" for path, purpose in self.app_files.items())
+        editable = ", ".join(sorted(self.editable)) or "none"
+        packages = ", ".join(self.installed_packages()) or "none"
+        return f"""
+        PROJECT SCAFFOLD ({self.framework}):
+        The server already provides these files. Do NOT write them: {provided}
+        {self.notes}
+        You MUST write:
+{required}
+        You MAY replace: {editable}
+        Add any other source files the app needs (components, services, styles).
+        Installed packages: {packages}. List any additional npm packages in a top-level
+        "dependencies" object ({{"name": "version"}}) instead of writing package.json.
+        """
+
+    def restrict_plan(self, plan: dict) -> dict:
+        """Drops planned files the scaffold provides and adds any missing required app files."""
+        files = [entry for entry in plan["files"]
+                 if not self.owns(normalize_path(entry["path"])) and normalize_path(entry["path"]) != PACKAGE_JSON]
+        planned = {normalize_path(entry["path"]) for entry in files}
+        for path, purpose in self.app_files.items():
+            if path not in planned:
+                files.insert(0, {"path": path, "purpose": purpose, "exports": []})
+        context = f"{self.framework} scaffold (already written): {self.notes}"
+        return {**plan, "files": files, "shared_context": f"{context}\n{plan['shared_context']}".strip()}
+
+    def merge(self, generated: dict, dependencies: dict = None) -> dict:
+        """
+        Scaffold files overlaid with the model's files (see ScaffoldMerger). Model
+        writes to scaffold-owned paths are ignored; requested packages are added
+        to the scaffold's package.json.
+        """
+        merger = ScaffoldMerger(self)
+        files = dict(self.files)
+        for path, content in generated.items():
+            accepted = merger.accept(path, content)
+            if accepted:
+                files[accepted[0]] = accepted[1]
+        merger.add_dependencies(dependencies)
+        files.update(merger.final_files())
+        return files
+
+
+class ScaffoldMerger:
+    """Merges model files into a scaffold one at a time, for streamed generation."""
+
+    def __init__(self, scaffold: Scaffold):
+        self.scaffold = scaffold
+        self.dependencies = {}
+
+    def accept(self, path: str, content):
+        """
+        Returns (path, content) to emit for a model file, or None when the scaffold
+        keeps its own version. A generated package.json only contributes packages.
+        """
+        path = normalize_path(path)
+        if not isinstance(content, str):
+            content = json.dumps(content, indent=2)
+        if path == PACKAGE_JSON:
+            self.add_dependencies(packages_from_manifest(content))
+            return None
+        if self.scaffold.owns(path):
+            return None
+        return path, content
+
+    def add_dependencies(self, dependencies):
+        self.dependencies.update(clean_dependencies(dependencies))
+
+    def final_files(self) -> dict:
+        """Scaffold files that changed because of requested packages (package.json), if any."""
+        current = self.scaffold.files.get(PACKAGE_JSON)
+        if current is None or not self.dependencies:
+            return {}
+        updated = add_dependencies(current, self.dependencies)
+        return {PACKAGE_JSON: updated} if updated != current else {}
+
+
+def clean_dependencies(dependencies) -> dict:
+    """Keeps well-formed {"name": "version"} pairs from model output."""
+    if not isinstance(dependencies, dict):
+        return {}
+    return {
+        name: version for name, version in dependencies.items()
+        if isinstance(name, str) and isinstance(version, str)
+        and _PACKAGE_NAME.match(name) and _VERSION.match(version)
+    }
+
+
+def packages_from_manifest(content: str) -> dict:
+    try:
+        manifest = json.loads(content)
+    except ValueError:
+        return {}
+    if not isinstance(manifest, dict):
+        return {}
+    return clean_dependencies(manifest.get("dependencies"))
+
+
+def add_dependencies(package_json: str, dependencies: dict) -> str:
+    """Adds packages the scaffold does not already pin; returns the input unchanged if none are new."""
+    manifest = json.loads(package_json)
+    installed = {**manifest.get("devDependencies", {}), **manifest.get("dependencies", {})}
+    new = {name: version for name, version in dependencies.items() if name not in installed}
+    if not new:
+        return package_json
+    manifest["dependencies"] = dict(sorted({**manifest.get("dependencies", {}), **new}.items()))
+    return json.dumps(manifest, indent=2) + "\n"
+
+
+# --- LOADING ---
+
+def load_scaffold(root: str, name: str) -> Scaffold:
+    base = os.path.join(root, name)
+    with open(os.path.join(base, META_FILE), encoding="utf-8") as f:
+        meta = json.load(f)
+    files = {}
+    for directory, _, names in os.walk(base):
+        for filename in names:
+            path = os.path.join(directory, filename)
+            relative = os.path.relpath(path, base).replace(os.sep, "/")
+            if relative == META_FILE:
+                continue
+            with open(path, encoding="utf-8") as f:
+                files[relative] = f.read()
+    return Scaffold(name, meta, files)
+
+
+def load_scaffolds(root: str = SCAFFOLD_DIR) -> dict:
+    """Maps every scaffold name and alias (lowercase) to its Scaffold."""
+    scaffolds = {}
+    if not os.path.isdir(root):
+        return scaffolds
+    for name in sorted(os.listdir(root)):
+        if not os.path.isfile(os.path.join(root, name, META_FILE)):
+            continue
+        try:
+            scaffold = load_scaffold(root, name)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Skipping scaffold {name}: {e}")
+            continue
+        for key in [name.lower(), *scaffold.aliases]:
+            scaffolds.setdefault(key, scaffold)
+    return scaffolds
+
+
+SCAFFOLDS = load_scaffolds() if PROJECT_SCAFFOLDS else {}
+
+
+def get_scaffold(framework: str):
+    """Scaffold for a framework label such as "React" or "Vue 3", or None."""
+    return SCAFFOLDS.get((framework or "").strip().lower())
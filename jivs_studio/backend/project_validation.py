@@ -0,0 +1,466 @@
+import ast
+import bisect
+import json
+import os
+import posixpath
+import re
+import time
+from html.parser import HTMLParser
+
+from html_patch import VOID_TAGS
+
+JS_EXTENSIONS = (".js", ".jsx", ".mjs", ".cjs", ".ts", ".tsx")
+RESOLVE_SUFFIXES = ("", ".js", ".jsx", ".ts", ".tsx", ".mjs", ".vue", ".json", ".css", ".scss",
+                    "/index.js", "/index.jsx", "/index.ts", "/index.tsx", "/index.vue")
+# Elements whose end tag HTML lets authors omit
+OPTIONAL_END_TAGS = {"p", "li", "dt", "dd", "tr", "td", "th", "thead", "tbody", "tfoot", "option",
+                     "optgroup", "colgroup", "caption", "rt", "rp", "html", "head", "body"}
+NODE_BUILTINS = {"fs", "path", "os", "url", "util", "events", "stream", "crypto", "http", "https",
+                 "child_process", "assert", "buffer", "process", "zlib", "net", "module"}
+
+_BRACKETS = {")": "(", "]": "[", "}": "{"}
+# A "/" after one of these starts a regex literal rather than a division
+_REGEX_PRECEDERS = set("(,=:[!&|?{;+-*%~^<>") | {""}
+_REGEX_KEYWORDS = {"return", "typeof", "case", "do", "else", "in", "of", "new", "delete", "void", "throw", "yield", "await"}
+
+_IMPORT_PATTERNS = [
+    re.compile(r"""\bimport\s+(?:[\w*{}\s,$]+?\s+from\s+)?["']([^"'\n]+)["']"""),
+    re.compile(r"""\bexport\s+(?:\*|\{[^}]*\})\s*(?:as\s+\w+\s+)?from\s+["']([^"'\n]+)["']"""),
+    re.compile(r"""\b(?:require|import)\(\s*["']([^"'\n]+)["']\s*\)"""),
+]
+_ANGULAR_URLS = re.compile(r"""\b(?:templateUrl|styleUrl)\s*:\s*["']([^"']+)["']|styleUrls\s*:\s*\[([^\]]*)\]""")
+_VUE_BLOCK_OPEN = re.compile(r"<(template|script|style)\b([^>]*)>", re.I)
+# Any <template> / </template> inside the template block: v-if groups and slots nest them
+_VUE_TEMPLATE_TAG = re.compile(r"<(/?)template\b[^>]*?(/?)>", re.I)
+
+
+def diagnostic(severity, message, line=None, column=None, rule=None):
+    return {"severity": severity, "message": message, "line": line, "column": column, "rule": rule}
+
+
+# --- PER-FILE CHECKS ---
+
+def check_json(source: str):
+    try:
+        data = json.loads(source)
+    except json.JSONDecodeError as e:
+        return [diagnostic("error", e.msg, e.lineno, e.colno, "json-syntax")], None
+    return [], data
+
+
+def check_package_json(source: str):
+    diagnostics, data = check_json(source)
+    if data is None:
+        return diagnostics
+    if not isinstance(data, dict):
+        return [diagnostic("error", "package.json must be an object", 1, 1, "package-json")]
+    if not data.get("name"):
+        diagnostics.append(diagnostic("warning", "package.json has no \"name\"", 1, 1, "package-json"))
+    for field in ("dependencies", "devDependencies", "scripts"):
+        if field in data and not isinstance(data[field], dict):
+            diagnostics.append(diagnostic("error", f"\"{field}\" must be an object", 1, 1, "package-json"))
+    return diagnostics
+
+
+_WORD = re.compile(r"[\w$]+")
+_SPACE = re.compile(r"\s+")
+_TEMPLATE_STOP = re.compile(r"[`\\]|\$\{")
+_STRING_STOP = {"'": re.compile(r"['\\\n]"), '"': re.compile(r'["\\\n]')}
+_JSX_CHILD_STOP = re.compile(r"[<{]")
+# Stack markers for JSX: "<" inside an opening tag, "</" inside a closing tag, ">" among an element's children
+_JSX_MARKERS = ("<", "</", ">")
+
+
+def scan_js(source: str, line_offset: int = 0, jsx: bool = True):
+    """
+    Token-level structure check for JS/TS/JSX: balanced (), [], {} with strings,
+    template literals, comments and regex literals skipped. Not a full parser.
+
+    With `jsx`, a "<" where an expression may start opens an element: its text
+    children are skipped and only {expressions} inside it are scanned. Findings
+    made inside JSX are warnings, as the scanner may misread unusual markup.
+    """
+    newlines = [m.start() for m in re.finditer("\n", source)]
+
+    def pos(index):
+        line = bisect.bisect_left(newlines, index)
+        col = index - (newlines[line - 1] if line else -1)
+        return line + 1 + line_offset, col
+
+    diagnostics = []
+    stack = []  # (char, index); "`" marks a template literal, "${" its substitution, _JSX_MARKERS elements
+    i, n = 0, len(source)
+    prev = ""  # last significant character or word
+
+    def structure(message, index):
+        if any(opener in _JSX_MARKERS for opener, _ in stack):
+            return diagnostic("warning", message, *pos(index), "jsx-structure")
+        return diagnostic("error", message, *pos(index), "js-structure")
+
+    while i < n:
+        ch = source[i]
+        top = stack[-1][0] if stack else None
+
+        if top == ">":
+            # JSX children: text (which may hold quotes, "//" or stray brackets) is skipped
+            match = _JSX_CHILD_STOP.search(source, i)
+            if match is None:
+                break
+            i = match.start()
+            if source[i] == "{":
+                stack.append(("{", i))
+                prev = "{"
+                i += 1
+            elif source.startswith("</", i):
+                stack.append(("</", i))
+                i += 2
+            else:
+                stack.append(("<", i))
+                i += 1
+            continue
+
+        if top in ("<", "</"):
+            if ch in "'\"" and top == "<":
+                end = source.find(ch, i + 1)
+                if end == -1:
+                    diagnostics.append(structure("Unterminated JSX attribute value", i))
+                    break
+                i = end + 1
+            elif ch == "{" and top == "<":
+                stack.append(("{", i))
+                prev = "{"
+                i += 1
+            elif ch == ">" or source.startswith("/>", i):
+                _, start = stack.pop()
+                if top == "</":
+                    if stack and stack[-1][0] == ">":
+                        stack.pop()
+                    else:
+                        diagnostics.append(structure("Unexpected JSX closing tag", start))
+                elif ch == ">":
+                    stack.append((">", start))
+                i += 1 if ch == ">" else 2
+                prev = ")"  # a finished element is a value, like a parenthesized expression
+            else:
+                i += 1
+            continue
+
+        if stack and stack[-1][0] == "`":
+            match = _TEMPLATE_STOP.search(source, i)
+            if match is None:
+                break
+            token = match.group(0)
+            if token == "\\":
+                i = match.end() + 1
+            elif token == "`":
+                stack.pop()
+                prev = "`"
+                i = match.end()
+            else:
+                stack.append(("${", match.start()))
+                prev = "{"
+                i = match.end()
+            continue
+
+        nxt = source[i + 1] if i + 1 < n else ""
+        if ch.isspace():
+            i = _SPACE.match(source, i).end()
+        elif ch == "/" and nxt == "/":
+            end = source.find("\n", i)
+            i = n if end == -1 else end
+        elif ch == "/" and nxt == "*":
+            end = source.find("*/", i + 2)
+            if end == -1:
+                diagnostics.append(diagnostic("error", "Unterminated block comment", *pos(i), "js-structure"))
+                break
+            i = end + 2
+        elif ch in "'\"" and not (jsx and prev[-1:].isalnum() and prev not in _REGEX_KEYWORDS):
+            start = i
+            i += 1
+            while True:
+                match = _STRING_STOP[ch].search(source, i)
+                if match is None or match.group(0) == "\n":
+                    if not jsx:  # JSX text may legitimately contain lone quotes
+                        diagnostics.append(diagnostic("error", "Unterminated string literal", *pos(start), "js-structure"))
+                    i = n if match is None else match.start()
+                    break
+                if match.group(0) == "\\":
+                    i = match.end() + 1
+                    continue
+                i = match.end()
+                break
+            prev = ch
+        elif ch in "'\"":
+            prev = ch  # apostrophe inside JSX text
+            i += 1
+        elif ch == "`":
+            stack.append(("`", i))
+            i += 1
+        elif (jsx and ch == "<" and (nxt.isalpha() or nxt == ">")
+              and (prev in _REGEX_PRECEDERS or prev in _REGEX_KEYWORDS)):
+            stack.append(("<", i))
+            i += 1
+        elif ch == "/" and (prev in _REGEX_PRECEDERS or prev in _REGEX_KEYWORDS) and prev != "<" and nxt != ">":
+            in_class = False
+            i += 1
+            while i < n and source[i] != "\n":
+                c = source[i]
+                if c == "\\":
+                    i += 1
+                elif c == "[":
+                    in_class = True
+                elif c == "]":
+                    in_class = False
+                elif c == "/" and not in_class:
+                    break
+                i += 1
+            i += 1
+            prev = "/regex"
+        elif ch in "([{":
+            stack.append((ch, i))
+            prev = ch
+            i += 1
+        elif ch in ")]}":
+            if stack and stack[-1][0] == "${" and ch == "}":
+                stack.pop()
+                prev = "}"
+                i += 1
+                continue
+            if not stack or stack[-1][0] != _BRACKETS[ch]:
+                expected = f"; expected closing for '{stack[-1][0]}' from line {pos(stack[-1][1])[0]}" if stack else ""
+                diagnostics.append(structure(f"Unexpected '{ch}'{expected}", i))
+                return diagnostics
+            stack.pop()
+            prev = ch
+            i += 1
+        elif ch.isalnum() or ch in "_$":
+            match = _WORD.match(source, i)
+            prev = match.group(0)
+            i = match.end()
+        else:
+            prev = ch
+            i += 1
+
+    for opener, index in stack[-3:]:
+        label = "template literal" if opener == "`" else "JSX element" if opener in _JSX_MARKERS else f"'{opener}'"
+        diagnostics.append(structure(f"Unclosed {label}", index))
+    return diagnostics
+
+
+class _TagChecker(HTMLParser):
+    def __init__(self, line_offset=0):
+        super().__init__(convert_charrefs=True)
+        self.line_offset = line_offset
+        self.stack = []
+        self.diagnostics = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag not in VOID_TAGS:
+            self.stack.append((tag, *self._pos()))
+
+    def handle_endtag(self, tag):
+        if tag in VOID_TAGS:
+            return
+        names = [t for t, _, _ in self.stack]
+        if tag not in names:
+            self.diagnostics.append(diagnostic("error", f"Unexpected closing </{tag}>", *self._pos(), "html-structure"))
+            return
+        while self.stack:
+            open_tag, line, col = self.stack.pop()
+            if open_tag == tag:
+                break
+            if open_tag not in OPTIONAL_END_TAGS:
+                self.diagnostics.append(diagnostic("error", f"<{open_tag}> is not closed before </{tag}>", line, col, "html-structure"))
+
+    def _pos(self):
+        line, col = self.getpos()
+        return line + self.line_offset, col + 1
+
+    def finish(self):
+        self.close()
+        for tag, line, col in self.stack:
+            if tag not in OPTIONAL_END_TAGS:
+                self.diagnostics.append(diagnostic("warning", f"<{tag}> is never closed", line, col, "html-structure"))
+        return self.diagnostics
+
+
+def check_html(source: str, line_offset: int = 0):
+    checker = _TagChecker(line_offset)
+    checker.feed(source)
+    return checker.finish()
+
+
+def check_css(source: str):
+    # Braces only; strings and comments are skipped by the JS scanner's rules
+    return [dict(d, rule="css-structure") for d in scan_js(source, jsx=False) if "'{'" in d["message"] or "'}'" in d["message"]]
+
+
+def vue_blocks(source: str):
+    """
+    (kind, attrs, content, content_start) for each top-level SFC block. The
+    template block ends at the </template> matching its own opening tag, not
+    at the first one; unclosed blocks are skipped.
+    """
+    i = 0
+    while True:
+        match = _VUE_BLOCK_OPEN.search(source, i)
+        if match is None:
+            return
+        kind, start = match.group(1).lower(), match.end()
+        end = None
+        if kind == "template":
+            depth = 1
+            for tag in _VUE_TEMPLATE_TAG.finditer(source, start):
+                if tag.group(1):
+                    depth -= 1
+                elif not tag.group(2):
+                    depth += 1
+                if depth == 0:
+                    end = tag
+                    break
+        else:
+            end = re.compile(rf"</{kind}\s*>", re.I).search(source, start)
+        if end is None:
+            i = start
+            continue
+        yield kind, match.group(2), source[start:end.start()], start
+        i = end.end()
+
+
+def check_vue(source: str):
+    diagnostics = []
+    blocks = set()
+    for kind, attrs, content, start in vue_blocks(source):
+        offset = source.count("\n", 0, start)
+        if kind == "template" and kind not in blocks:
+            diagnostics += check_html(content, offset)
+        elif kind == "script":
+            diagnostics += scan_js(content, offset, jsx="tsx" in attrs or "jsx" in attrs)
+        blocks.add(kind)
+    if "template" not in blocks and "script" not in blocks:
+        diagnostics.append(diagnostic("error", "Vue SFC has neither <template> nor <script>", 1, 1, "vue-sfc"))
+    return diagnostics
+
+
+def check_python(source: str):
+    try:
+        ast.parse(source)
+    except SyntaxError as e:
+        return [diagnostic("error", e.msg, e.lineno, e.offset, "python-syntax")]
+    return []
+
+
+def check_file(path: str, source: str) -> list:
+    """Structural diagnostics for one file, chosen by extension. Unknown types pass."""
+    name = posixpath.basename(path)
+    ext = os.path.splitext(name)[1].lower()
+    if name == "package.json":
+        return check_package_json(source)
+    if ext == ".json":
+        return check_json(source)[0]
+    if ext in JS_EXTENSIONS:
+        return scan_js(source, jsx=ext != ".ts")
+    if ext == ".vue":
+        return check_vue(source)
+    if ext in (".html", ".htm"):
+        return check_html(source)
+    if ext in (".css", ".scss", ".less"):
+        return check_css(source)
+    if ext == ".py":
+        return check_python(source)
+    return []
+
+
+# --- CROSS-FILE CHECKS ---
+
+def js_imports(source: str):
+    """(specifier, line) for every static/dynamic import, re-export and require in a file."""
+    found = []
+    for pattern in _IMPORT_PATTERNS:
+        for match in pattern.finditer(source):
+            found.append((match.group(1), source.count("\n", 0, match.start()) + 1))
+    return found
+
+
+def _norm(path: str) -> str:
+    path = path.replace("\\", "/")
+    while path.startswith("./"):
+        path = path[2:]
+    return path
+
+
+def _resolve(base_dir: str, specifier: str, paths: set):
+    target = posixpath.normpath(posixpath.join(base_dir, specifier))
+    return next((target + s for s in RESOLVE_SUFFIXES if target + s in paths), None)
+
+
+def _package_name(specifier: str) -> str:
+    parts = specifier.split("/")
+    return "/".join(parts[:2]) if specifier.startswith("@") else parts[0]
+
+
+def check_imports(files: dict) -> dict:
+    """
+    Resolves relative imports (and Vue's "@/" alias) against the generated files,
+    and bare imports against package.json when one exists. Returns {path: [diagnostics]}.
+    """
+    paths = {_norm(p) for p in files}
+    declared = None
+    for path in files:
+        if posixpath.basename(path) == "package.json":
+            data = check_json(files[path])[1]
+            if isinstance(data, dict):
+                declared = declared or set()
+                for field in ("dependencies", "devDependencies", "peerDependencies"):
+                    if isinstance(data.get(field), dict):
+                        declared |= set(data[field])
+
+    results = {}
+    for path, source in files.items():
+        norm = _norm(path)
+        if not norm.endswith(JS_EXTENSIONS + (".vue",)):
+            continue
+        base_dir = posixpath.dirname(norm)
+        diagnostics = []
+        for specifier, line in js_imports(source):
+            if specifier.startswith("."):
+                if _resolve(base_dir, specifier, paths) is None:
+                    diagnostics.append(diagnostic("error", f"Cannot resolve '{specifier}'", line, None, "import-resolve"))
+            elif specifier.startswith("@/"):
+                if _resolve("src", specifier[2:], paths) is None:
+                    diagnostics.append(diagnostic("error", f"Cannot resolve '{specifier}'", line, None, "import-resolve"))
+            elif declared is not None and not specifier.startswith(("http:", "https:", "node:", "/")):
+                package = _package_name(specifier)
+                if package not in declared and package not in NODE_BUILTINS:
+                    diagnostics.append(diagnostic("warning", f"'{package}' is not listed in package.json", line, None, "import-package"))
+
+        # Angular component templates and stylesheets
+        for match in _ANGULAR_URLS.finditer(source):
+            refs = [match.group(1)] if match.group(1) else re.findall(r"""["']([^"']+)["']""", match.group(2))
+            for ref in refs:
+                if _resolve(base_dir, ref, paths) is None:
+                    line = source.count("\n", 0, match.start()) + 1
+                    diagnostics.append(diagnostic("error", f"Cannot resolve '{ref}'", line, None, "import-resolve"))
+        if diagnostics:
+            results[path] = diagnostics
+    return results
+
+
+def summarize(per_file: dict, started: float) -> dict:
+    errors = sum(1 for ds in per_file.values() for d in ds if d["severity"] == "error")
+    warnings = sum(1 for ds in per_file.values() for d in ds if d["severity"] == "warning")
+    return {
+        "ok": errors == 0,
+        "files": per_file,
+        "summary": {"files": len(per_file), "errors": errors, "warnings": warnings,
+                    "ms": round((time.perf_counter() - started) * 1000, 2)},
+    }
+
+
+def validate_project(files: dict) -> dict:
+    """Runs every per-file check and the import checks. Returns {"ok", "files", "summary"}."""
+    started = time.perf_counter()
+    per_file = {path: check_file(path, source) for path, source in files.items()}
+    for path, diagnostics in check_imports(files).items():
+        per_file[path] = per_file[path] + diagnostics
+    return summarize(per_file, started)
@@ -0,0 +1,184 @@
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pytest_worker.py")
+
+# Warm worker processes; each runs one test session at a time
+TEST_WORKERS = int(os.getenv("TEST_WORKERS", "2"))
+# Runs allowed to wait for a worker before new ones are rejected
+TEST_MAX_QUEUE = int(os.getenv("TEST_MAX_QUEUE", "16"))
+TEST_TIMEOUT = float(os.getenv("TEST_TIMEOUT", "60"))
+TEST_MEMORY_MB = int(os.getenv("TEST_MEMORY_MB", "1024"))
+TEST_CPU_SECONDS = int(os.getenv("TEST_CPU_SECONDS", str(int(TEST_TIMEOUT))))
+# Extra time a worker gets to report back after the run's own timeout
+WORKER_GRACE = 10.0
+WORKER_START_TIMEOUT = 30.0
+# Time a worker gets to kill its pytest child and exit on SIGTERM before it is SIGKILLed
+WORKER_STOP_TIMEOUT = 2.0
+
+
+class QueueFull(RuntimeError):
+    """Too many test runs are already waiting."""
+
+
+class _Slot:
+    __slots__ = ("proc",)
+
+    def __init__(self):
+        self.proc = None
+
+
+class PytestPool:
+    """
+    Bounded pool of pre-warmed pytest workers (see pytest_worker.py).
+
+    run() waits for a free worker, so at most `size` sessions execute at once
+    and at most `max_queue` more wait. Workers that crash or stop responding
+    are killed and respawned on next use.
+    """
+
+    def __init__(self, size: int = TEST_WORKERS, max_queue: int = TEST_MAX_QUEUE,
+                 timeout: float = TEST_TIMEOUT, memory_mb: int = TEST_MEMORY_MB,
+                 cpu_seconds: int = TEST_CPU_SECONDS):
+        self.size = max(1, size)
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.memory_mb = memory_mb
+        self.cpu_seconds = cpu_seconds
+        self._slots = None  # asyncio.Queue of idle slots, created on the running loop
+        self._started = None  # warm-up task shared by every caller of start()
+        self._all = []
+        self._waiting = 0
+        self.stats = {"runs": 0, "timeouts": 0, "rejected": 0, "respawns": 0}
+
+    async def start(self):
+        """Creates the slots and warms the workers. Safe to call more than once, also concurrently."""
+        if self._started is None:
+            self._started = asyncio.ensure_future(self._start())
+        await asyncio.shield(self._started)
+
+    async def _start(self):
+        self._slots = asyncio.Queue()
+        self._all = [_Slot() for _ in range(self.size)]
+        for slot in self._all:
+            self._slots.put_nowait(slot)
+        results = await asyncio.gather(*(self._ensure(slot) for slot in self._all), return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                logger.warning(f"Pytest worker failed to start: {result}")
+        logger.info(f"Pytest pool ready: {self.size} workers")
+
+    async def _ensure(self, slot: _Slot):
+        if slot.proc is not None and slot.proc.returncode is None:
+            return slot.proc
+        if slot.proc is not None:
+            self.stats["respawns"] += 1
+        slot.proc = await asyncio.create_subprocess_exec(
+            sys.executable, WORKER_SCRIPT,
+            stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
+        )
+        try:
+            line = await asyncio.wait_for(slot.proc.stdout.readline(), WORKER_START_TIMEOUT)
+            if not json.loads(line or b"{}").get("ready"):
+                raise RuntimeError("Pytest worker did not start")
+        except BaseException:
+            # Cancelled too: a worker that has not announced itself must not get a job
+            await self._kill(slot)
+            raise
+        return slot.proc
+
+    async def _kill(self, slot: _Slot):
+        """
+        Takes the worker off the slot at once, so the slot can be reused with a
+        fresh worker, then stops it. The wait runs shielded: cancelling the
+        caller does not leave a half-killed worker behind.
+        """
+        proc, slot.proc = slot.proc, None
+        if proc is not None and proc.returncode is None:
+            proc.terminate()  # the worker kills the pytest child it forked, then exits
+            await asyncio.shield(self._reap(proc))
+
+    @staticmethod
+    async def _reap(proc):
+        try:
+            await asyncio.wait_for(proc.wait(), WORKER_STOP_TIMEOUT)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+
+    async def run(self, workspace: str, timeout: float = None, targets: list = None) -> dict:
+        """
+        Runs pytest in `workspace` on a warm worker, limited to `targets` (test paths) if given.
+        Returns {"exit_code", "timed_out", "output", "report", "queue_seconds", "run_seconds"};
+        "report" is the pytest-json-report data or None. Raises QueueFull when saturated.
+        """
+        await self.start()
+        if self._slots.empty() and self._waiting >= self.max_queue:
+            self.stats["rejected"] += 1
+            raise QueueFull(f"{self._waiting} test runs already queued")
+
+        timeout = timeout or self.timeout
+        queued_at = time.monotonic()
+        self._waiting += 1
+        try:
+            slot = await self._slots.get()
+        finally:
+            self._waiting -= 1
+
+        started = time.monotonic()
+        try:
+            proc = await self._ensure(slot)
+            job = {"workspace": workspace, "targets": list(targets or []), "timeout": timeout,
+                   "memory_mb": self.memory_mb, "cpu_seconds": self.cpu_seconds}
+            proc.stdin.write((json.dumps(job) + "\n").encode())
+            await proc.stdin.drain()
+            line = await asyncio.wait_for(proc.stdout.readline(), timeout + WORKER_GRACE)
+            if not line:
+                raise RuntimeError("Pytest worker exited unexpectedly")
+            result = json.loads(line)
+        except asyncio.TimeoutError:
+            await self._kill(slot)
+            result = {"exit_code": -1, "timed_out": True, "output": "Pytest worker stopped responding"}
+        except BaseException:
+            # Includes cancellation: the worker may still be running this job and would
+            # answer the next one with its result, so it is replaced rather than reused
+            await self._kill(slot)
+            raise
+        finally:
+            # Either the worker answered (idle) or it was taken off the slot above
+            self._slots.put_nowait(slot)
+
+        self.stats["runs"] += 1
+        if result.get("timed_out"):
+            self.stats["timeouts"] += 1
+        result["report"] = await asyncio.to_thread(self._read_report, workspace)
+        result["queue_seconds"] = round(started - queued_at, 3)
+        result["run_seconds"] = round(time.monotonic() - started, 3)
+        return result
+
+    @staticmethod
+    def _read_report(workspace: str):
+        try:
+            with open(os.path.join(workspace, "report.json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def summary(self) -> dict:
+        idle = self._slots.qsize() if self._slots is not None else self.size
+        return {**self.stats, "workers": self.size, "busy": self.size - idle, "waiting": self._waiting}
+
+    async def close(self):
+        for slot in self._all:
+            if slot.proc is not None and slot.proc.returncode is None:
+                slot.proc.stdin.close()
+                try:
+                    await asyncio.wait_for(slot.proc.wait(), 2)
+                except asyncio.TimeoutError:
+                    await self._kill(slot)
@@ -0,0 +1,173 @@
+"""
+Warm pytest worker used by pytest_pool.PytestPool.
+
+Imports pytest and loads its plugins once (a warm-up session on an empty
+directory), then reads one JSON job per line from
+stdin: {"workspace": path, "targets": [test paths], "timeout": seconds,
+"memory_mb": int, "cpu_seconds": int}; an empty target list runs every test.
+Each job runs in a forked child (fresh module state, resource limits, own
+process group) and the result is written to stdout as one JSON line:
+{"exit_code": int, "timed_out": bool, "output": str}.
+"""
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+import pytest
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+REPORT_FILE = "report.json"
+OUTPUT_FILE = ".pytest-output.txt"
+OUTPUT_TAIL = 8000
+
+_child = None  # pid of the forked pytest session currently running
+
+
+def _terminate(signum, frame):
+    """SIGTERM from the pool (run cancelled or timed out): take the running session down too."""
+    if _child is not None:
+        for kill in (os.killpg, os.kill):
+            try:
+                kill(_child, signal.SIGKILL)
+            except (ProcessLookupError, PermissionError):
+                pass
+    os._exit(1)
+
+
+def pytest_args(report_path, targets=()):
+    return ["-q", "-p", "no:cacheprovider", "--json-report", f"--json-report-file={report_path}", *targets]
+
+
+def _set_limits(job):
+    if resource is None:
+        return
+    memory = job.get("memory_mb")
+    if memory:
+        limit = int(memory) * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    cpu = job.get("cpu_seconds")
+    if cpu:
+        resource.setrlimit(resource.RLIMIT_CPU, (int(cpu), int(cpu) + 1))
+
+
+def _run_child(job):
+    """Runs inside the forked child; never returns."""
+    code = 1
+    try:
+        os.setsid()
+        workspace = job["workspace"]
+        os.chdir(workspace)
+        fd = os.open(os.path.join(workspace, OUTPUT_FILE), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        os.dup2(fd, 1)
+        os.dup2(fd, 2)
+        _set_limits(job)
+        # Workspaces are rewritten in place; stale .pyc files could match a same-size edit
+        sys.dont_write_bytecode = True
+        code = int(pytest.main(pytest_args(os.path.join(workspace, REPORT_FILE), job.get("targets") or ())))
+    except BaseException as e:
+        print(f"Worker error: {e!r}", file=sys.stderr)
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(code)
+
+
+def _wait(pid, timeout):
+    deadline = time.monotonic() + timeout
+    while True:
+        done, status = os.waitpid(pid, os.WNOHANG)
+        if done:
+            return os.waitstatus_to_exitcode(status), False
+        if time.monotonic() > deadline:
+            try:
+                os.killpg(pid, signal.SIGKILL)  # the child and anything it spawned
+            except ProcessLookupError:
+                pass
+            _, status = os.waitpid(pid, 0)
+            return os.waitstatus_to_exitcode(status), True
+        time.sleep(0.02)
+
+
+def _read_output(workspace):
+    try:
+        with open(os.path.join(workspace, OUTPUT_FILE), encoding="utf-8", errors="replace") as f:
+            return f.read()[-OUTPUT_TAIL:]
+    except OSError:
+        return ""
+
+
+def run_job(job):
+    global _child
+    workspace = job["workspace"]
+    timeout = float(job.get("timeout", 60))
+    targets = job.get("targets") or ()
+    try:
+        os.remove(os.path.join(workspace, REPORT_FILE))  # workspaces are reused between runs
+    except OSError:
+        pass
+
+    if not hasattr(os, "fork"):
+        # No fork (Windows): fall back to a fresh interpreter per run
+        cmd = [sys.executable, "-m", "pytest", *pytest_args(os.path.join(workspace, REPORT_FILE), targets)]
+        try:
+            process = subprocess.run(cmd, cwd=workspace, capture_output=True, text=True, timeout=timeout)
+            return {"exit_code": process.returncode, "timed_out": False,
+                    "output": (process.stdout + process.stderr)[-OUTPUT_TAIL:]}
+        except subprocess.TimeoutExpired as e:
+            return {"exit_code": -1, "timed_out": True, "output": str(e)}
+
+    sys.stdout.flush()
+    pid = os.fork()
+    if pid == 0:
+        _run_child(job)
+    _child = pid
+    try:
+        exit_code, timed_out = _wait(pid, timeout)
+    finally:
+        _child = None
+    return {"exit_code": exit_code, "timed_out": timed_out, "output": _read_output(workspace)}
+
+
+def warm_up():
+    """Runs an empty session so plugin discovery and lazy imports happen before the first fork."""
+    saved = os.dup(1)
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    try:
+        os.dup2(devnull, 1)
+        with tempfile.TemporaryDirectory() as workspace:
+            pytest.main(pytest_args(os.path.join(workspace, REPORT_FILE)) + [workspace])
+    finally:
+        sys.stdout.flush()
+        os.dup2(saved, 1)
+        os.close(saved)
+        os.close(devnull)
+
+
+def main():
+    signal.signal(signal.SIGTERM, _terminate)
+    if hasattr(os, "fork"):
+        warm_up()
+    out = sys.stdout
+    out.write(json.dumps({"ready": True}) + "\n")
+    out.flush()
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        try:
+            result = run_job(json.loads(line))
+        except Exception as e:
+            result = {"exit_code": -1, "timed_out": False, "output": f"Worker error: {e!r}"}
+        out.write(json.dumps(result) + "\n")
+        out.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+import asyncio
+import hashlib
+import json
+import os
+
+from response_cache import LRUCache
+
+# Completed Idempotency-Key results are replayed for this long
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", str(24 * 3600)))
+IDEMPOTENCY_MAX_KEYS = int(os.getenv("IDEMPOTENCY_MAX_KEYS", "1000"))
+IDEMPOTENCY_MAX_MB = int(os.getenv("IDEMPOTENCY_MAX_MB", "64"))
+# A stream handed out by IdempotencyStore.stream() that nobody starts iterating
+# within this time (client gone before the response began) gives up its key
+STREAM_CLAIM_TTL = 30.0
+
+
+class IdempotencyMismatch(ValueError):
+    """An Idempotency-Key was reused with a different request body."""
+
+
+def fingerprint(*parts) -> str:
+    """SHA-256 over request parts (str, bytes or JSON-serializable values)."""
+    h = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            data = part.encode("utf-8")
+        elif isinstance(part, (bytes, bytearray, memoryview)):
+            data = bytes(part)
+        else:
+            data = json.dumps(part, sort_keys=True, default=str).encode("utf-8")
+        h.update(len(data).to_bytes(8, "big"))
+        h.update(data)
+    return h.hexdigest()
+
+
+class _Broadcast:
+    __slots__ = ("items", "done", "error", "changed", "subscribers", "task")
+
+    def __init__(self):
+        self.items = []
+        self.done = False
+        self.error = None
+        self.changed = asyncio.Event()
+        self.subscribers = 0
+        self.task = None
+
+
+class SingleFlight:
+    """
+    Coalesces identical in-flight work onto one upstream call.
+
+    do() shares one awaitable per key; stream() shares one async iterator per
+    key, replaying what was produced so far to late joiners. Keys are dropped
+    as soon as the work finishes, so only concurrent duplicates are merged.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._streams = {}
+        self.stats = {"calls": 0, "coalesced": 0, "streams": 0, "stream_joins": 0}
+
+    def in_flight(self, key) -> bool:
+        return key in self._calls or key in self._streams
+
+    async def do(self, key, fn):
+        """
+        Awaits fn() once per key. A waiter that is cancelled (client gone) does
+        not cancel the shared call; the others still get its result.
+        """
+        task = self._calls.get(key)
+        if task is None:
+            self.stats["calls"] += 1
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda t: self._finish_call(key, t))
+        else:
+            self.stats["coalesced"] += 1
+        return await asyncio.shield(task)
+
+    def _finish_call(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()  # retrieved here so an abandoned failure is not logged as unhandled
+
+    async def stream(self, key, factory):
+        """
+        Iterates factory() once per key for every concurrent subscriber. The
+        upstream iterator is cancelled when the last subscriber leaves early.
+        """
+        broadcast = self._streams.get(key)
+        if broadcast is None:
+            self.stats["streams"] += 1
+            broadcast = _Broadcast()
+            self._streams[key] = broadcast
+            broadcast.task = asyncio.ensure_future(self._produce(key, broadcast, factory))
+        else:
+            self.stats["stream_joins"] += 1
+
+        broadcast.subscribers += 1
+        index = 0
+        try:
+            while True:
+                if index < len(broadcast.items):
+                    yield broadcast.items[index]
+                    index += 1
+                elif broadcast.done:
+                    if broadcast.error is not None:
+                        raise broadcast.error
+                    return
+                else:
+                    await broadcast.changed.wait()
+        finally:
+            broadcast.subscribers -= 1
+            if broadcast.subscribers == 0 and not broadcast.done:
+                broadcast.task.cancel()
+                if self._streams.get(key) is broadcast:
+                    del self._streams[key]
+
+    async def _produce(self, key, broadcast, factory):
+        try:
+            async for item in factory():
+                broadcast.items.append(item)
+                self._notify(broadcast)
+        except asyncio.CancelledError:
+            broadcast.error = RuntimeError("Shared stream was cancelled")
+            raise
+        except Exception as e:
+            broadcast.error = e
+        finally:
+            broadcast.done = True
+            if self._streams.get(key) is broadcast:
+                del self._streams[key]
+            self._notify(broadcast)
+
+    @staticmethod
+    def _notify(broadcast):
+        changed, broadcast.changed = broadcast.changed, asyncio.Event()
+        changed.set()
+
+
+class IdempotencyStore:
+    """
+    Results of requests sent with an Idempotency-Key. A retry with the same key
+    and body gets the stored result (or joins the original while it is still
+    running); the same key with a different body raises IdempotencyMismatch.
+    Only successful results are kept, so failures can be retried.
+    """
+
+    def __init__(self, max_keys: int = IDEMPOTENCY_MAX_KEYS, ttl: float = IDEMPOTENCY_TTL,
+                 max_mb: int = IDEMPOTENCY_MAX_MB):
+        self._done = LRUCache(max_entries=max_keys, ttl=ttl, max_bytes=max_mb * 1024 * 1024)
+        self._pending = {}  # slot -> fingerprint of the request currently running
+        self._claims = LRUCache(max_entries=max_keys, ttl=STREAM_CLAIM_TTL)  # slot -> fingerprint, stream not started yet
+        self._flight = SingleFlight()
+        self.stats = {"stored": 0, "replays": 0, "mismatches": 0}
+
+    def _check(self, slot: str, request_fingerprint: str):
+        """Returns the stored record for `slot`, if any; raises on a fingerprint mismatch."""
+        record = self._done.get(slot)
+        known = record["fingerprint"] if record else (self._pending.get(slot) or self._claims.get(slot))
+        if known is not None and known != request_fingerprint:
+            self.stats["mismatches"] += 1
+            raise IdempotencyMismatch("Idempotency-Key was already used with a different request")
+        return record
+
+    def _store(self, slot: str, request_fingerprint: str, result, size: int):
+        self._done.set(slot, {"fingerprint": request_fingerprint, "result": result}, size=size)
+        self.stats["stored"] += 1
+
+    async def run(self, scope: str, key: str, request_fingerprint: str, fn):
+        """Returns (result, replayed); fn() runs at most once per key while its result is retained."""
+        slot = f"{scope}:{key}"
+        record = self._check(slot, request_fingerprint)
+        if record is not None:
+            self.stats["replays"] += 1
+            return record["result"], True
+
+        joined = self._flight.in_flight(slot)
+        if not joined:
+            self._pending[slot] = request_fingerprint
+
+        async def call():
+            try:
+                result = await fn()
+            finally:
+                self._pending.pop(slot, None)
+            self._store(slot, request_fingerprint, result, len(json.dumps(result, default=str)))
+            return result
+
+        return await self._flight.do(slot, call), joined
+
+    def stream(self, scope: str, key: str, request_fingerprint: str, factory, is_error=None):
+        """
+        Returns (async iterator, replayed) for a streamed response. A completed
+        stream is replayed item by item; `is_error(item)` marks items that make
+        the stream unfit for replay (e.g. an SSE "error" event).
+        """
+        slot = f"{scope}:{key}"
+        record = self._check(slot, request_fingerprint)
+        if record is not None:
+            self.stats["replays"] += 1
+            return _replay(record["result"]), True
+
+        # Claimed before returning: the iterator only starts once the response is sent,
+        # and a different body sent with the same key in between must be refused
+        joined = self._flight.in_flight(slot) or slot in self._claims
+        if not joined:
+            self._claims.set(slot, request_fingerprint)
+
+        async def recorded():
+            self._pending[slot] = request_fingerprint
+            self._claims.pop(slot)
+            items, failed = [], False
+            try:
+                async for item in factory():
+                    items.append(item)
+                    failed = failed or bool(is_error and is_error(item))
+                    yield item
+            finally:
+                self._pending.pop(slot, None)
+            if not failed:
+                self._store(slot, request_fingerprint, items, sum(len(str(item)) for item in items))
+
+        return self._flight.stream(slot, recorded), joined
+
+    def summary(self) -> dict:
+        # Retries that arrived while the original was still running
+        joined = self._flight.stats["coalesced"] + self._flight.stats["stream_joins"]
+        return {**self.stats, "joined": joined, "keys": len(self._done), "in_flight": len(self._pending)}
+
+
+async def _replay(items):
+    for item in items:
+        yield item
@@ -0,0 +1,306 @@
+import asyncio
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+# The disk writer wakes at least this often to flush batched access times
+DISK_FLUSH_INTERVAL = 1.0
+# Expired rows are deleted (and the size total resynced) this often
+DISK_SWEEP_INTERVAL = 60.0
+
+DISK_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value BLOB, size INTEGER, created REAL, accessed REAL);
+CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed);
+CREATE INDEX IF NOT EXISTS responses_created ON responses (created);
+"""
+
+
+class LRUCache:
+    """
+    Thread-safe in-memory LRU with optional TTL and byte budget.
+    get() returns `default` for missing or expired keys.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: float = None, max_bytes: int = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._data = OrderedDict()  # key -> (value, stored_at, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                return default
+            value, stored_at, size = item
+            if self.ttl is not None and time.time() - stored_at > self.ttl:
+                self._remove(key)
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, size: int = 0):
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (value, time.time(), size)
+            self._bytes += size
+            while self._data and (
+                len(self._data) > self.max_entries
+                or (self.max_bytes is not None and self._bytes > self.max_bytes)
+            ):
+                oldest = next(iter(self._data))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def pop(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                return default
+            self._remove(key)
+            return item[0]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def _remove(self, key):
+        _, _, size = self._data.pop(key)
+        self._bytes -= size
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+
+class _DiskTier:
+    """
+    SQLite tier of ResponseCache. get() is a single indexed read (callers run it
+    off the event loop); every write happens on one background writer thread,
+    which stores new responses, flushes access times in batches and keeps a
+    running size total so eviction never scans the table.
+    """
+
+    def __init__(self, path: str, ttl, max_bytes: int, flush_interval: float = DISK_FLUSH_INTERVAL):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._read_db = self._connect(path)
+        self._read_db.executescript(DISK_SCHEMA)
+        self._read_lock = threading.Lock()
+        self._lock = threading.Lock()  # guards _pending / _touched
+        self._pending = {}  # key -> value not yet written (readable meanwhile)
+        self._touched = {}  # key -> last access time not yet written
+        self.total_bytes = self._read_db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        self.evictions = 0
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="response-cache-writer", daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def _connect(path):
+        db = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    def get(self, key: str):
+        now = time.time()
+        with self._lock:
+            value = self._pending.get(key)
+        if value is None:
+            with self._read_lock:
+                row = self._read_db.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or (self.ttl is not None and now - row[1] > self.ttl):
+                return None  # expired rows are deleted by the writer's sweep
+            value = zlib.decompress(row[0]).decode("utf-8")
+        with self._lock:
+            self._touched[key] = now
+        return value
+
+    def set(self, key: str, value: str):
+        with self._lock:
+            self._pending[key] = value
+        self._wake.set()
+
+    def _run(self):
+        db = self._connect(self.path)
+        last_sweep = 0.0
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            closing = self._closed  # read before taking the batch, so nothing set before close() is lost
+            with self._lock:
+                pending, touched = dict(self._pending), self._touched
+                self._touched = {}
+            sweep = time.time() - last_sweep > DISK_SWEEP_INTERVAL
+            if pending or touched or sweep:
+                try:
+                    self._write(db, pending, touched, sweep)
+                    if sweep:
+                        last_sweep = time.time()
+                except sqlite3.Error as e:
+                    logger.warning(f"Response cache disk write failed: {e}")
+                with self._lock:
+                    for key, value in pending.items():
+                        if self._pending.get(key) is value:
+                            del self._pending[key]
+            if closing:
+                db.close()
+                return
+
+    def _write(self, db, pending: dict, touched: dict, sweep: bool):
+        now = time.time()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            for key, value in pending.items():
+                blob = zlib.compress(value.encode("utf-8"), 6)
+                old = db.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+                db.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                    (key, blob, len(blob), now, now),
+                )
+                self.total_bytes += len(blob) - (old[0] if old else 0)
+            if touched:
+                db.executemany("UPDATE responses SET accessed = ? WHERE key = ?",
+                               [(at, key) for key, at in touched.items()])
+            if sweep:
+                if self.ttl is not None:
+                    db.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+                # Resync with rows written or removed by other processes sharing the file
+                self.total_bytes = db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if self.total_bytes > self.max_bytes:
+                self._evict(db)
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+    def _evict(self, db):
+        """Drops least recently used rows until under budget: reads only the victims (index on accessed), one DELETE."""
+        excess = self.total_bytes - self.max_bytes
+        count = freed = 0
+        for (size,) in db.execute("SELECT size FROM responses ORDER BY accessed"):
+            if freed >= excess:
+                break
+            count += 1
+            freed += size
+        db.execute("DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY accessed LIMIT ?)", (count,))
+        self.total_bytes -= freed
+        self.evictions += count
+
+    def close(self):
+        """Writes what is still pending and stops the writer thread."""
+        self._closed = True
+        self._wake.set()
+        self._thread.join(timeout=10)
+        with self._read_lock:
+            self._read_db.close()
+
+
+class ResponseCache:
+    """
+    Content-addressed cache for model responses.
+
+    Tier 1 is an in-memory LRU. Tier 2 is an optional SQLite file holding
+    zlib-compressed responses, so hits survive restarts and can be shared by
+    workers on the same host. Both tiers honour the same TTL. Disk reads run in
+    a worker thread and disk writes on a background writer, so neither blocks
+    the event loop.
+    """
+
+    def __init__(self, max_entries=256, max_bytes=64 * 1024 * 1024, ttl=3600,
+                 db_path=None, disk_max_bytes=512 * 1024 * 1024):
+        self.memory = LRUCache(max_entries=max_entries, ttl=ttl, max_bytes=max_bytes)
+        self.ttl = ttl
+        self.db_path = db_path
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "bypassed": 0}
+        self._disk = _DiskTier(db_path, ttl, disk_max_bytes) if db_path else None
+
+    @staticmethod
+    def make_key(model_name: str, *parts) -> str:
+        """
+        SHA-256 over the model identity and every prompt part (str or bytes), length-prefixed.
+        Pass model_registry.model_signature(model) so the generation config is part of the key.
+        """
+        h = hashlib.sha256()
+        for part in (model_name, *parts):
+            data = part.encode("utf-8") if isinstance(part, str) else bytes(part)
+            h.update(len(data).to_bytes(8, "big"))
+            h.update(data)
+        return h.hexdigest()
+
+    async def get(self, key: str):
+        value = self.memory.get(key)
+        if value is not None:
+            self.stats["memory_hits"] += 1
+            return value
+
+        if self._disk is not None:
+            value = await asyncio.to_thread(self._disk.get, key)
+            if value is not None:
+                self.stats["disk_hits"] += 1
+                self.memory.set(key, value, size=len(value))
+                return value
+
+        self.stats["misses"] += 1
+        return None
+
+    def set(self, key: str, value: str):
+        """Stores in memory at once; the disk write is queued for the writer thread."""
+        self.stats["stores"] += 1
+        self.memory.set(key, value, size=len(value))
+        if self._disk is not None:
+            self._disk.set(key, value)
+
+    def record_bypass(self):
+        self.stats["bypassed"] += 1
+
+    def close(self):
+        if self._disk is not None:
+            self._disk.close()
+
+    def summary(self) -> dict:
+        lookups = self.stats["memory_hits"] + self.stats["disk_hits"] + self.stats["misses"]
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        summary = {
+            **self.stats,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "memory_entries": len(self.memory),
+            "memory_evictions": self.memory.evictions,
+            "disk_enabled": self._disk is not None,
+        }
+        if self._disk is not None:
+            summary["disk_bytes"] = self._disk.total_bytes
+            summary["disk_evictions"] = self._disk.evictions
+        return summary
+
+
+def from_env() -> ResponseCache:
+    """Builds the shared cache from RESPONSE_CACHE_* environment variables."""
+    return ResponseCache(
+        max_entries=int(os.getenv("RESPONSE_CACHE_SIZE", "256")),
+        max_bytes=int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+        ttl=float(os.getenv("RESPONSE_CACHE_TTL", "3600")),
+        db_path=os.getenv("RESPONSE_CACHE_DB") or None,
+        disk_max_bytes=int(os.getenv("RESPONSE_CACHE_DISK_MAX_BYTES", str(512 * 1024 * 1024))),
+    )
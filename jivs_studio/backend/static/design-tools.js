@@ -0,0 +1,149 @@
+// JiVS Design Mode controls. Loaded by a single <script data-jivs-design-tools> tag
+// injected into generated pages; safe to load more than once.
+(function () {
+    if (window.__jivsDesignTools) return;
+    window.__jivsDesignTools = true;
+
+    const HTML2CANVAS_URL = "https://html2canvas.hertzen.com/dist/html2canvas.min.js";
+    const BUTTON_STYLE = "color: #fff; padding: 10px 15px; border: none; border-radius: 6px; cursor: pointer; font-weight: bold; font-family: sans-serif; box-shadow: 0 2px 5px rgba(0,0,0,0.2);";
+
+    let isDesignMode = false;
+    let draggedEl = null;
+    let startX, startY, initialTx, initialTy;
+
+    function loadHtml2Canvas() {
+        if (window.html2canvas) return Promise.resolve(window.html2canvas);
+        return new Promise((resolve, reject) => {
+            const script = document.createElement('script');
+            script.src = HTML2CANVAS_URL;
+            script.onload = () => resolve(window.html2canvas);
+            script.onerror = reject;
+            document.head.appendChild(script);
+        });
+    }
+
+    // --- DESIGN MODE LOGIC ---
+    function toggleDesignMode() {
+        isDesignMode = !isDesignMode;
+        const btn = document.getElementById('toggle-design-btn');
+        document.body.contentEditable = isDesignMode; // Allows text editing everywhere
+
+        if (isDesignMode) {
+            btn.innerHTML = "✅ Finish Editing";
+            btn.style.background = "#059669"; // Green
+            document.body.style.cursor = "default";
+            enableDragging();
+        } else {
+            btn.innerHTML = "✏️ Design Mode: OFF";
+            btn.style.background = "#444";
+            disableDragging();
+        }
+    }
+
+    function enableDragging() {
+        document.addEventListener('mousedown', startDrag);
+        document.addEventListener('mousemove', drag);
+        document.addEventListener('mouseup', endDrag);
+    }
+
+    function disableDragging() {
+        document.removeEventListener('mousedown', startDrag);
+        document.removeEventListener('mousemove', drag);
+        document.removeEventListener('mouseup', endDrag);
+    }
+
+    function startDrag(e) {
+        // Don't drag if clicking buttons or inputs
+        if (e.target.tagName === 'BUTTON' || e.target.closest('#ui-controls')) return;
+
+        draggedEl = e.target;
+
+        // Prevent editing text while dragging
+        draggedEl.contentEditable = false;
+
+        startX = e.clientX;
+        startY = e.clientY;
+
+        // Get current transform values (if any)
+        const style = window.getComputedStyle(draggedEl);
+        const matrix = new WebKitCSSMatrix(style.webkitTransform);
+        initialTx = matrix.m41;
+        initialTy = matrix.m42;
+
+        draggedEl.style.transition = 'none'; // Disable transition for smooth drag
+        draggedEl.style.zIndex = 1000; // Bring to front
+    }
+
+    function drag(e) {
+        if (!draggedEl) return;
+        e.preventDefault();
+        const dx = e.clientX - startX;
+        const dy = e.clientY - startY;
+        draggedEl.style.transform = `translate(${initialTx + dx}px, ${initialTy + dy}px)`;
+    }
+
+    function endDrag(e) {
+        if (!draggedEl) return;
+        draggedEl.contentEditable = isDesignMode; // Re-enable text edit
+        draggedEl.style.zIndex = ''; // Reset Z
+        draggedEl = null;
+    }
+
+    // --- DOWNLOAD LOGIC ---
+    function downloadAsImage() {
+        // 1. Hide the controls so they don't appear in the image
+        const controls = document.getElementById('ui-controls');
+        controls.style.display = 'none';
+
+        // 2. Temporarily turn off Design Mode borders/indicators if any
+        const wasDesignMode = isDesignMode;
+        if (isDesignMode) toggleDesignMode();
+
+        loadHtml2Canvas().then(html2canvas => html2canvas(document.body, {
+            useCORS: true,
+            allowTaint: true,
+            backgroundColor: '#ffffff', // Force white background for cleaner screenshots
+            scrollY: -window.scrollY // Fix scroll issues
+        })).then(canvas => {
+            const link = document.createElement('a');
+            link.download = 'marketing_asset_' + new Date().getTime() + '.png';
+            link.href = canvas.toDataURL();
+            link.click();
+        }).finally(() => {
+            // 3. Restore UI state
+            controls.style.display = 'flex';
+            if (wasDesignMode) toggleDesignMode();
+        });
+    }
+
+    // --- CONTROLS ---
+    function mountControls() {
+        if (document.getElementById('ui-controls')) return;
+        const controls = document.createElement('div');
+        controls.id = 'ui-controls';
+        controls.style.cssText = "position: fixed; top: 10px; right: 10px; z-index: 10000; display: flex; gap: 10px;";
+
+        const toggle = document.createElement('button');
+        toggle.id = 'toggle-design-btn';
+        toggle.style.cssText = "background: #444; " + BUTTON_STYLE;
+        toggle.innerHTML = "✏️ Design Mode: OFF";
+        toggle.addEventListener('click', toggleDesignMode);
+
+        const download = document.createElement('button');
+        download.style.cssText = "background: #2563EB; " + BUTTON_STYLE;
+        download.innerHTML = "📸 Download Image";
+        download.addEventListener('click', downloadAsImage);
+
+        controls.append(toggle, download);
+        document.body.appendChild(controls);
+    }
+
+    window.toggleDesignMode = toggleDesignMode;
+    window.downloadAsImage = downloadAsImage;
+
+    if (document.readyState === 'loading') {
+        document.addEventListener('DOMContentLoaded', mountControls);
+    } else {
+        mountControls();
+    }
+})();
@@ -0,0 +1,201 @@
+import json
+import re
+
+
+class FenceStripper:
+    """
+    Incrementally removes markdown fences (```html, ```) from streamed model output.
+    Holds back a chunk tail that could still grow into a fence (including a
+    complete "```" that may become "```html") until the next chunk arrives, so
+    the output matches stripping the whole text at once.
+    """
+
+    def __init__(self, fences=("```html", "```")):
+        # Longest first so "```html" wins over its "```" prefix.
+        self.fences = sorted(fences, key=len, reverse=True)
+        self._pending = ""
+
+    def _strip(self, text: str) -> str:
+        for fence in self.fences:
+            text = text.replace(fence, "")
+        return text
+
+    def feed(self, chunk: str) -> str:
+        buf = self._pending + chunk
+        # Decided on the raw text: a tail that is a proper prefix of any fence waits
+        hold = 0
+        for fence in self.fences:
+            for n in range(min(len(fence) - 1, len(buf)), 0, -1):
+                if buf.endswith(fence[:n]):
+                    hold = max(hold, n)
+                    break
+
+        self._pending = buf[len(buf) - hold:] if hold else ""
+        return self._strip(buf[:len(buf) - hold])
+
+    def flush(self) -> str:
+        tail, self._pending = self._pending, ""
+        return self._strip(tail)
+
+
+def sse_event(event: str, data) -> str:
+    """Formats one Server-Sent Event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",  # Stop nginx from buffering the stream
+}
+
+
+_STRING_STOP = re.compile(r'["\\]')
+_WHITESPACE = " \t\r\n"
+
+
+class _Frame:
+    __slots__ = ("kind", "path", "key", "index", "state")
+
+    def __init__(self, kind, path):
+        self.kind = kind  # "{" or "["
+        self.path = path
+        self.key = None
+        self.index = 0
+        self.state = "key" if kind == "{" else "value"
+
+    def child_path(self):
+        return self.path + ((self.key,) if self.kind == "{" else (self.index,))
+
+
+class IncrementalJSONParser:
+    """
+    Push parser for one JSON object arriving in chunks (e.g. streamed model output).
+
+    feed() returns the (path, value) pairs completed by that chunk for every path
+    where wants(path) is true, e.g. ("generated_code", "src/App.vue"). Only the
+    value currently being captured is buffered. Text before the opening brace and
+    after the closing one (markdown fences) is ignored.
+    """
+
+    def __init__(self, wants):
+        self.wants = wants
+        self.done = False
+        self._started = False
+        self._stack = []
+        self._in_string = False
+        self._string_is_key = False
+        self._escape = False
+        self._key = []
+        self._scalar = False
+        self._capture = None  # raw text pieces of the value being captured
+        self._capture_depth = 0
+        self._capture_path = None
+        self._capture_from = 0
+
+    def feed(self, chunk: str) -> list:
+        out = []
+        i, n = 0, len(chunk)
+        if not self._started:
+            i = chunk.find("{")
+            if i == -1:
+                return out
+            self._started = True
+
+        self._capture_from = 0
+        while i < n and not self.done:
+            if self._in_string:
+                i = self._scan_string(chunk, i, out)
+                continue
+
+            c = chunk[i]
+            if self._scalar and (c in _WHITESPACE or c in ",}]"):
+                self._end_value(chunk, i - 1, out)
+                self._scalar = False
+            if c in _WHITESPACE:
+                pass
+            elif c == '"':
+                frame = self._stack[-1]
+                if frame.kind == "{" and frame.state == "key":
+                    self._string_is_key = True
+                    self._key = []
+                else:
+                    self._string_is_key = False
+                    self._begin_value(chunk, i)
+                self._in_string = True
+            elif c == ":":
+                self._stack[-1].state = "value"
+            elif c == ",":
+                frame = self._stack[-1]
+                if frame.kind == "{":
+                    frame.state = "key"
+                else:
+                    frame.index += 1
+                    frame.state = "value"
+            elif c in "{[":
+                path = self._stack[-1].child_path() if self._stack else ()
+                self._begin_value(chunk, i, path)
+                self._stack.append(_Frame(c, path))
+            elif c in "}]":
+                self._stack.pop()
+                self._end_value(chunk, i, out)
+                if not self._stack:
+                    self.done = True
+            elif not self._scalar:
+                self._begin_value(chunk, i)
+                self._scalar = True
+            i += 1
+
+        if self._capture is not None:
+            self._capture.append(chunk[self._capture_from:])
+        return out
+
+    def _scan_string(self, chunk, i, out):
+        n = len(chunk)
+        start = i
+        if self._escape:
+            self._escape = False
+            i += 1
+        while i < n:
+            match = _STRING_STOP.search(chunk, i)
+            if match is None:
+                i = n
+                break
+            i = match.start()
+            if chunk[i] == "\\":
+                if i + 1 >= n:
+                    self._escape = True
+                    i = n
+                    break
+                i += 2
+                continue
+            # Closing quote
+            self._in_string = False
+            if self._string_is_key:
+                self._key.append(chunk[start:i])
+                frame = self._stack[-1]
+                frame.key = json.loads('"' + "".join(self._key) + '"')
+                frame.state = "colon"
+            else:
+                self._end_value(chunk, i, out)
+            return i + 1
+        if self._string_is_key:
+            self._key.append(chunk[start:i])
+        return i
+
+    def _begin_value(self, chunk, i, path=None):
+        if path is None:
+            path = self._stack[-1].child_path()
+        if self._capture is None and self.wants(path):
+            self._capture = []
+            self._capture_depth = len(self._stack)
+            self._capture_path = path
+            self._capture_from = i
+
+    def _end_value(self, chunk, i, out):
+        """Called with i at the value's last character."""
+        if self._capture is not None and len(self._stack) == self._capture_depth:
+            self._capture.append(chunk[self._capture_from:i + 1])
+            out.append((self._capture_path, json.loads("".join(self._capture))))
+            self._capture = None
+        if self._stack:
+            self._stack[-1].state = "comma"
@@ -0,0 +1,58 @@
+import asyncio
+
+import pytest
+
+from batch_jobs import BatchFull, BatchManager, JobNotFound
+from model_scheduler import ModelBusy
+
+
+def test_running_jobs_are_not_evicted():
+    async def scenario():
+        manager = BatchManager(max_jobs=1, max_active=2)
+        release = asyncio.Event()
+
+        async def slow(value):
+            await release.wait()
+            return {"value": value}
+
+        first = manager.submit("t", [1], slow)
+        second = manager.submit("t", [2], slow)
+        with pytest.raises(BatchFull):
+            manager.submit("t", [3], slow)
+        assert manager.get(first.job_id) is first and manager.get(second.job_id) is second
+
+        release.set()
+        await asyncio.gather(first.task, second.task)
+        # Only one finished job fits; the older one is dropped
+        assert manager.summary()["active"] == 0 and manager.summary()["finished"] == 1
+        with pytest.raises(JobNotFound):
+            manager.get(first.job_id)
+        assert manager.get(second.job_id).snapshot()["items"][0]["result"] == {"value": 2}
+
+    asyncio.run(scenario())
+
+
+def test_item_states_and_event_log():
+    async def scenario():
+        manager = BatchManager()
+        busy = {"left": 1}
+
+        async def run_item(value):
+            if value == "busy" and busy["left"]:
+                busy["left"] -= 1
+                raise ModelBusy("quota", retry_after=0)
+            if value == "bad":
+                raise ValueError("boom")
+            return {"value": value}
+
+        job = manager.submit("t", ["ok", "busy", "bad"], run_item)
+        events = [event async for event in manager.events(job.job_id)]
+        assert [name for name, _ in events] == ["snapshot", "item", "item", "item", "done"]
+        assert job.status == "partial"
+        assert [item["status"] for item in job.items] == ["done", "done", "failed"]
+        assert job.items[2]["error"] == "boom"
+
+        replay = [name async for name, _ in manager.events(job.job_id)]
+        assert replay == ["snapshot", "item", "item", "item", "done"]
+
+    asyncio.run(scenario())
@@ -0,0 +1,83 @@
+import pytest
+
+import design_tools
+import html_patch
+from html_patch import PatchError, apply_patches, parse, parse_patches, select_targets, strip_design_tools
+
+PAGE = (
+    '<div class="page"><header id="top"><h1>Acme</h1><img src="logo.png"></header>'
+    '<section class="pricing"><p>Basic plan</p><button class="buy">Buy now</button></section>'
+    '<footer><p>Contact us</p></footer></div>'
+)
+
+
+def by_tag(nodes, tag):
+    return [node for node in nodes.values() if node.tag == tag]
+
+
+def test_parse_records_source_offsets():
+    _, nodes = parse(PAGE)
+    assert list(nodes) == [f"N{i}" for i in range(1, len(nodes) + 1)]
+    for node in nodes.values():
+        assert PAGE[node.start:node.end].startswith(f"<{node.tag}")
+    button = by_tag(nodes, "button")[0]
+    assert PAGE[button.start:button.end] == '<button class="buy">Buy now</button>'
+    img = by_tag(nodes, "img")[0]
+    assert PAGE[img.start:img.end] == '<img src="logo.png">'  # void element closes itself
+
+
+def test_select_targets_prefers_smallest_matching_subtree():
+    _, nodes = parse(PAGE)
+    targets = select_targets(nodes, PAGE, "make the buy button green")
+    assert [node.tag for node in targets] == ["button"]
+    assert select_targets(nodes, PAGE, "change the whole theme to dark") == []
+    assert select_targets(nodes, PAGE, "zzz") == []
+
+
+def test_apply_patches_edits_by_offset():
+    _, nodes = parse(PAGE)
+    button = by_tag(nodes, "button")[0].node_id
+    footer = by_tag(nodes, "footer")[0].node_id
+    h1 = by_tag(nodes, "h1")[0].node_id
+    patched = apply_patches(PAGE, nodes, [
+        {"target": button, "action": "replace", "html": '<button class="buy green">Buy now</button>'},
+        {"target": footer, "action": "delete"},
+        {"target": h1, "action": "insert_after", "html": "<p>Tagline</p>"},
+    ], editable_ids={button})
+    assert patched == PAGE.replace('class="buy"', 'class="buy green"').replace(
+        "<footer><p>Contact us</p></footer>", "").replace("</h1>", "</h1><p>Tagline</p>")
+
+
+def test_apply_patches_rejects_invalid_patches():
+    _, nodes = parse(PAGE)
+    section = by_tag(nodes, "section")[0].node_id
+    button = by_tag(nodes, "button")[0].node_id
+    with pytest.raises(PatchError):
+        apply_patches(PAGE, nodes, [{"target": "N999", "action": "delete"}], set())
+    with pytest.raises(PatchError):
+        apply_patches(PAGE, nodes, [{"target": button, "action": "replace", "html": ""}], set())
+    with pytest.raises(PatchError):
+        apply_patches(PAGE, nodes, [{"target": button, "action": "move"}], {button})
+    with pytest.raises(PatchError):
+        apply_patches(PAGE, nodes, [{"target": section, "action": "delete"},
+                                    {"target": button, "action": "delete"}], set())
+
+
+def test_parse_patches_accepts_fenced_json():
+    assert parse_patches('```json\n{"patches": [{"target": "N1"}]}\n```') == [{"target": "N1"}]
+    assert parse_patches('[{"target": "N1"}]') == [{"target": "N1"}]
+    with pytest.raises(PatchError):
+        parse_patches('{"patches": "none"}')
+
+
+def test_strip_design_tools_round_trips_injection():
+    injected = design_tools.inject(PAGE)
+    assert injected != PAGE
+    assert strip_design_tools(injected).strip() == PAGE
+
+
+def test_outline_respects_depth():
+    root, _ = parse(PAGE)
+    lines = html_patch.outline(root, PAGE, max_depth=1).splitlines()
+    assert [line.split("] ")[1].split(">")[0] for line in lines] == ['<div class="page"', '<header id="top"',
+                                                                     '<section class="pricing"', "<footer"]
@@ -0,0 +1,42 @@
+import io
+
+import pytest
+from PIL import Image
+
+import image_preprocessing
+from image_preprocessing import ImageTooLarge, prepare_image
+
+
+def encode(image, fmt="JPEG", orientation=None):
+    buffer = io.BytesIO()
+    exif = Image.Exif()
+    if orientation is not None:
+        exif[0x0112] = orientation
+    image.save(buffer, format=fmt, exif=exif.tobytes() if orientation is not None else b"")
+    return buffer.getvalue()
+
+
+def test_rotated_photo_reports_upright_size():
+    # Stored landscape 400x200; orientation 6 means "rotate 90° clockwise to display" -> 200x400 upright
+    raw = encode(Image.new("RGB", (400, 200), "red"), orientation=6)
+    prepared = prepare_image(raw, max_pixels=20_000)
+    assert prepared.original_size == (200, 400)
+    assert prepared.image.width < prepared.image.height
+    # Box rescaling in /verify-design divides along matching axes
+    sx = prepared.original_size[0] / prepared.image.width
+    sy = prepared.original_size[1] / prepared.image.height
+    assert sx == pytest.approx(sy, rel=0.05)
+
+
+def test_downscales_to_budget_and_strips_metadata():
+    raw = encode(Image.new("RGBA", (1000, 800), (0, 0, 255, 128)), fmt="PNG")
+    prepared = prepare_image(raw, max_pixels=100_000)
+    assert prepared.original_size == (1000, 800)
+    assert prepared.image.mode == "RGB" and prepared.image.width * prepared.image.height <= 100_000
+    assert "exif" not in Image.open(io.BytesIO(prepared.data)).info
+
+
+def test_rejects_oversized_uploads(monkeypatch):
+    monkeypatch.setattr(image_preprocessing, "IMAGE_MAX_UPLOAD_BYTES", 10)
+    with pytest.raises(ImageTooLarge):
+        prepare_image(encode(Image.new("RGB", (10, 10))))
@@ -0,0 +1,100 @@
+import asyncio
+import time
+
+import pytest
+
+from job_queue import JobQueue, JobQueueFull, JobWorker
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = JobQueue(str(tmp_path / "nested" / "jobs.sqlite3"), max_pending=2, retention=60, lease=0.3)
+    yield queue
+    queue.close()
+
+
+def test_submit_claim_complete(queue):
+    job = queue.submit("build", {"n": 1})
+    assert job["status"] == "queued"
+    assert queue.claim("w1", ["other"]) is None
+
+    assert queue.claim("w1", ["build"]) == (job["job_id"], "build", {"n": 1})
+    assert queue.claim("w2", ["build"]) is None  # a job is claimed once
+    assert queue.heartbeat(job["job_id"], "w1") is False
+    assert queue.heartbeat(job["job_id"], "w2") is None
+
+    queue.complete(job["job_id"], "w1", {"project_id": "p1"})
+    done = queue.get(job["job_id"])
+    assert done["status"] == "done" and done["attempts"] == 1 and done["result"] == {"project_id": "p1"}
+    assert queue.find_result("build", "p1") == {"project_id": "p1"}
+
+
+def test_backpressure(queue):
+    queue.submit("build", {})
+    queue.submit("build", {})
+    with pytest.raises(JobQueueFull):
+        queue.submit("build", {})
+
+
+def test_cancel_queued_and_running(queue):
+    queued = queue.submit("build", {})
+    assert queue.cancel(queued["job_id"])["status"] == "cancelled"
+
+    running = queue.submit("build", {})
+    queue.claim("w1", ["build"])
+    assert queue.cancel(running["job_id"])["cancel_requested"]
+    assert queue.heartbeat(running["job_id"], "w1") is True
+    assert queue.cancel("missing") is None
+
+
+def test_release_does_not_use_an_attempt(queue):
+    job = queue.submit("build", {})
+    queue.claim("w1", ["build"])
+    queue.release(job["job_id"], "w1", delay=60)
+    assert queue.get(job["job_id"])["attempts"] == 0
+    assert queue.claim("w1", ["build"]) is None  # not runnable before the delay
+
+
+def test_recover_requeues_then_fails_expired_leases(queue):
+    job = queue.submit("build", {}, max_attempts=2)
+    for attempt in range(2):
+        queue.claim(f"w{attempt}", ["build"])
+        time.sleep(0.4)
+        assert queue.recover() == 1
+    record = queue.get(job["job_id"])
+    assert record["status"] == "failed" and record["error"] == "Worker lost while running the job"
+
+
+def test_purge_only_removes_old_finished_jobs(queue):
+    old = queue.submit("build", {})
+    queue.cancel(old["job_id"])
+    fresh = queue.submit("build", {})
+    queue.retention = -1
+    assert queue.purge() == 1
+    assert queue.get(old["job_id"]) is None and queue.get(fresh["job_id"]) is not None
+
+
+def test_worker_runs_defers_and_fails_jobs(queue):
+    class Busy(Exception):
+        retry_after = 60
+
+    async def ok(payload):
+        return {"echo": payload["n"]}
+
+    async def busy(payload):
+        raise Busy("quota")
+
+    async def scenario():
+        ids = [queue.submit("ok", {"n": 1})["job_id"], queue.submit("busy", {})["job_id"]]
+        worker = JobWorker(queue, {"ok": ok, "busy": busy}, concurrency=2, retry_on=(Busy,), poll_interval=0.05)
+        runner = asyncio.create_task(worker.run())
+        while worker.stats["completed"] + worker.stats["retried"] < 2:
+            await asyncio.sleep(0.05)
+        await worker.stop()
+        await runner
+        return ids
+
+    ok_id, busy_id = asyncio.run(scenario())
+    assert queue.get(ok_id)["result"] == {"echo": 1}
+    deferred = queue.get(busy_id)
+    assert deferred["status"] == "queued" and deferred["attempts"] == 0 and deferred["error"] == "quota"
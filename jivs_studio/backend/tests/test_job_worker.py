@@ -0,0 +1,33 @@
+import os
+import subprocess
+import sys
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_worker_does_not_load_the_api(tmp_path):
+    env = {**os.environ, "JOB_DATA_DIR": str(tmp_path), "TEST_WORKSPACE_DIR": str(tmp_path / "workspaces")}
+    env.pop("GOOGLE_API_KEY", None)  # main.py refuses to import without it; the worker module must not care
+    check = ("import sys, job_worker; "
+             "loaded = {'main', 'vector_store', 'design_sessions', 'batch_jobs'} & set(sys.modules); "
+             "assert not loaded, loaded; "
+             "assert set(job_worker.project_service.JOB_HANDLERS) == {'generate-project', 'run-tests'}")
+    subprocess.run([sys.executable, "-c", check], cwd=str(tmp_path), env={**env, "PYTHONPATH": BACKEND},
+                   check=True, timeout=60)
+    assert sorted(os.listdir(tmp_path)) == ["jobs.sqlite3", "workspaces"]
+
+
+def test_project_job_runs_at_batch_priority(tmp_path):
+    env = {**os.environ, "JOB_DATA_DIR": str(tmp_path), "TEST_WORKSPACE_DIR": str(tmp_path / "workspaces")}
+    check = """
+import asyncio, model_scheduler, project_service
+
+async def fake_generate(req):
+    return {"priority": model_scheduler.current_priority()}
+
+project_service.generate_project_result = fake_generate
+result = asyncio.run(project_service.project_job({"framework": "React", "description": "x"}))
+assert result == {"priority": "batch"}, result
+"""
+    subprocess.run([sys.executable, "-c", check], cwd=str(tmp_path), env={**env, "PYTHONPATH": BACKEND},
+                   check=True, timeout=60)
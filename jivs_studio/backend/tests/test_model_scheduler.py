@@ -0,0 +1,146 @@
+import asyncio
+
+import pytest
+
+import model_runtime
+from model_scheduler import ModelBusy, ModelScheduler, TokenBucket, backoff_delay, estimate_tokens, set_priority
+
+
+class UpstreamError(Exception):
+    def __init__(self, code):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+
+
+@pytest.fixture
+def runtime(monkeypatch):
+    """model_runtime with a fresh scheduler and no backoff sleeps."""
+    monkeypatch.setattr(model_runtime, "_scheduler", ModelScheduler(4, rpm=0, tpm=0))
+    monkeypatch.setattr(model_runtime, "backoff_delay", lambda attempt: 0)
+    return model_runtime
+
+
+def test_admits_by_priority_when_slots_free_up():
+    async def scenario():
+        sched = ModelScheduler(1, rpm=0, tpm=0, reserve=0)
+        first = await sched.acquire("batch", 10)
+        order = []
+
+        async def call(priority):
+            ticket = await sched.acquire(priority, 10)
+            order.append(priority)
+            sched.release(ticket)
+
+        tasks = [asyncio.create_task(call(p)) for p in ("batch", "generate", "interactive")]
+        await asyncio.sleep(0)
+        sched.release(first)
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(scenario()) == ["interactive", "generate", "batch"]
+
+
+def test_interactive_reserve_keeps_a_slot_free():
+    async def scenario():
+        sched = ModelScheduler(4, rpm=0, tpm=0, reserve=0.25)
+        held = [await sched.acquire("batch", 1) for _ in range(3)]
+        waiting = asyncio.create_task(sched.acquire("batch", 1))
+        await asyncio.sleep(0)
+        interactive = await asyncio.wait_for(sched.acquire("interactive", 1), 1)
+        assert not waiting.done()
+        for ticket in held + [interactive]:
+            sched.release(ticket)
+        sched.release(await waiting)
+
+    asyncio.run(scenario())
+
+
+def test_full_queue_raises_model_busy():
+    async def scenario():
+        sched = ModelScheduler(1, rpm=0, tpm=0, max_queue=1)
+        held = await sched.acquire("generate", 1)
+        queued = asyncio.create_task(sched.acquire("generate", 1))
+        await asyncio.sleep(0)
+        with pytest.raises(ModelBusy):
+            await sched.acquire("generate", 1)
+        sched.release(held)
+        sched.release(await queued)
+        return sched.summary()
+
+    assert asyncio.run(scenario())["classes"]["generate"]["rejected"] == 1
+
+
+def test_request_bucket_delays_admission():
+    async def scenario():
+        sched = ModelScheduler(8, rpm=60, tpm=0, reserve=0)
+        sched.requests.level = 0
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        sched.release(await sched.acquire("generate", 1))
+        return loop.time() - started
+
+    assert 0.8 < asyncio.run(scenario()) < 2.0  # one request per second
+
+
+def test_token_bucket_and_helpers():
+    bucket = TokenBucket(60)
+    bucket.level = 0
+    assert bucket.wait_time(1, 0) == pytest.approx(1.0)
+    assert 0 <= backoff_delay(3, base=1, cap=5) <= 5
+    assert estimate_tokens(["x" * 400, object()]) > estimate_tokens(["x" * 400])
+    with pytest.raises(ValueError):
+        set_priority("urgent")
+
+
+def test_run_model_call_retries_transient_errors(runtime):
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise UpstreamError(503)
+        return "ok"
+
+    assert asyncio.run(runtime.run_model_call(flaky)) == "ok"
+    assert len(calls) == 3
+    assert runtime.scheduler().summary()["classes"]["generate"]["retries"] == 2
+
+
+def test_run_model_call_turns_exhausted_quota_into_model_busy(runtime):
+    def limited():
+        raise UpstreamError(429)
+
+    with pytest.raises(ModelBusy):
+        asyncio.run(runtime.run_model_call(limited))
+    assert runtime.scheduler().summary()["classes"]["generate"]["rate_limited"] == runtime.MODEL_MAX_RETRIES + 1
+
+
+def test_run_model_call_does_not_retry_other_errors(runtime):
+    calls = []
+
+    def broken():
+        calls.append(1)
+        raise ValueError("bad output")
+
+    with pytest.raises(ValueError):
+        asyncio.run(runtime.run_model_call(broken))
+    assert len(calls) == 1
+
+
+def test_comparison_errors_reach_the_scheduler(runtime, monkeypatch):
+    import compare_images
+    from PIL import Image
+
+    class Model:
+        def generate_content(self, parts):
+            raise UpstreamError(429)
+
+    monkeypatch.setattr(compare_images.model_registry, "configure", lambda key: None)
+    monkeypatch.setattr(compare_images.model_registry, "get_model", lambda name, config=None: Model())
+    image = Image.new("RGB", (8, 8))
+
+    # Standalone use keeps the score-0 fallback
+    assert compare_images.compare_images_gemini(image, image, "key")["similarity_score"] == 0
+    with pytest.raises(ModelBusy):
+        asyncio.run(runtime.run_model_call(compare_images.compare_images_gemini, image, image, "key",
+                                           raise_errors=True))
@@ -0,0 +1,59 @@
+import io
+import os
+import tarfile
+import zipfile
+
+import pytest
+
+import project_export
+from project_export import archive_name, directory_entries, file_map_entries, stream_archive
+
+
+def archive_bytes(entries, fmt):
+    return b"".join(stream_archive(entries, fmt))
+
+
+def test_archive_name_rejects_escaping_paths():
+    assert archive_name("src/./App.vue", "proj") == "proj/src/App.vue"
+    assert archive_name("a\\b.txt") == "a/b.txt"
+    for bad in ("/etc/passwd", "../x", "a/../../x", "C:/x", ".", ""):
+        assert archive_name(bad) is None
+
+
+def test_zip_and_tar_hold_the_same_files(tmp_path):
+    files = {"src/App.vue": "<template/>", "README.md": "héllo", "../evil": "x"}
+    zipped = zipfile.ZipFile(io.BytesIO(archive_bytes(file_map_entries(files, "proj"), "zip")))
+    assert sorted(zipped.namelist()) == ["proj/README.md", "proj/src/App.vue"]
+    assert zipped.read("proj/README.md").decode("utf-8") == "héllo"
+
+    with tarfile.open(fileobj=io.BytesIO(archive_bytes(file_map_entries(files, "proj"), "tar.gz"))) as tar:
+        assert sorted(tar.getnames()) == ["proj/README.md", "proj/src/App.vue"]
+        assert tar.extractfile("proj/src/App.vue").read() == b"<template/>"
+
+
+@pytest.mark.parametrize("fmt", ["zip", "tar.gz"])
+def test_large_files_stream_in_chunks(tmp_path, fmt):
+    payload = os.urandom(2 * 1024 * 1024)
+    (tmp_path / "data").mkdir()
+    (tmp_path / "data" / "blob.bin").write_bytes(payload)
+    os.symlink(tmp_path / "data" / "blob.bin", tmp_path / "link.bin")
+
+    chunks = list(stream_archive(directory_entries(str(tmp_path), "assets"), fmt))
+    # Output arrives as the file is read, never as one archive-sized buffer
+    assert all(chunks) and max(map(len, chunks)) < 4 * project_export.EXPORT_CHUNK_SIZE
+    data = io.BytesIO(b"".join(chunks))
+    if fmt == "zip":
+        archive = zipfile.ZipFile(data)
+        assert archive.namelist() == ["assets/data/blob.bin"]  # the symlink is skipped
+        assert archive.read("assets/data/blob.bin") == payload
+    else:
+        with tarfile.open(fileobj=data) as archive:
+            assert archive.getnames() == ["assets/data/blob.bin"]
+            assert archive.extractfile("assets/data/blob.bin").read() == payload
+
+
+def test_unknown_format_and_download_headers():
+    with pytest.raises(ValueError):
+        list(stream_archive([], "rar"))
+    headers = project_export.download_headers("../my project", "tar.gz")
+    assert headers["Content-Disposition"] == 'attachment; filename="_my_project.tar.gz"'
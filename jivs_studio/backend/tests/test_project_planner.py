@@ -0,0 +1,36 @@
+import asyncio
+
+import pytest
+
+import project_planner
+from model_scheduler import ModelBusy
+
+PLAN = project_planner.parse_plan('{"files": ["a.js", "b.js", "c.js"]}')
+
+
+def run(generate, **kwargs):
+    async def collect():
+        return [item async for item in project_planner.generate_files(PLAN, "React", "demo", generate, **kwargs)]
+    return asyncio.run(collect())
+
+
+def test_file_errors_are_reported_per_file():
+    async def generate(prompt):
+        if "YOUR FILE: b.js" in prompt:
+            raise ValueError("bad output")
+        return "export default 1;"
+
+    results = {path: (content, error) for path, content, error in run(generate, concurrency=2)}
+    assert results["a.js"] == ("export default 1;", None) and results["b.js"] == (None, "bad output")
+
+
+def test_abort_on_ends_the_run():
+
+    async def generate(prompt):
+        if "YOUR FILE: a.js" in prompt:
+            raise ModelBusy("quota", retry_after=3)
+        await asyncio.sleep(1)
+        return "x"
+
+    with pytest.raises(ModelBusy):
+        run(generate, concurrency=3, abort_on=(ModelBusy,))
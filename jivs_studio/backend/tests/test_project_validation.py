@@ -0,0 +1,64 @@
+from project_validation import check_file, check_imports, scan_js, validate_project
+
+
+def errors(diagnostics):
+    return [d for d in diagnostics if d["severity"] == "error"]
+
+
+def test_jsx_text_is_not_scanned_as_code():
+    sources = [
+        "export default function Steps() {\n  return (<div><p>Step 1) Open the app</p></div>);\n}\n",
+        "const Thanks = () => <p>Thanks :)</p>;\n",
+        "const Links = ({x}) => <ul>{x.map(i => <a key={i} href=\"/\">https://x.io</a>)}</ul>;\n",
+        "const F = () => (<>\n  <Item a={{b: 1}} {...rest} />\n  {ok && <b>it's {n > 1 ? 'many' : 'one'}</b>}\n</>);\n",
+    ]
+    for source in sources:
+        assert scan_js(source) == [], source
+
+
+def test_comparisons_and_generics_are_not_jsx():
+    assert scan_js("if (a <b) { x = a < b ? 1 : 2 }\nconst r = /<a>/.test(s);\n") == []
+    assert scan_js("const [v, setV] = useState<string>('');\n") == []
+
+
+def test_code_errors_stay_errors_and_jsx_mismatches_are_warnings():
+    assert errors(scan_js("const x = (1));\n"))[0]["message"].startswith("Unexpected ')'")
+    assert errors(scan_js("function f( { return 1; }\n"))[0]["message"] == "Unclosed '('"
+    broken = scan_js("const A = () => <div><p>hi</div>;\n")
+    assert broken and not errors(broken) and broken[0]["rule"] == "jsx-structure"
+
+
+def test_check_file_dispatches_by_extension():
+    assert errors(check_file("package.json", '{"dependencies": []}'))
+    assert errors(check_file("app.py", "def f(:\n"))
+    assert errors(check_file("a.css", ".a { color: red"))
+    assert check_file("notes.txt", "((") == []
+
+
+def test_import_resolution():
+    files = {
+        "package.json": '{"name": "x", "dependencies": {"react": "18"}}',
+        "src/App.jsx": "import React from 'react';\nimport Card from './Card';\nimport x from 'lodash';\n",
+        "src/Card.jsx": "import Missing from '../nowhere';\n",
+    }
+    found = check_imports(files)
+    assert [d["rule"] for d in found["src/App.jsx"]] == ["import-package"]
+    assert found["src/Card.jsx"][0]["message"] == "Cannot resolve '../nowhere'"
+    assert not validate_project(files)["ok"]
+
+
+def test_vue_template_block_spans_nested_templates():
+    sfc = """<template>
+  <div>
+    <template v-if="ok"><p>yes</p></template>
+    <Card><template #header><h1>Title</h1></template></Card>
+  </div>
+</template>
+
+<script setup>
+const ok = true
+</script>
+"""
+    assert check_file("src/App.vue", sfc) == []
+    broken = check_file("src/App.vue", "<template>\n  <div>\n</template>\n<script>x = (</script>")
+    assert [d["message"] for d in broken] == ["<div> is never closed", "Unclosed '('"]
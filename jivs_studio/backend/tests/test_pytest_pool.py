@@ -0,0 +1,76 @@
+import asyncio
+import os
+
+import pytest
+
+from pytest_pool import PytestPool, QueueFull
+
+pytest.importorskip("pytest_jsonreport")
+
+
+def write_test(root, name, body):
+    os.makedirs(root, exist_ok=True)
+    with open(os.path.join(root, name), "w") as f:
+        f.write(body)
+    return root
+
+
+def test_run_reports_results(tmp_path):
+    workspace = write_test(str(tmp_path), "test_ok.py", "def test_ok():\n    assert True\n")
+
+    async def scenario():
+        pool = PytestPool(size=1, timeout=30)
+        try:
+            return await pool.run(workspace)
+        finally:
+            await pool.close()
+
+    result = asyncio.run(scenario())
+    assert result["exit_code"] == 0
+    assert result["report"]["summary"]["passed"] == 1
+
+
+def test_cancelled_run_does_not_leak_into_next_run(tmp_path):
+    slow = write_test(str(tmp_path / "slow"), "test_slow.py",
+                      "import time\ndef test_slow():\n    time.sleep(3)\n")
+    fast = write_test(str(tmp_path / "fast"), "test_fast.py",
+                      "def test_a():\n    pass\ndef test_b():\n    pass\n")
+    hang = write_test(str(tmp_path / "hang"), "test_hang.py",
+                      "import time\ndef test_hang():\n    time.sleep(30)\n")
+
+    async def scenario():
+        pool = PytestPool(size=1, timeout=30)
+        try:
+            task = asyncio.create_task(pool.run(slow))
+            await asyncio.sleep(1.0)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            after_cancel = await pool.run(fast)
+            timed_out = await pool.run(hang, timeout=1)
+            return after_cancel, timed_out, pool.summary()
+        finally:
+            await pool.close()
+
+    after_cancel, timed_out, summary = asyncio.run(scenario())
+    assert after_cancel["report"] is not None
+    assert after_cancel["report"]["summary"]["passed"] == 2
+    assert timed_out["timed_out"]
+    assert summary["busy"] == 0
+
+
+def test_rejects_when_queue_is_full(tmp_path):
+    workspace = write_test(str(tmp_path), "test_slow.py", "import time\ndef test_slow():\n    time.sleep(1)\n")
+
+    async def scenario():
+        pool = PytestPool(size=1, max_queue=0, timeout=30)
+        try:
+            first = asyncio.create_task(pool.run(workspace))
+            await asyncio.sleep(0.2)
+            with pytest.raises(QueueFull):
+                await pool.run(workspace)
+            return await first
+        finally:
+            await pool.close()
+
+    assert asyncio.run(scenario())["exit_code"] == 0
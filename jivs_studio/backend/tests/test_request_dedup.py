@@ -0,0 +1,138 @@
+import asyncio
+
+import pytest
+
+from request_dedup import IdempotencyMismatch, IdempotencyStore, SingleFlight, fingerprint
+
+
+async def collect(iterator):
+    return [item async for item in iterator]
+
+
+def test_fingerprint_separates_parts():
+    assert fingerprint("ab", "c") != fingerprint("a", "bc")
+    assert fingerprint({"a": 1, "b": 2}) == fingerprint({"b": 2, "a": 1})
+
+
+def test_single_flight_coalesces_and_survives_a_cancelled_waiter():
+    async def scenario():
+        flight = SingleFlight()
+        calls = []
+        gate = asyncio.Event()
+
+        async def work():
+            calls.append(1)
+            await gate.wait()
+            return "result"
+
+        first = asyncio.ensure_future(flight.do("k", work))
+        second = asyncio.ensure_future(flight.do("k", work))
+        await asyncio.sleep(0)
+        first.cancel()
+        gate.set()
+        assert await second == "result"
+        assert calls == [1] and flight.stats["coalesced"] == 1
+        assert not flight.in_flight("k")
+
+    asyncio.run(scenario())
+
+
+def test_single_flight_stream_replays_to_late_joiners():
+    async def scenario():
+        flight = SingleFlight()
+        gate = asyncio.Event()
+
+        async def produce():
+            yield 1
+            await gate.wait()
+            yield 2
+
+        early = flight.stream("k", produce)
+        assert await early.__anext__() == 1
+        late = asyncio.ensure_future(collect(flight.stream("k", produce)))
+        await asyncio.sleep(0)
+        gate.set()
+        assert [1] + await collect(early) == [1, 2]
+        assert await late == [1, 2]
+        assert flight.stats == {"calls": 0, "coalesced": 0, "streams": 1, "stream_joins": 1}
+
+    asyncio.run(scenario())
+
+
+def test_run_replays_and_rejects_a_different_body():
+    async def scenario():
+        store = IdempotencyStore()
+        calls = []
+
+        async def fn():
+            calls.append(1)
+            return {"ok": True}
+
+        assert await store.run("s", "key", "fp1", fn) == ({"ok": True}, False)
+        assert await store.run("s", "key", "fp1", fn) == ({"ok": True}, True)
+        with pytest.raises(IdempotencyMismatch):
+            await store.run("s", "key", "fp2", fn)
+        assert calls == [1]
+
+    asyncio.run(scenario())
+
+
+def test_run_keeps_no_result_for_failures():
+    async def scenario():
+        store = IdempotencyStore()
+
+        async def fail():
+            raise RuntimeError("upstream")
+
+        with pytest.raises(RuntimeError):
+            await store.run("s", "key", "fp", fail)
+
+        async def ok():
+            return 1
+
+        assert await store.run("s", "key", "fp", ok) == (1, False)
+
+    asyncio.run(scenario())
+
+
+def test_concurrent_streams_with_a_different_body_are_rejected_before_either_starts():
+    async def scenario():
+        store = IdempotencyStore()
+        produced = []
+
+        def factory():
+            async def events():
+                produced.append(1)
+                yield "a"
+                yield "b"
+            return events()
+
+        first, replayed = store.stream("s", "key", "fp1", factory)
+        assert not replayed
+        with pytest.raises(IdempotencyMismatch):
+            store.stream("s", "key", "fp2", factory)
+
+        second, joined = store.stream("s", "key", "fp1", factory)
+        assert joined
+        assert await asyncio.gather(collect(first), collect(second)) == [["a", "b"], ["a", "b"]]
+        assert produced == [1]
+
+        replay, replayed = store.stream("s", "key", "fp1", factory)
+        assert replayed and await collect(replay) == ["a", "b"]
+
+    asyncio.run(scenario())
+
+
+def test_stream_with_an_error_event_is_not_stored():
+    async def scenario():
+        store = IdempotencyStore()
+
+        async def events():
+            yield "event: error\n"
+
+        stream, _ = store.stream("s", "key", "fp", events, is_error=lambda item: item.startswith("event: error"))
+        await collect(stream)
+        _, replayed = store.stream("s", "key", "fp", events)
+        assert not replayed
+
+    asyncio.run(scenario())
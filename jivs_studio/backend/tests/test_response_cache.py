@@ -0,0 +1,106 @@
+import asyncio
+import os
+import time
+
+import model_registry
+from response_cache import LRUCache, ResponseCache
+
+
+def test_lru_evicts_by_count_and_bytes():
+    cache = LRUCache(max_entries=2, max_bytes=10)
+    cache.set("a", 1, size=4)
+    cache.set("b", 2, size=4)
+    cache.get("a")  # b is now least recently used
+    cache.set("c", 3, size=4)
+    assert "b" not in cache and "a" in cache and "c" in cache
+    cache.set("d", 4, size=9)
+    assert len(cache) == 1 and cache.evictions == 3
+
+
+def test_lru_ttl():
+    cache = LRUCache(ttl=0.05)
+    cache.set("a", 1)
+    time.sleep(0.1)
+    assert cache.get("a") is None
+
+
+def test_make_key_is_length_prefixed():
+    assert ResponseCache.make_key("m", "ab", "c") != ResponseCache.make_key("m", "a", "bc")
+    assert ResponseCache.make_key("m", b"\x00") == ResponseCache.make_key("m", b"\x00")
+
+
+def test_model_signature_includes_generation_config():
+    class Model:
+        model_name = "models/gemini"
+
+        def __init__(self, config):
+            self._generation_config = config
+
+    plain = model_registry.model_signature(Model({}))
+    assert plain == model_registry.model_signature(Model(None))
+    assert plain != model_registry.model_signature(Model({"temperature": 0.2}))
+    assert model_registry.model_signature(Model({"response_mime_type": "application/json"})) != plain
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+
+    async def scenario():
+        cache = ResponseCache(db_path=path)
+        cache.set("k", "value" * 100)
+        assert await cache.get("k") == "value" * 100  # readable before the writer has run
+        cache.close()
+
+        reopened = ResponseCache(db_path=path)
+        try:
+            value = await reopened.get("k")
+            return value, reopened.summary()
+        finally:
+            reopened.close()
+
+    value, summary = asyncio.run(scenario())
+    assert value == "value" * 100
+    assert summary["disk_hits"] == 1 and summary["disk_bytes"] > 0
+
+
+def test_disk_tier_evicts_least_recently_used(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    payload = os.urandom(3000).hex()  # ~3.5 KB compressed, so three rows exceed the budget
+
+    async def scenario():
+        cache = ResponseCache(max_entries=1, db_path=path, disk_max_bytes=10000)
+        disk = cache._disk
+        for key in ("a", "b"):
+            cache.set(key, key + payload)
+            await asyncio.sleep(1.2)  # one writer flush per key, so accessed times differ
+        assert await cache.get("a") is not None  # from disk: a becomes most recently used
+        await asyncio.sleep(1.2)
+        cache.set("c", "c" + payload)
+        cache.close()
+        return disk
+
+    disk = asyncio.run(scenario())
+    assert disk.total_bytes <= 10000
+    reopened = ResponseCache(max_entries=1, db_path=path)
+    try:
+        found = {key: asyncio.run(reopened.get(key)) is not None for key in "abc"}
+    finally:
+        reopened.close()
+    assert found == {"a": True, "b": False, "c": True}
+
+
+def test_disk_tier_honours_ttl(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+
+    async def scenario():
+        cache = ResponseCache(ttl=0.2, db_path=path)
+        cache.set("k", "v")
+        cache.close()
+        await asyncio.sleep(0.3)
+        reopened = ResponseCache(ttl=0.2, db_path=path)
+        try:
+            return await reopened.get("k")
+        finally:
+            reopened.close()
+
+    assert asyncio.run(scenario()) is None
@@ -0,0 +1,101 @@
+import json
+
+import pytest
+
+from streaming import FenceStripper, IncrementalJSONParser, sse_event
+
+PAGES = [
+    "```html\n<div>hi</div>\n```",
+    "Here:\n```html\n<p>a ``` b</p>\n```\n",
+    "<div>no fences</div>",
+    "```\n<div>bare fence</div>\n```",
+    "``` ``html `` ```html```",
+]
+
+
+def strip_all(text):
+    return text.replace("```html", "").replace("```", "")
+
+
+def stream(stripper, chunks):
+    return "".join(stripper.feed(chunk) for chunk in chunks) + stripper.flush()
+
+
+def test_trailing_bare_fence_waits_for_next_chunk():
+    stripper = FenceStripper()
+    assert stripper.feed("```") == ""
+    assert stripper.feed("html\n<div>") == "\n<div>"
+
+
+@pytest.mark.parametrize("page", PAGES)
+def test_split_at_every_offset_matches_whole_text(page):
+    for cut in range(len(page) + 1):
+        assert stream(FenceStripper(), [page[:cut], page[cut:]]) == strip_all(page), cut
+
+
+@pytest.mark.parametrize("page", PAGES)
+def test_one_character_chunks_match_whole_text(page):
+    assert stream(FenceStripper(), list(page)) == strip_all(page)
+
+
+def test_fence_split_inside_html_keyword():
+    fence = "```html"
+    for cut in range(1, len(fence)):
+        stripper = FenceStripper()
+        out = stripper.feed("a" + fence[:cut]) + stripper.feed(fence[cut:] + "b") + stripper.flush()
+        assert out == "ab", cut
+
+
+def test_sse_event_format():
+    assert sse_event("chunk", {"html": "<b>"}) == 'event: chunk\ndata: {"html": "<b>"}\n\n'
+
+
+DOC = {
+    "analysis": {"summary": "A \"quoted\" app", "components_generated": ["App", "Nav"]},
+    "generated_code": {
+        "src/App.vue": "<template>\n  <div>{{ msg }}</div>\n</template>\n",
+        "package.json": "{\"name\": \"x\", \"deps\": [1, 2]}",
+        "src/escape.js": "const s = '\\\\n' // back\\\\slash",
+    },
+    "count": 3,
+    "ok": True,
+}
+
+
+def wants(path):
+    return path == ("analysis",) or (len(path) == 2 and path[0] == "generated_code") or path == ("count",)
+
+
+def expected():
+    return [(("analysis",), DOC["analysis"])] + \
+        [(("generated_code", name), code) for name, code in DOC["generated_code"].items()] + \
+        [(("count",), 3)]
+
+
+def parse(chunks):
+    parser = IncrementalJSONParser(wants)
+    out = []
+    for chunk in chunks:
+        out.extend(parser.feed(chunk))
+    return out, parser.done
+
+
+def test_parser_whole_document_with_fences():
+    out, done = parse(["```json\n" + json.dumps(DOC, indent=2) + "\n```"])
+    assert out == expected()
+    assert done
+
+
+@pytest.mark.parametrize("indent", [None, 2])
+def test_parser_split_at_every_offset(indent):
+    text = json.dumps(DOC, indent=indent)
+    for cut in range(len(text) + 1):
+        out, done = parse([text[:cut], text[cut:]])
+        assert out == expected(), cut
+        assert done
+
+
+def test_parser_one_character_chunks():
+    out, done = parse(list(json.dumps(DOC)))
+    assert out == expected()
+    assert done
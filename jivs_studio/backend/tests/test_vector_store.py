@@ -0,0 +1,96 @@
+import numpy as np
+from qdrant_client.http import models
+
+from local_index import LocalVectorIndex
+from response_cache import LRUCache
+from vector_store import DesignMemory
+
+
+class FakeEmbeddings:
+    def __init__(self):
+        self.calls = []
+
+    def embed_query(self, text):
+        self.calls.append(text)
+        return [1.0, 0.0, 0.0]
+
+
+def make_memory(mirror_dir, ttl=None):
+    memory = DesignMemory.__new__(DesignMemory)
+    memory.embedding_model = FakeEmbeddings()
+    memory._embedding_cache = LRUCache()
+    memory._results_cache = LRUCache(ttl=ttl)
+    memory._style_guide_cache = LRUCache()
+    memory.mirror = LocalVectorIndex(str(mirror_dir), dim=3)
+    return memory
+
+
+def point(pid, name, vector):
+    return models.PointStruct(id=pid, vector=vector, payload={"page_content": name, "metadata": {"name": name}})
+
+
+def test_embeds_original_text_and_shares_results_by_normalized_key(tmp_path):
+    memory = make_memory(tmp_path)
+    memory.mirror.upsert_points([point(1, "Dashboard", [1.0, 0.0, 0.0])])
+
+    assert memory.search("Dark, Dashboard!")[0].page_content == "Dashboard"
+    assert memory.search("dark dashboard")[0].page_content == "Dashboard"
+    assert memory.embedding_model.calls == ["Dark, Dashboard!"]
+
+
+def test_picks_up_writes_from_another_process(tmp_path):
+    memory = make_memory(tmp_path)
+    memory.mirror.upsert_points([point(1, "Old", [1.0, 0.0, 0.0])])
+    assert memory.search("theme")[0].page_content == "Old"
+
+    # ingest_template.py writes through its own index on the same directory
+    LocalVectorIndex(str(tmp_path), dim=3).upsert_points([point(1, "New", [1.0, 0.0, 0.0])])
+    assert memory.search("theme")[0].page_content == "New"
+
+
+def test_results_expire(tmp_path):
+    memory = make_memory(tmp_path, ttl=0)
+    memory.mirror.upsert_points([point(1, "A", [1.0, 0.0, 0.0])])
+    memory.search("theme")
+    memory.search("theme")
+    assert len(memory.embedding_model.calls) == 1  # embedding is cached, the results were not
+
+
+def test_local_index_search_orders_by_cosine(tmp_path):
+    index = LocalVectorIndex(str(tmp_path), dim=3)
+    index.upsert_points([point(1, "x", [1.0, 0.0, 0.0]), point(2, "y", [0.0, 2.0, 0.0]),
+                         point(3, "xy", [1.0, 1.0, 0.0])])
+    names = [payload["page_content"] for _, payload in index.search(np.array([1.0, 0.2, 0.0]), k=2)]
+    assert names == ["x", "xy"]
+    assert len(LocalVectorIndex(str(tmp_path), dim=3)) == 3
+
+
+class FakeQdrant:
+    """Just enough of QdrantClient for sync_from_qdrant() and is_in_sync()."""
+
+    def __init__(self, points):
+        self.points = list(points)
+
+    def count(self, collection_name, exact=True):
+        return models.CountResult(count=len(self.points))
+
+    def scroll(self, collection_name, limit, offset=None, with_payload=True, with_vectors=False):
+        start = offset or 0
+        page = [models.Record(id=p.id, payload=p.payload, vector=p.vector if with_vectors else None)
+                for p in self.points[start:start + limit]]
+        end = start + limit
+        return page, (end if end < len(self.points) else None)
+
+
+def test_is_in_sync_detects_replaced_points(tmp_path):
+    client = FakeQdrant([point(1, "A", [1.0, 0.0, 0.0]), point(2, "B", [0.0, 1.0, 0.0])])
+    index = LocalVectorIndex(str(tmp_path), dim=3)
+    index.sync_from_qdrant(client, "c", batch_size=1)
+    assert index.is_in_sync(client, "c")
+
+    # Same count: one point deleted and another inserted, then one rewritten in place
+    client.points[1] = point(3, "C", [0.0, 0.0, 1.0])
+    assert not index.is_in_sync(client, "c")
+    index.sync_from_qdrant(client, "c")
+    client.points[0] = point(1, "A2", [1.0, 0.0, 0.0])
+    assert not index.is_in_sync(client, "c")
@@ -0,0 +1,78 @@
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from workspaces import WorkspaceManager, affected_tests, merge_results, safe_path, tree_hash
+
+
+def test_managers_sharing_a_base_keep_their_workspaces(tmp_path):
+    first = WorkspaceManager(root=str(tmp_path))
+    workspace = first.get("project")
+    workspace.sync({"app.py": "x = 1\n"})
+
+    second = WorkspaceManager(root=str(tmp_path))
+    assert first.root != second.root
+    assert os.path.exists(os.path.join(workspace.path, "app.py"))
+
+
+def test_stale_roots_of_dead_processes_are_removed(tmp_path):
+    dead = subprocess.Popen([sys.executable, "-c", "pass"])
+    dead.wait()
+    stale = tmp_path / f"{dead.pid}-deadbeef"
+    fresh = tmp_path / f"{dead.pid}-cafebabe"
+    live = tmp_path / f"{os.getpid()}-00000000"
+    for path in (stale, fresh, live):
+        path.mkdir()
+    old = time.time() - 3600
+    os.utime(stale, (old, old))
+    os.utime(live, (old, old))
+
+    WorkspaceManager(root=str(tmp_path), ttl=60)
+    assert not stale.exists()
+    assert fresh.exists()  # too recent
+    assert live.exists()  # its process is still running
+
+
+def test_sync_rewrites_only_changes(tmp_path):
+    workspace = WorkspaceManager(root=str(tmp_path)).get("p")
+    assert workspace.sync({"a.py": "1", "b.py": "2"}) == ({"a.py", "b.py"}, set())
+    assert workspace.sync({"a.py": "1", "c.py": "3"}) == ({"c.py"}, {"b.py"})
+    assert not os.path.exists(os.path.join(workspace.path, "b.py"))
+
+
+def test_sync_rejects_escaping_paths(tmp_path):
+    workspace = WorkspaceManager(root=str(tmp_path)).get("p")
+    with pytest.raises(ValueError):
+        workspace.sync({"../outside.py": "x"})
+    with pytest.raises(ValueError):
+        safe_path(str(tmp_path), "/etc/passwd")
+
+
+def test_tree_hash_ignores_order():
+    assert tree_hash({"a": "1", "b": "2"}, "React") == tree_hash({"b": "2", "a": "1"}, "React")
+    assert tree_hash({"a": "1"}, "React") != tree_hash({"a": "1"}, "Vue")
+
+
+def test_affected_tests_follows_imports():
+    files = {
+        "utils.py": "def f(): pass\n",
+        "app.py": "from utils import f\n",
+        "test_app.py": "import app\n",
+        "test_other.py": "def test_x(): pass\n",
+        "Button.jsx": "export default 1",
+        "test_button.py": "open('Button.jsx')\n",
+    }
+    assert affected_tests(files, {"utils.py"}) == {"test_app.py"}
+    assert affected_tests(files, {"Button.jsx"}) == {"test_button.py"}
+    assert affected_tests(files, {"conftest.py"}) is None
+
+
+def test_merge_results_keeps_untouched_outcomes():
+    previous = {"tests": [{"name": "test_a.py::t", "outcome": "passed"},
+                          {"name": "test_b.py::t", "outcome": "failed"}]}
+    fresh = {"tests": [{"name": "test_b.py::t", "outcome": "passed"}]}
+    merged = merge_results(previous, fresh, {"test_b.py"}, {"test_a.py", "test_b.py"})
+    assert merged["summary"] == {"passed": 2, "total": 2}
@@ -1,12 +1,23 @@
 import os
+import re
+import hashlib
+import json
+import uuid
 from dotenv import load_dotenv
 from langchain_qdrant import QdrantVectorStore
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
+from langchain_core.documents import Document
 from qdrant_client import QdrantClient
 from qdrant_client.http import models
+from response_cache import LRUCache
+from local_index import LocalVectorIndex
 
 load_dotenv()
 
+def normalize_query(query: str) -> str:
+    """Lowercases and strips punctuation/extra whitespace so near-identical prompts share cache entries."""
+    return " ".join(re.sub(r"[^\w\s]", " ", query.lower()).split())
+
 class DesignMemory:
     def __init__(self):
         # 1. Use Google Embeddings
@@ -37,14 +48,127 @@ class DesignMemory:
             embedding=self.embedding_model,
         )
 
+        # 2. Query caches. Embeddings only depend on the query text, so they survive
+        # writes; retrieval results are dropped whenever this process writes to the
+        # collection, and expire after a TTL so writes from other processes
+        # (ingest_template.py) show up without a restart.
+        cache_size = int(os.getenv("DESIGN_MEMORY_CACHE_SIZE", "1024"))
+        results_ttl = float(os.getenv("DESIGN_MEMORY_RESULTS_TTL", "300"))
+        self._embedding_cache = LRUCache(max_entries=cache_size)
+        self._results_cache = LRUCache(max_entries=cache_size, ttl=results_ttl)
+        self._style_guide_cache = LRUCache(max_entries=cache_size)
+
+        # 3. Optional in-process mirror of the collection (see local_index.py)
+        self.mirror = None
+        mirror_dir = os.getenv("DESIGN_MEMORY_MIRROR_DIR")
+        if mirror_dir:
+            self.mirror = LocalVectorIndex(mirror_dir, dim=768)
+            self._bootstrap_mirror(os.getenv("DESIGN_MEMORY_SNAPSHOT"))
+
+    def _bootstrap_mirror(self, snapshot_path=None):
+        try:
+            if snapshot_path and not len(self.mirror) and os.path.exists(snapshot_path):
+                self.mirror.import_snapshot(snapshot_path)
+            if not self.mirror.is_in_sync(self.client, self.collection_name):
+                self.mirror.sync_from_qdrant(self.client, self.collection_name)
+        except Exception as e:
+            # Searches fall back to Qdrant while the mirror is empty
+            print(f"⚠️ Local mirror sync failed: {e}")
+
+    @staticmethod
+    def template_id(description, metadata):
+        """Deterministic point id derived from the template content, so re-ingesting is a no-op."""
+        digest = hashlib.sha256(
+            json.dumps([description, metadata], sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()
+        return str(uuid.uuid5(uuid.NAMESPACE_URL, f"jivs-template:{digest}"))
+
     def add_template(self, description, metadata):
-        from langchain_core.documents import Document
         doc = Document(page_content=description, metadata=metadata)
-        self.vector_store.add_documents([doc])
+        ids = self.vector_store.add_documents([doc], ids=[self.template_id(description, metadata)])
+        self._sync_mirror(ids)
+        self.invalidate_cache()
         print(f"✅ Template stored: {metadata.get('name', 'Unknown')}")
 
+    def _sync_mirror(self, ids):
+        if self.mirror is None or not ids:
+            return
+        try:
+            points = self.client.retrieve(self.collection_name, ids=ids, with_payload=True, with_vectors=True)
+            self.mirror.upsert_points(points)
+        except Exception as e:
+            print(f"⚠️ Local mirror update failed, resyncing: {e}")
+            self.mirror.sync_from_qdrant(self.client, self.collection_name)
+
+    def existing_ids(self, ids):
+        """Subset of `ids` already stored in the collection."""
+        if not ids:
+            return set()
+        points = self.client.retrieve(self.collection_name, ids=list(ids), with_payload=False, with_vectors=False)
+        return {str(p.id) for p in points}
+
+    def upsert_embedded(self, ids, descriptions, metadatas, vectors):
+        """
+        Bulk write of pre-embedded templates, using the same payload layout as
+        the langchain store so find_similar_style() can read them back.
+        """
+        points = [
+            models.PointStruct(id=pid, vector=list(vector), payload={"page_content": desc, "metadata": meta})
+            for pid, desc, meta, vector in zip(ids, descriptions, metadatas, vectors)
+        ]
+        self.client.upsert(collection_name=self.collection_name, points=points, wait=True)
+        if self.mirror is not None:
+            self.mirror.upsert_points(points)
+        self.invalidate_cache()
+
+    def invalidate_cache(self):
+        """Drops cached retrieval results after the collection was written to."""
+        self._results_cache.clear()
+
+    def embed_query(self, query):
+        # The model sees the text as written; casing and punctuation carry meaning for it
+        embedding = self._embedding_cache.get(query)
+        if embedding is None:
+            embedding = self.embedding_model.embed_query(query)
+            self._embedding_cache.set(query, embedding)
+        return embedding
+
+    def search(self, query, k=1):
+        if self.mirror is not None and self.mirror.reload_if_changed():
+            self.invalidate_cache()
+        # Normalized text only keys the results, so near-identical prompts share them
+        key = (normalize_query(query), k)
+        docs = self._results_cache.get(key)
+        if docs is None:
+            embedding = self.embed_query(query)
+            if self.mirror is not None and len(self.mirror):
+                docs = [
+                    Document(page_content=payload.get("page_content", ""), metadata=payload.get("metadata") or {})
+                    for _, payload in self.mirror.search(embedding, k=k)
+                ]
+            else:
+                docs = self.vector_store.similarity_search_by_vector(embedding, k=k)
+            self._results_cache.set(key, docs)
+        return docs
+
     def find_similar_style(self, query, k=1):
-        docs = self.vector_store.similarity_search(query, k=k)
+        docs = self.search(query, k=k)
         if docs:
             return docs[0]
-        return None
\ No newline at end of file
+        return None
+
+    def render_style_guide(self, doc):
+        """Prompt fragment describing a retrieved template, memoized per template content."""
+        key = hashlib.sha256(f"{doc.page_content}\x00{sorted(doc.metadata.items())}".encode("utf-8")).hexdigest()
+        fragment = self._style_guide_cache.get(key)
+        if fragment is None:
+            fragment = f"""
+                \n\n**STRICT STYLE GUIDE (FROM DATABASE):**
+                - Base Design: {doc.metadata.get('name')}
+                - Visual Rules: {doc.page_content}
+                - Style Metadata: {doc.metadata}
+
+                PLEASE ADHERE TO THIS VISUAL THEME.
+                """
+            self._style_guide_cache.set(key, fragment)
+        return fragment
@@ -0,0 +1,235 @@
+import os
+
+import numpy as np
+from PIL import Image
+
+# Working resolution for local comparisons. Both screenshots are resized to
+# this width (height follows the original's aspect ratio).
+WORK_WIDTH = int(os.getenv("VERIFY_WORK_WIDTH", "512"))
+TILE_GRID = (8, 8)  # rows, cols of the tile diff map
+REGION_GRID = (24, 24)  # finer grid used to locate differing regions
+REGION_THRESHOLD = float(os.getenv("VERIFY_REGION_THRESHOLD", "0.05"))
+MAX_REGIONS = int(os.getenv("VERIFY_MAX_REGIONS", "6"))
+
+# Verdict thresholds. Anything between a clear pass and a clear fail is
+# "uncertain" and goes to the model.
+PASS_SSIM = float(os.getenv("VERIFY_PASS_SSIM", "0.97"))
+PASS_PHASH = int(os.getenv("VERIFY_PASS_PHASH", "4"))
+FAIL_SSIM = float(os.getenv("VERIFY_FAIL_SSIM", "0.35"))
+FAIL_HISTOGRAM = float(os.getenv("VERIFY_FAIL_HISTOGRAM", "0.6"))
+
+_SSIM_C1 = (0.01 * 255) ** 2
+_SSIM_C2 = (0.03 * 255) ** 2
+
+
+def _to_arrays(original: Image.Image, generated: Image.Image, width: int = WORK_WIDTH):
+    """Resizes both images to a shared working size; returns (rgb_a, rgb_b) as float32 arrays."""
+    w, h = original.size
+    size = (min(width, w), max(1, round(h * min(width, w) / w)))
+    a = np.asarray(original.convert("RGB").resize(size, Image.BILINEAR), dtype=np.float32)
+    b = np.asarray(generated.convert("RGB").resize(size, Image.BILINEAR), dtype=np.float32)
+    return a, b
+
+
+def _gray(rgb):
+    return rgb @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+
+def _box_mean(img, radius: int = 3):
+    """Mean over a (2r+1)^2 window via summed-area tables, edge-padded."""
+    k = 2 * radius + 1
+    padded = np.pad(img, radius, mode="edge")
+    sat = np.cumsum(np.cumsum(padded, axis=0, dtype=np.float64), axis=1)
+    sat = np.pad(sat, ((1, 0), (1, 0)))
+    total = sat[k:, k:] - sat[:-k, k:] - sat[k:, :-k] + sat[:-k, :-k]
+    return (total / (k * k)).astype(np.float32)
+
+
+def ssim_map(x, y, radius: int = 3):
+    """Per-pixel SSIM of two grayscale images (7x7 uniform window)."""
+    mu_x = _box_mean(x, radius)
+    mu_y = _box_mean(y, radius)
+    var_x = _box_mean(x * x, radius) - mu_x * mu_x
+    var_y = _box_mean(y * y, radius) - mu_y * mu_y
+    cov = _box_mean(x * y, radius) - mu_x * mu_y
+    num = (2 * mu_x * mu_y + _SSIM_C1) * (2 * cov + _SSIM_C2)
+    den = (mu_x ** 2 + mu_y ** 2 + _SSIM_C1) * (var_x + var_y + _SSIM_C2)
+    return num / den
+
+
+def _dct_matrix(n: int):
+    k = np.arange(n)
+    m = np.cos(np.pi * (2 * k[None, :] + 1) * k[:, None] / (2 * n)) * np.sqrt(2.0 / n)
+    m[0] /= np.sqrt(2.0)
+    return m.astype(np.float32)
+
+
+_DCT32 = _dct_matrix(32)
+
+
+def phash(image: Image.Image) -> np.ndarray:
+    """64-bit perceptual hash (DCT of a 32x32 grayscale thumbnail)."""
+    px = np.asarray(image.convert("L").resize((32, 32), Image.BILINEAR), dtype=np.float32)
+    coeffs = (_DCT32 @ px @ _DCT32.T)[:8, :8].flatten()[1:]
+    return coeffs > np.median(coeffs)
+
+
+def dhash(image: Image.Image) -> np.ndarray:
+    """64-bit difference hash (horizontal gradients of a 9x8 thumbnail)."""
+    px = np.asarray(image.convert("L").resize((9, 8), Image.BILINEAR), dtype=np.int16)
+    return (px[:, 1:] > px[:, :-1]).flatten()
+
+
+def histogram_distance(a, b, bins: int = 8) -> float:
+    """1 - intersection of joint RGB histograms (0 = same colour distribution, 1 = disjoint)."""
+    def hist(rgb):
+        q = (rgb.reshape(-1, 3) * (bins / 256.0)).astype(np.int32).clip(0, bins - 1)
+        idx = q[:, 0] * bins * bins + q[:, 1] * bins + q[:, 2]
+        h = np.bincount(idx, minlength=bins ** 3).astype(np.float32)
+        return h / h.sum()
+    return float(1.0 - np.minimum(hist(a), hist(b)).sum())
+
+
+def _tile_means(values, grid):
+    """Mean of a 2-D array over a rows x cols grid of tiles."""
+    rows, cols = grid
+    h, w = values.shape
+    rows, cols = min(rows, h), min(cols, w)
+    ys = np.linspace(0, h, rows + 1).astype(int)
+    xs = np.linspace(0, w, cols + 1).astype(int)
+    # Row/column sums via reduceat give every tile mean in two vectorized passes
+    sums = np.add.reduceat(np.add.reduceat(values, ys[:-1], axis=0), xs[:-1], axis=1)
+    areas = np.outer(np.diff(ys), np.diff(xs)).clip(min=1)
+    return sums / areas
+
+
+def tile_diff(a, b, grid=TILE_GRID):
+    """Mean absolute RGB difference per tile, scaled to 0..1. Returns a rows x cols array."""
+    return _tile_means(np.abs(a - b).mean(axis=2) / 255.0, grid)
+
+
+def _components(mask):
+    """4-connected components of a small boolean tile mask -> list of (tile_coords)."""
+    seen = np.zeros_like(mask, dtype=bool)
+    rows, cols = mask.shape
+    components = []
+    for r, c in zip(*np.nonzero(mask)):
+        if seen[r, c]:
+            continue
+        stack, cells = [(r, c)], []
+        seen[r, c] = True
+        while stack:
+            y, x = stack.pop()
+            cells.append((y, x))
+            for ny, nx in ((y - 1, x), (y + 1, x), (y, x - 1), (y, x + 1)):
+                if 0 <= ny < rows and 0 <= nx < cols and mask[ny, nx] and not seen[ny, nx]:
+                    seen[ny, nx] = True
+                    stack.append((ny, nx))
+        components.append(cells)
+    return components
+
+
+def find_diff_regions(original: Image.Image, generated: Image.Image, grid=REGION_GRID,
+                      threshold: float = REGION_THRESHOLD, max_regions: int = MAX_REGIONS):
+    """
+    Locates the areas where the screenshots differ.
+
+    Each tile is scored by the larger of its pixel difference and its structural
+    difference ((1 - SSIM) / 2). Tiles above `threshold` are grouped into
+    connected regions. Returns up to `max_regions` regions, worst first, with
+    boxes in the original image's pixel coordinates.
+    """
+    a, b = _to_arrays(original, generated)
+    pixel = _tile_means(np.abs(a - b).mean(axis=2) / 255.0, grid)
+    structure = _tile_means((1.0 - ssim_map(_gray(a), _gray(b))) / 2.0, grid)
+    scores = np.maximum(pixel, structure)
+    mask = scores > threshold
+
+    rows, cols = scores.shape
+    w, h = original.size
+    tile_w, tile_h = w / cols, h / rows
+
+    regions = []
+    for cells in _components(mask):
+        ys = [y for y, _ in cells]
+        xs = [x for _, x in cells]
+        box = [
+            int(min(xs) * tile_w), int(min(ys) * tile_h),
+            int(min(w, (max(xs) + 1) * tile_w)), int(min(h, (max(ys) + 1) * tile_h)),
+        ]
+        severity = float(np.mean([scores[y, x] for y, x in cells]))
+        regions.append({"box": box, "diff": round(severity, 4), "tiles": len(cells)})
+
+    # Rank by how much differs (area x intensity); the rest are folded into the last region
+    regions.sort(key=lambda r: r["diff"] * r["tiles"], reverse=True)
+    if len(regions) > max_regions:
+        rest = regions[max_regions - 1:]
+        regions = regions[:max_regions - 1] + [{
+            "box": [min(r["box"][0] for r in rest), min(r["box"][1] for r in rest),
+                    max(r["box"][2] for r in rest), max(r["box"][3] for r in rest)],
+            "diff": round(float(np.mean([r["diff"] for r in rest])), 4),
+            "tiles": sum(r["tiles"] for r in rest),
+        }]
+
+    for i, region in enumerate(regions):
+        region["id"] = f"R{i + 1}"
+    return regions
+
+
+def compare_local(original: Image.Image, generated: Image.Image) -> dict:
+    """
+    Fast perceptual comparison: SSIM, pHash/dHash distances, colour-histogram
+    distance and a tile-level diff map, plus a pass/fail/uncertain verdict.
+    """
+    a, b = _to_arrays(original, generated)
+    identical = original.size == generated.size and np.array_equal(
+        np.asarray(original.convert("RGB")), np.asarray(generated.convert("RGB"))
+    )
+
+    ssim = float(np.clip(ssim_map(_gray(a), _gray(b)).mean(), -1.0, 1.0))
+    phash_distance = int(np.count_nonzero(phash(original) != phash(generated)))
+    dhash_distance = int(np.count_nonzero(dhash(original) != dhash(generated)))
+    hist_distance = histogram_distance(a, b)
+    tiles = tile_diff(a, b)
+
+    score = 100 * (
+        0.6 * max(ssim, 0.0)
+        + 0.2 * (1 - phash_distance / 63)
+        + 0.2 * (1 - hist_distance)
+    )
+
+    if identical or (ssim >= PASS_SSIM and phash_distance <= PASS_PHASH):
+        verdict = "pass"
+    elif ssim <= FAIL_SSIM and hist_distance >= FAIL_HISTOGRAM:
+        verdict = "fail"
+    else:
+        verdict = "uncertain"
+
+    return {
+        "similarity_score": 100 if identical else int(round(score)),
+        "verdict": verdict,
+        "pixel_identical": bool(identical),
+        "ssim": round(ssim, 4),
+        "phash_distance": phash_distance,
+        "dhash_distance": dhash_distance,
+        "histogram_distance": round(hist_distance, 4),
+        "tile_diff": np.round(tiles, 4).tolist(),
+    }
+
+
+def local_verdict_report(local: dict) -> dict:
+    """Builds a compare_images_gemini-shaped result from a local comparison alone."""
+    if local["verdict"] == "pass":
+        similar = ["Layout, colours and structure match the reference"]
+        dissimilar = []
+    else:
+        similar = []
+        dissimilar = [
+            f"Screenshots are structurally different (SSIM {local['ssim']}, "
+            f"colour histogram distance {local['histogram_distance']})"
+        ]
+    return {
+        "similarity_score": local["similarity_score"],
+        "similar_features": similar,
+        "dissimilar_features": dissimilar,
+    }
@@ -0,0 +1,298 @@
+import ast
+import asyncio
+import atexit
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+# Persistent per-project test workspaces. TEST_WORKSPACE_TMPFS=1 puts them on
+# /dev/shm (when available) so rewrites and imports never touch the disk.
+TEST_WORKSPACE_TMPFS = os.getenv("TEST_WORKSPACE_TMPFS", "0") == "1"
+TEST_WORKSPACE_DIR = os.getenv("TEST_WORKSPACE_DIR") or os.path.join(
+    "/dev/shm" if TEST_WORKSPACE_TMPFS and os.path.isdir("/dev/shm") else tempfile.gettempdir(),
+    "jivs-workspaces",
+)
+TEST_WORKSPACES = int(os.getenv("TEST_WORKSPACES", "32"))
+TEST_WORKSPACE_TTL = float(os.getenv("TEST_WORKSPACE_TTL", str(6 * 3600)))
+
+# Files that change how pytest collects or configures every test
+GLOBAL_TEST_FILES = {"conftest.py", "pytest.ini", "tox.ini", "setup.cfg", "pyproject.toml"}
+
+
+def file_digest(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def tree_hash(files: dict, *extra) -> str:
+    """Hash of every (path, content) pair plus `extra` values, independent of dict order."""
+    h = hashlib.sha256()
+    for value in extra:
+        h.update(str(value).encode("utf-8") + b"\0")
+    for path in sorted(files):
+        h.update(path.encode("utf-8") + b"\0" + file_digest(files[path]).encode() + b"\0")
+    return h.hexdigest()
+
+
+def is_test_file(path: str) -> bool:
+    name = os.path.basename(path)
+    return name.endswith(".py") and (name.startswith("test_") or name.endswith("_test.py"))
+
+
+def safe_path(root: str, relative: str) -> str:
+    """Absolute path of `relative` under root. Raises ValueError for paths that escape it."""
+    base = os.path.realpath(root)
+    path = os.path.realpath(os.path.join(base, relative))
+    if not path.startswith(base + os.sep):
+        raise ValueError(f"Invalid file path: {relative}")
+    return path
+
+
+# --- IMPORT GRAPH ---
+
+def _module_name(path: str) -> str:
+    parts = path[:-3].replace("\\", "/").split("/")
+    if parts[-1] == "__init__":
+        parts = parts[:-1]
+    return ".".join(p for p in parts if p)
+
+
+def python_imports(path: str, source: str):
+    """Module names imported by a Python file (relative imports resolved). None if it does not parse."""
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return None
+    package = _module_name(path).split(".")
+    if not path.endswith("__init__.py"):
+        package = package[:-1]
+
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            if node.level:
+                base = package[:len(package) - node.level + 1] if node.level > 1 else package
+                module = ".".join(base + ([node.module] if node.module else []))
+            else:
+                module = node.module or ""
+            if module:
+                names.add(module)
+            names.update(f"{module}.{alias.name}" if module else alias.name for alias in node.names)
+    return names
+
+
+def import_graph(files: dict) -> dict:
+    """
+    Maps each Python file to the project files it imports (direct edges only).
+    A file that fails to parse maps to None.
+    """
+    modules = {}
+    for path in files:
+        if path.endswith(".py"):
+            name = _module_name(path)
+            modules[name] = path
+            # Tests and scripts are usually imported by their basename (rootdir on sys.path)
+            modules.setdefault(name.rsplit(".", 1)[-1], path)
+
+    graph = {}
+    for path, source in files.items():
+        if not path.endswith(".py"):
+            continue
+        imported = python_imports(path, source)
+        if imported is None:
+            graph[path] = None
+            continue
+        deps = set()
+        for name in imported:
+            parts = name.split(".")
+            for i in range(len(parts), 0, -1):  # a.b.c also depends on a.b and a (__init__)
+                target = modules.get(".".join(parts[:i]))
+                if target and target != path:
+                    deps.add(target)
+        graph[path] = deps
+    return graph
+
+
+def affected_tests(files: dict, changed: set, removed: set = frozenset()):
+    """
+    Test files whose result may differ after `changed`/`removed` paths.
+    Returns None when every test must run (pytest config or conftest changed).
+    """
+    touched = set(changed) | set(removed)
+    if any(os.path.basename(p) in GLOBAL_TEST_FILES for p in touched):
+        return None
+
+    graph = import_graph(files)
+    stems = {os.path.splitext(os.path.basename(p))[0] for p in touched if not p.endswith(".py")}
+
+    def reaches_change(path, seen):
+        if path in touched:
+            return True
+        deps = graph.get(path)
+        if deps is None:
+            return True  # unparseable: assume affected
+        for dep in deps - seen:
+            seen.add(dep)
+            if reaches_change(dep, seen):
+                return True
+        return False
+
+    selected = set()
+    for path, source in files.items():
+        if not is_test_file(path):
+            continue
+        # Non-Python files (components, fixtures) are only linked to tests that mention them by name
+        if reaches_change(path, {path}) or any(stem and stem in source for stem in stems):
+            selected.add(path)
+    return selected
+
+
+# --- WORKSPACES ---
+
+class Workspace:
+    __slots__ = ("key", "path", "manifest", "lock", "last_result", "used_at")
+
+    def __init__(self, key, path):
+        self.key = key
+        self.path = path
+        self.manifest = {}  # relative path -> content digest
+        self.lock = asyncio.Lock()  # one sync/run at a time per project
+        self.last_result = None  # formatted report of the previous run, per-test outcomes included
+        self.used_at = time.time()
+
+    def sync(self, files: dict):
+        """
+        Makes the directory match `files`, rewriting only what changed.
+        Returns (changed, removed) sets of relative paths.
+        """
+        changed, removed = set(), set()
+        for relative, content in files.items():
+            digest = file_digest(content)
+            if self.manifest.get(relative) == digest:
+                continue
+            path = safe_path(self.path, relative)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(content)
+            self.manifest[relative] = digest
+            changed.add(relative)
+
+        for relative in set(self.manifest) - set(files):
+            try:
+                os.remove(safe_path(self.path, relative))
+            except (OSError, ValueError):
+                pass
+            del self.manifest[relative]
+            removed.add(relative)
+        return changed, removed
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True  # exists but belongs to someone else (or cannot tell)
+    return True
+
+
+def remove_stale_roots(base: str, ttl: float, keep: str = None):
+    """
+    Deletes process directories under `base` left behind by processes that are
+    gone and that have not been touched for `ttl` seconds. Directories of live
+    processes (other API or job workers sharing `base`) are never touched.
+    """
+    try:
+        names = os.listdir(base)
+    except OSError:
+        return
+    now = time.time()
+    for name in names:
+        path = os.path.join(base, name)
+        if path == keep or not os.path.isdir(path) or os.path.islink(path):
+            continue
+        pid = name.split("-", 1)[0]
+        if pid.isdigit() and _process_alive(int(pid)):
+            continue
+        try:
+            if now - os.path.getmtime(path) < ttl:
+                continue
+        except OSError:
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+
+
+class WorkspaceManager:
+    """
+    LRU of per-project workspaces; evicted ones are deleted. Each process keeps
+    its workspaces in its own directory under TEST_WORKSPACE_DIR (manifests are
+    in memory), so several API or job worker processes can share the base
+    directory without touching each other's files.
+    """
+
+    def __init__(self, root: str = TEST_WORKSPACE_DIR, max_workspaces: int = TEST_WORKSPACES,
+                 ttl: float = TEST_WORKSPACE_TTL):
+        self.base = root
+        self.root = os.path.join(root, f"{os.getpid()}-{uuid.uuid4().hex[:8]}")
+        self.max_workspaces = max_workspaces
+        self.ttl = ttl
+        self._workspaces = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+        remove_stale_roots(root, ttl, keep=self.root)
+        atexit.register(shutil.rmtree, self.root, True)
+
+    def get(self, project_id: str) -> Workspace:
+        key = hashlib.sha256(project_id.encode("utf-8")).hexdigest()[:24]
+        expired = []
+        with self._lock:
+            now = time.time()
+            for other in list(self._workspaces.values()):
+                if now - other.used_at > self.ttl and not other.lock.locked():
+                    expired.append(self._workspaces.pop(other.key))
+            workspace = self._workspaces.get(key)
+            if workspace is None:
+                workspace = Workspace(key, os.path.join(self.root, key))
+                os.makedirs(workspace.path, exist_ok=True)
+                self._workspaces[key] = workspace
+            self._workspaces.move_to_end(key)
+            workspace.used_at = now
+            while len(self._workspaces) > self.max_workspaces:
+                oldest = next(iter(self._workspaces.values()))
+                if oldest.lock.locked() or oldest is workspace:
+                    break
+                expired.append(self._workspaces.pop(oldest.key))
+        for old in expired:
+            shutil.rmtree(old.path, ignore_errors=True)
+        return workspace
+
+    def __len__(self):
+        return len(self._workspaces)
+
+
+def merge_results(previous: dict, fresh: dict, ran_files: set, current_tests: set) -> dict:
+    """
+    Combines a partial run with the previous full report: tests from `ran_files`
+    come from `fresh`, tests from other still-present test files keep their old
+    outcome. The summary is recomputed.
+    """
+    def test_file(name):
+        return (name or "").split("::", 1)[0]
+
+    tests = [t for t in previous["tests"]
+             if test_file(t["name"]) in current_tests and test_file(t["name"]) not in ran_files]
+    tests += fresh["tests"]
+    tests.sort(key=lambda t: t["name"] or "")
+
+    summary = {}
+    for test in tests:
+        summary[test["outcome"]] = summary.get(test["outcome"], 0) + 1
+    summary["total"] = len(tests)
+    return {**fresh, "summary": summary, "tests": tests}
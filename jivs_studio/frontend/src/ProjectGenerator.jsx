@@ -1,6 +1,7 @@
 import { useState } from 'react';
 import axios from 'axios';
 import JSZip from 'jszip'; // <--- NEW IMPORT
+import { readEventStream } from './sse';
 import { 
   Upload, Folder, FileCode, Play, Terminal, 
   CheckCircle, XCircle, RefreshCw, Box, Download // <--- Added Download Icon
@@ -11,10 +12,13 @@ export default function ProjectGenerator() {
   const [file, setFile] = useState(null);
   const [prompt, setPrompt] = useState("");
   const [framework, setFramework] = useState("React");
+  const [mode, setMode] = useState("single"); // "parallel" plans first, then writes files concurrently
   
   // Output State
   const [generatedFiles, setGeneratedFiles] = useState(null); 
   const [selectedFileName, setSelectedFileName] = useState(null);
+  const [projectId, setProjectId] = useState(null); // keys the backend test workspace
+  const [exportable, setExportable] = useState(false); // projectId came from the server, which keeps a copy for export
   
   // Test State
   const [testReport, setTestReport] = useState(null);
@@ -37,19 +41,36 @@ export default function ProjectGenerator() {
     setGenerating(true);
     setGeneratedFiles(null);
     setTestReport(null);
+    setExportable(false);
 
     try {
       let imageBase64 = null;
       if (file) imageBase64 = await convertToBase64(file);
 
-      const res = await axios.post('http://localhost:8000/generate-project', {
-        framework, description: prompt, image_data: imageBase64
+      // Files arrive one by one while the model is still writing the rest
+      const res = await fetch('http://localhost:8000/generate-project/stream', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ framework, description: prompt, image_data: imageBase64, mode })
       });
-      
-      setGeneratedFiles(res.data.files);
-      if (res.data.files && Object.keys(res.data.files).length > 0) {
-          setSelectedFileName(Object.keys(res.data.files)[0]);
-      }
+
+      let first = true;
+      let serverProjectId = null;
+      await readEventStream(res, (event, data) => {
+        if (event === "file") {
+          setGeneratedFiles(prev => ({ ...(prev || {}), [data.path]: data.content }));
+          if (first) {
+            setSelectedFileName(data.path);
+            first = false;
+          }
+        } else if (event === "done") {
+          serverProjectId = data.project_id;
+        } else if (event === "error") {
+          throw new Error(data.detail);
+        }
+      });
+      setProjectId(serverProjectId || crypto.randomUUID());
+      setExportable(Boolean(serverProjectId));
     } catch (err) {
       console.error(err);
       alert("Error: " + (err.response?.data?.detail || err.message));
@@ -65,7 +86,7 @@ export default function ProjectGenerator() {
 
     try {
       const res = await axios.post('http://localhost:8000/run-tests', {
-        code_files: generatedFiles, framework
+        code_files: generatedFiles, framework, project_id: projectId
       });
       setTestReport(res.data);
     } catch (err) {
@@ -80,6 +101,15 @@ export default function ProjectGenerator() {
   const handleDownloadZip = async () => {
     if (!generatedFiles) return;
 
+    // The backend streams the archive from its stored copy of the project
+    if (exportable) {
+      const link = document.createElement("a");
+      link.href = `http://localhost:8000/projects/${projectId}/export?format=zip`;
+      link.click();
+      return;
+    }
+
+    // Fallback (no server copy): build the ZIP in the browser
     const zip = new JSZip();
 
     // Loop through generated files and add to zip
@@ -123,6 +153,16 @@ export default function ProjectGenerator() {
                 <option value="Angular">Angular</option>
               </select>
 
+              {/* Generation Mode */}
+              <select 
+                value={mode} 
+                onChange={(e) => setMode(e.target.value)}
+                className="bg-gray-50 border border-gray-200 text-gray-700 text-sm rounded-lg px-3 py-2 outline-none focus:ring-2 focus:ring-indigo-500"
+              >
+                <option value="single">Single pass</option>
+                <option value="parallel">Plan + parallel files</option>
+              </select>
+
               {/* Prompt Input */}
               <input 
                 type="text" 
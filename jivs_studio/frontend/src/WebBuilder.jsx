@@ -1,6 +1,6 @@
 import { useState, useRef } from 'react';
-import axios from 'axios';
 import * as htmlToImage from 'html-to-image';
+import { readEventStream } from './sse';
 import { Upload, Code, Download, RefreshCw, Smartphone, Monitor, ArrowLeft } from 'lucide-react';
 
 export default function WebBuilder() {
@@ -10,9 +10,48 @@ export default function WebBuilder() {
   const [htmlCode, setHtmlCode] = useState("");
   const [loading, setLoading] = useState(false);
   const [device, setDevice] = useState("desktop"); // 'desktop' or 'mobile'
+  const [doc, setDoc] = useState(null); // { doc_id, version } of the server-side document
   
   const iframeRef = useRef(null);
 
+  // Shows the document's current head, e.g. after our edit lost a version conflict.
+  const loadHead = async (docId) => {
+    const history = await fetch(`http://localhost:8000/sessions/${docId}`);
+    if (!history.ok) return;
+    const { head } = await history.json();
+    const res = await fetch(`http://localhost:8000/sessions/${docId}/versions/${head}`);
+    const data = await res.json();
+    if (!res.ok) return;
+    setHtmlCode(data.html);
+    setDoc({ doc_id: data.doc_id, version: data.version });
+  };
+
+  // --- STREAMING HELPER ---
+  // Appends streamed chunks to the preview so the page renders progressively.
+  const streamHtml = async (url, options) => {
+    let html = "";
+    let conflict = null;
+    const res = await fetch(url, { method: 'POST', ...options });
+    await readEventStream(res, (event, data) => {
+      if (event === "chunk") {
+        html += data.html;
+        setHtmlCode(html);
+        setStep(2);
+      } else if (event === "done") {
+        // A conflict means the page was not saved; keep the last valid version instead of a null one
+        if (data.conflict) conflict = data;
+        else if (data.doc_id && data.version) setDoc({ doc_id: data.doc_id, version: data.version });
+      } else if (event === "error") {
+        throw new Error(data.detail);
+      }
+    });
+    if (conflict) {
+      await loadHead(conflict.doc_id);
+      throw new Error(`${conflict.conflict}. The latest saved version is shown; apply your change again.`);
+    }
+    return html;
+  };
+
   // --- API CALLS ---
   const handleGenerate = async () => {
     if (!prompt) return alert("Please enter a description");
@@ -23,15 +62,12 @@ export default function WebBuilder() {
     files.forEach(f => formData.append('files', f));
 
     try {
-      const res = await axios.post('http://localhost:8000/generate-code', formData, {
-        headers: { 'Content-Type': 'multipart/form-data' }
-      });
-      setHtmlCode(res.data.html);
+      await streamHtml('http://localhost:8000/generate-code/stream', { body: formData });
       setStep(2);
       setPrompt(""); // Clear prompt for next step
     } catch (err) {
       console.error(err);
-      alert("Error: " + (err.response?.data?.detail || err.message));
+      alert("Error: " + err.message);
     } finally {
       setLoading(false);
     }
@@ -42,15 +78,35 @@ export default function WebBuilder() {
     
     setLoading(true);
     try {
-      const res = await axios.post('http://localhost:8000/refine-code', {
-        current_html: htmlCode,
-        instructions: prompt
+      await streamHtml('http://localhost:8000/refine-code/stream', {
+        headers: { 'Content-Type': 'application/json' },
+        // Only the document reference is sent; the server holds the current HTML
+        body: JSON.stringify(doc
+          ? { doc_id: doc.doc_id, base_version: doc.version, instructions: prompt }
+          : { current_html: htmlCode, instructions: prompt })
       });
-      setHtmlCode(res.data.html);
       setPrompt(""); // Clear prompt after success
     } catch (err) {
       console.error(err);
-      alert("Refine Error: " + (err.response?.data?.detail || err.message));
+      alert("Refine Error: " + err.message);
+    } finally {
+      setLoading(false);
+    }
+  };
+
+  // Moves the document head back or forward without calling the model.
+  const handleHistory = async (direction) => {
+    if (!doc) return;
+    setLoading(true);
+    try {
+      const res = await fetch(`http://localhost:8000/sessions/${doc.doc_id}/${direction}`, { method: 'POST' });
+      const data = await res.json();
+      if (!res.ok) throw new Error(data.detail || res.statusText);
+      setHtmlCode(data.html);
+      setDoc({ doc_id: data.doc_id, version: data.version });
+    } catch (err) {
+      console.error(err);
+      alert("History Error: " + err.message);
     } finally {
       setLoading(false);
     }
@@ -209,6 +265,17 @@ export default function WebBuilder() {
                 {loading ? <RefreshCw className="animate-spin w-5 h-5" /> : "✨ Update Code"}
             </button>
 
+            {doc && (
+                <div className="flex gap-2 mb-4">
+                    <button onClick={() => handleHistory('undo')} disabled={loading || doc.version <= 1} className="flex-1 py-2 bg-gray-100 hover:bg-gray-200 text-gray-700 text-xs font-bold rounded-lg disabled:opacity-50">
+                        ↶ Undo
+                    </button>
+                    <button onClick={() => handleHistory('redo')} disabled={loading} className="flex-1 py-2 bg-gray-100 hover:bg-gray-200 text-gray-700 text-xs font-bold rounded-lg disabled:opacity-50">
+                        ↷ Redo
+                    </button>
+                </div>
+            )}
+
             <div className="border-t pt-6 mt-auto">
                 <div className="bg-blue-50 p-4 rounded-xl border border-blue-100">
                     <p className="text-xs text-blue-800 font-semibold mb-2">💡 Pro Tip:</p>
@@ -7,9 +7,12 @@ import base64
 import webbrowser
 from html2image import Html2Image
 import io
+import zipfile
 
-from datetime import datetime
-from generate_code import (generate_standard_code)
+from datetime import datetime, timedelta, timezone
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from generate_code import (generate_standard_code, inject_design_tools, strip_design_tools)
 
 
     # 6. Inject 'Download as Image' Script
@@ -105,6 +108,24 @@ class AssetManager:
         self._save_ledger(ledger)
         return save_path
 
+    def export_archive(self):
+        """
+        Zips every artifact (uploads, generated code, ledger) into exports/assets.zip.
+        zipfile.write() copies each file from disk in chunks, so nothing is loaded whole.
+        """
+        export_dir = os.path.join(self.root_dir, "exports")
+        os.makedirs(export_dir, exist_ok=True)
+        archive_path = os.path.join(export_dir, "assets.zip")
+        with zipfile.ZipFile(archive_path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            for directory, _, names in os.walk(self.root_dir):
+                if os.path.abspath(directory).startswith(os.path.abspath(export_dir)):
+                    continue
+                for name in sorted(names):
+                    path = os.path.join(directory, name)
+                    if os.path.isfile(path) and not os.path.islink(path):
+                        archive.write(path, os.path.relpath(path, self.root_dir))
+        return archive_path
+
 manager = AssetManager()
 MEMORY_FILE = "memory.json"
 
@@ -136,9 +157,17 @@ def open_local_file(file_path):
     webbrowser.open(f'file://{abs_path}')
 
 # --- 4. MODEL FINDER ---
-def get_model():
+MODEL_DISCOVERY_TTL = 3600  # seconds
+
+@st.cache_data(ttl=MODEL_DISCOVERY_TTL, show_spinner=False)
+def discover_models(api_key):
+    """Lists generateContent-capable models once per key and TTL instead of on every call."""
+    genai.configure(api_key=api_key)
+    return [m.name for m in genai.list_models() if 'generateContent' in m.supported_generation_methods]
+
+def get_model(api_key):
     try:
-        models = [m.name for m in genai.list_models() if 'generateContent' in m.supported_generation_methods]
+        models = discover_models(api_key)
         if "models/gemini-1.5-pro-latest" in models: return "models/gemini-1.5-pro-latest"
         for m in models: 
             if "gemini-1.5-pro" in m: return m
@@ -148,6 +177,20 @@ def get_model():
     except:
         return "models/gemini-1.5-flash"
 
+@st.cache_resource(show_spinner=False)
+def get_model_client(api_key, model_name=None):
+    """Shared, configured GenerativeModel per (key, model) for the lifetime of the server."""
+    genai.configure(api_key=api_key)
+    return genai.GenerativeModel(model_name or get_model(api_key))
+
+def warmup_models(api_key):
+    """Primes discovery and the model handle so the first generate skips that setup."""
+    genai.configure(api_key=api_key)  # local only; keeps the SDK on the active key
+    try:
+        get_model_client(api_key)
+    except Exception as e:
+        print(f"Model warmup failed: {e}")
+
 # --- 5. AI LOGIC (STANDARD + REDESIGN) ---
 
 # def extract_unified_style(files, api_key):
@@ -159,46 +202,49 @@ def get_model():
 #     response = model.generate_content([prompt] + imgs)
 #     return response.text.replace("```json", "").replace("```", "")
 
-import tempfile  # <--- Add this to imports
+# Re-upload a cached Gemini file this long before it expires (files live ~48h)
+UPLOAD_REFRESH_MARGIN = timedelta(hours=1)
+UPLOAD_WORKERS = 4
+
+@st.cache_resource(show_spinner=False)
+def _gemini_file_cache():
+    """Process-wide map of (api key, content hash) -> uploaded Gemini File handle."""
+    return {}
+
+def _is_fresh(g_file):
+    expiration = getattr(g_file, "expiration_time", None)
+    if expiration is None:
+        return True
+    return expiration - datetime.now(timezone.utc) > UPLOAD_REFRESH_MARGIN
 
 def upload_to_gemini(file_obj, api_key):
     """
-    Helper: Saves Streamlit UploadedFile to temp disk, 
-    uploads to Gemini File API, then cleans up.
+    Helper: uploads a Streamlit UploadedFile to the Gemini File API straight from memory.
+    Handles are cached by content hash and reused until shortly before they expire.
     """
-    genai.configure(api_key=api_key)
-    
-    # Create a temporary file because genai.upload_file requires a path
-    suffix = os.path.splitext(file_obj.name)[1]
-    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-        tmp.write(file_obj.getbuffer())
-        tmp_path = tmp.name
+    data = file_obj.getvalue()
+    key = (api_key, hashlib.sha256(data).hexdigest())
+    cache = _gemini_file_cache()
 
-    try:
-        print(f"Uploading {file_obj.name} to Gemini File API...")
-        g_file = genai.upload_file(path=tmp_path, mime_type=file_obj.type)
-        return g_file
-    finally:
-        # Clean up local temp file
-        if os.path.exists(tmp_path):
-            os.remove(tmp_path)
+    cached = cache.get(key)
+    if cached is not None and _is_fresh(cached):
+        return cached
+
+    print(f"Uploading {file_obj.name} to Gemini File API...")
+    g_file = genai.upload_file(path=io.BytesIO(data), mime_type=file_obj.type, display_name=file_obj.name)
+    cache[key] = g_file
+    return g_file
 
 def extract_unified_style(files, api_key):
     """
     Updated: Uploads files to Gemini API first, then extracts style.
     Returns: (style_json_string, list_of_gemini_file_objects)
     """
-    genai.configure(api_key=api_key)
-    model = genai.GenerativeModel(get_model())
-    
-    gemini_files = []
+    model = get_model_client(api_key)
     
-    # 1. Upload all assets to Gemini File API
-    for f in files:
-        # Reset pointer if it was read before
-        f.seek(0)
-        g_f = upload_to_gemini(f, api_key)
-        gemini_files.append(g_f)
+    # 1. Upload all assets to Gemini File API (cached by content, in parallel)
+    with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as pool:
+        gemini_files = list(pool.map(lambda f: upload_to_gemini(f, api_key), files))
     
     prompt = "Analyze these images as a Unified Design System. Extract technical rules (Colors, Fonts, Spacing, Radius). Output ONLY JSON."
     
@@ -213,8 +259,7 @@ def generate_redesign_code(target_file, style_file, instructions, api_key):
     Image 1 (Target): Source of TRUTH for Layout/Content.
     Image 2 (Style): Source of TRUTH for Visuals.
     """
-    genai.configure(api_key=api_key)
-    model = genai.GenerativeModel(get_model())
+    model = get_model_client(api_key)
     
     img_target = Image.open(target_file)
     img_style = Image.open(style_file)
@@ -252,20 +297,30 @@ def generate_redesign_code(target_file, style_file, instructions, api_key):
 
 
 def refine_existing_code(current_code, feedback, api_key):
-    genai.configure(api_key=api_key)
-    model = genai.GenerativeModel(get_model())
-    prompt = f"Expert Editor. Feedback: '{feedback}'. Code: {current_code}. Return ONLY updated HTML."
+    model = get_model_client(api_key)
+    # The Design Mode controls are not part of the page; keep them out of the prompt
+    prompt = f"Expert Editor. Feedback: '{feedback}'. Code: {strip_design_tools(current_code)}. Return ONLY updated HTML."
     response = model.generate_content(prompt)
-    return response.text.replace("```html", "").replace("```", "")
+    return inject_design_tools(response.text.replace("```html", "").replace("```", ""))
 
 # --- 6. MAIN UI ---
 st.sidebar.title("⚙️ Setup")
 google_key = st.sidebar.text_input("Google AI Key", type="password").strip()
+if google_key:
+    warmup_models(google_key)
 
 # --- MODE SELECTOR ---
 st.sidebar.divider()
 app_mode = st.sidebar.radio("Select Mode", ["🆕 Create New UI", "🎨 Redesign Existing UI"])
 
+# --- ASSET EXPORT ---
+st.sidebar.divider()
+if st.sidebar.button("📦 Prepare Asset Export"):
+    st.session_state['asset_export'] = manager.export_archive()
+if st.session_state.get('asset_export') and os.path.exists(st.session_state['asset_export']):
+    with open(st.session_state['asset_export'], "rb") as f:
+        st.sidebar.download_button("Download assets.zip", f, "jivs_assets.zip", "application/zip")
+
 st.title(f"🚀 JiVS Auto-Coder: {app_mode}")
 
 # ==========================================================
@@ -2,6 +2,7 @@ import google.generativeai as genai
 import os
 import json
 import base64
+import re
 MEMORY_FILE = "memory.json"
 def get_memory_string():
     if not os.path.exists(MEMORY_FILE): return ""
@@ -14,6 +15,146 @@ def image_to_base64(image_file):
     mime = "image/jpeg" if image_file.name.lower().endswith(('.jpg','.jpeg')) else "image/png"
     return f"data:{mime};base64,{encoded}"
 
+# --- DESIGN MODE CONTROLS ---
+# Wrapped in marker comments so the block can be found and replaced; the page is
+# rendered and downloaded standalone, so the script stays inline here.
+DESIGN_TOOLS_START = "<!-- jivs-design-tools -->"
+DESIGN_TOOLS_END = "<!-- /jivs-design-tools -->"
+DESIGN_TOOLS_SCRIPT = DESIGN_TOOLS_START + """
+    <script src="https://html2canvas.hertzen.com/dist/html2canvas.min.js"></script>
+    
+    <div id="ui-controls" style="position: fixed; top: 10px; right: 10px; z-index: 10000; display: flex; gap: 10px;">
+        <button id="toggle-design-btn" onclick="toggleDesignMode()" style="background: #444; color: #fff; padding: 10px 15px; border: none; border-radius: 6px; cursor: pointer; font-weight: bold; font-family: sans-serif; box-shadow: 0 2px 5px rgba(0,0,0,0.2);">
+            ✏️ Design Mode: OFF
+        </button>
+        <button onclick="downloadAsImage()" style="background: #2563EB; color: #fff; padding: 10px 15px; border: none; border-radius: 6px; cursor: pointer; font-weight: bold; font-family: sans-serif; box-shadow: 0 2px 5px rgba(0,0,0,0.2);">
+            📸 Download Image
+        </button>
+    </div>
+
+    <script>
+    // --- DESIGN MODE LOGIC ---
+    let isDesignMode = false;
+    let draggedEl = null;
+    let startX, startY, initialTx, initialTy;
+
+    function toggleDesignMode() {
+        isDesignMode = !isDesignMode;
+        const btn = document.getElementById('toggle-design-btn');
+        document.body.contentEditable = isDesignMode; // Allows text editing everywhere
+        
+        if (isDesignMode) {
+            btn.innerHTML = "✅ Finish Editing";
+            btn.style.background = "#059669"; // Green
+            document.body.style.cursor = "default";
+            enableDragging();
+        } else {
+            btn.innerHTML = "✏️ Design Mode: OFF";
+            btn.style.background = "#444";
+            disableDragging();
+        }
+    }
+
+    function enableDragging() {
+        document.addEventListener('mousedown', startDrag);
+        document.addEventListener('mousemove', drag);
+        document.addEventListener('mouseup', endDrag);
+    }
+
+    function disableDragging() {
+        document.removeEventListener('mousedown', startDrag);
+        document.removeEventListener('mousemove', drag);
+        document.removeEventListener('mouseup', endDrag);
+    }
+
+    function startDrag(e) {
+        // Don't drag if clicking buttons or inputs
+        if (e.target.tagName === 'BUTTON' || e.target.closest('#ui-controls')) return;
+        
+        draggedEl = e.target;
+        
+        // Prevent editing text while dragging
+        draggedEl.contentEditable = false; 
+        
+        startX = e.clientX;
+        startY = e.clientY;
+        
+        // Get current transform values (if any)
+        const style = window.getComputedStyle(draggedEl);
+        const matrix = new WebKitCSSMatrix(style.webkitTransform);
+        initialTx = matrix.m41;
+        initialTy = matrix.m42;
+        
+        draggedEl.style.transition = 'none'; // Disable transition for smooth drag
+        draggedEl.style.zIndex = 1000; // Bring to front
+    }
+
+    function drag(e) {
+        if (!draggedEl) return;
+        e.preventDefault();
+        const dx = e.clientX - startX;
+        const dy = e.clientY - startY;
+        draggedEl.style.transform = `translate(${initialTx + dx}px, ${initialTy + dy}px)`;
+    }
+
+    function endDrag(e) {
+        if (!draggedEl) return;
+        draggedEl.contentEditable = isDesignMode; // Re-enable text edit
+        draggedEl.style.zIndex = ''; // Reset Z
+        draggedEl = null;
+    }
+
+    // --- DOWNLOAD LOGIC ---
+    function downloadAsImage() {
+        // 1. Hide the controls so they don't appear in the image
+        const controls = document.getElementById('ui-controls');
+        controls.style.display = 'none';
+        
+        // 2. Temporarily turn off Design Mode borders/indicators if any
+        const wasDesignMode = isDesignMode;
+        if (isDesignMode) toggleDesignMode(); 
+
+        const element = document.body;
+
+        html2canvas(element, {
+            useCORS: true,
+            allowTaint: true,
+            backgroundColor: null, // Transparent background support
+            scrollY: -window.scrollY // Fix scroll issues
+        }).then(canvas => {
+            const link = document.createElement('a');
+            link.download = 'marketing_asset_' + new Date().getTime() + '.png';
+            link.href = canvas.toDataURL();
+            link.click();
+            
+            // 3. Restore UI state
+            controls.style.display = 'flex';
+            if (wasDesignMode) toggleDesignMode();
+        });
+    }
+    </script>
+    """ + DESIGN_TOOLS_END
+
+_TOOLS_PATTERNS = [
+    re.compile(re.escape(DESIGN_TOOLS_START) + ".*?" + re.escape(DESIGN_TOOLS_END), re.S),
+    # Pages generated before the markers were added
+    re.compile(r'\s*<script src="https://html2canvas\.hertzen\.com/dist/html2canvas\.min\.js"></script>', re.I),
+    re.compile(r'\s*<div id="ui-controls".*?</button>\s*</div>', re.S | re.I),
+    re.compile(r"\s*<script>\s*// --- DESIGN MODE LOGIC ---.*?</script>", re.S | re.I),
+]
+
+def strip_design_tools(html):
+    for pattern in _TOOLS_PATTERNS:
+        html = pattern.sub("", html)
+    return html
+
+def inject_design_tools(raw_html):
+    """Appends the Design Mode controls once; earlier copies are removed first."""
+    html = strip_design_tools(raw_html)
+    if "</body>" in html:
+        return html.replace("</body>", f"{DESIGN_TOOLS_SCRIPT}</body>", 1)
+    return html + DESIGN_TOOLS_SCRIPT
+
 # def generate_standard_code(prompt, style_json, contexts, logo_file, image_refs, api_key):
 #     """
 #     Generates HTML that strictly clones the reference layout while applying
@@ -154,129 +295,7 @@ def generate_standard_code(prompt, style_json, contexts, logo_file, image_refs,
         raw_html = raw_html.replace("LOGO_TOKEN", "https://via.placeholder.com/150x50?text=Logo")
 
     # 6. Inject 'Design Mode' & 'Download' Scripts
-    # We group controls in a div that we can hide during the screenshot
-    controls_script = """
-    <script src="https://html2canvas.hertzen.com/dist/html2canvas.min.js"></script>
-    
-    <div id="ui-controls" style="position: fixed; top: 10px; right: 10px; z-index: 10000; display: flex; gap: 10px;">
-        <button id="toggle-design-btn" onclick="toggleDesignMode()" style="background: #444; color: #fff; padding: 10px 15px; border: none; border-radius: 6px; cursor: pointer; font-weight: bold; font-family: sans-serif; box-shadow: 0 2px 5px rgba(0,0,0,0.2);">
-            ✏️ Design Mode: OFF
-        </button>
-        <button onclick="downloadAsImage()" style="background: #2563EB; color: #fff; padding: 10px 15px; border: none; border-radius: 6px; cursor: pointer; font-weight: bold; font-family: sans-serif; box-shadow: 0 2px 5px rgba(0,0,0,0.2);">
-            📸 Download Image
-        </button>
-    </div>
-
-    <script>
-    // --- DESIGN MODE LOGIC ---
-    let isDesignMode = false;
-    let draggedEl = null;
-    let startX, startY, initialTx, initialTy;
-
-    function toggleDesignMode() {
-        isDesignMode = !isDesignMode;
-        const btn = document.getElementById('toggle-design-btn');
-        document.body.contentEditable = isDesignMode; // Allows text editing everywhere
-        
-        if (isDesignMode) {
-            btn.innerHTML = "✅ Finish Editing";
-            btn.style.background = "#059669"; // Green
-            document.body.style.cursor = "default";
-            enableDragging();
-        } else {
-            btn.innerHTML = "✏️ Design Mode: OFF";
-            btn.style.background = "#444";
-            disableDragging();
-        }
-    }
-
-    function enableDragging() {
-        document.addEventListener('mousedown', startDrag);
-        document.addEventListener('mousemove', drag);
-        document.addEventListener('mouseup', endDrag);
-    }
-
-    function disableDragging() {
-        document.removeEventListener('mousedown', startDrag);
-        document.removeEventListener('mousemove', drag);
-        document.removeEventListener('mouseup', endDrag);
-    }
-
-    function startDrag(e) {
-        // Don't drag if clicking buttons or inputs
-        if (e.target.tagName === 'BUTTON' || e.target.closest('#ui-controls')) return;
-        
-        draggedEl = e.target;
-        
-        // Prevent editing text while dragging
-        draggedEl.contentEditable = false; 
-        
-        startX = e.clientX;
-        startY = e.clientY;
-        
-        // Get current transform values (if any)
-        const style = window.getComputedStyle(draggedEl);
-        const matrix = new WebKitCSSMatrix(style.webkitTransform);
-        initialTx = matrix.m41;
-        initialTy = matrix.m42;
-        
-        draggedEl.style.transition = 'none'; // Disable transition for smooth drag
-        draggedEl.style.zIndex = 1000; // Bring to front
-    }
-
-    function drag(e) {
-        if (!draggedEl) return;
-        e.preventDefault();
-        const dx = e.clientX - startX;
-        const dy = e.clientY - startY;
-        draggedEl.style.transform = `translate(${initialTx + dx}px, ${initialTy + dy}px)`;
-    }
-
-    function endDrag(e) {
-        if (!draggedEl) return;
-        draggedEl.contentEditable = isDesignMode; // Re-enable text edit
-        draggedEl.style.zIndex = ''; // Reset Z
-        draggedEl = null;
-    }
-
-    // --- DOWNLOAD LOGIC ---
-    function downloadAsImage() {
-        // 1. Hide the controls so they don't appear in the image
-        const controls = document.getElementById('ui-controls');
-        controls.style.display = 'none';
-        
-        // 2. Temporarily turn off Design Mode borders/indicators if any
-        const wasDesignMode = isDesignMode;
-        if (isDesignMode) toggleDesignMode(); 
-
-        const element = document.body;
-
-        html2canvas(element, {
-            useCORS: true,
-            allowTaint: true,
-            backgroundColor: null, // Transparent background support
-            scrollY: -window.scrollY // Fix scroll issues
-        }).then(canvas => {
-            const link = document.createElement('a');
-            link.download = 'marketing_asset_' + new Date().getTime() + '.png';
-            link.href = canvas.toDataURL();
-            link.click();
-            
-            // 3. Restore UI state
-            controls.style.display = 'flex';
-            if (wasDesignMode) toggleDesignMode();
-        });
-    }
-    </script>
-    """
-    
-    # Append script properly
-    if "</body>" in raw_html:
-        final_html = raw_html.replace("</body>", f"{controls_script}</body>")
-    else:
-        final_html = raw_html + controls_script
-        
-    return final_html
+    return inject_design_tools(raw_html)
 
 
 # def generate_standard_code(prompt, style_json, contexts, logo_file, api_key):